@@ -4,10 +4,14 @@
       'target_name': 'automata',
       'type': 'static_library',
       'sources': [
+        'environment.cc',
         'grid.cc',
         'movement_factor.cc',
         'organism.cc',
         'grid_object.cc',
+        'memory_stats.cc',
+        'potential_field.cc',
+        'trace.cc',
       ],
     },
     {
@@ -15,6 +19,7 @@
       'type': 'executable',
       'dependencies': [
         'automata',
+        'metabolism/metabolism.gyp:metabolism',
         '<(externals):gtest',
       ],
       'sources': [
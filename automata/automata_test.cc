@@ -1,9 +1,17 @@
+#include <math.h>
+
 #include <list>
+#include <vector>
 
+#include "automata/environment.h"
 #include "automata/grid.h"
 #include "automata/grid_object.h"
+#include "automata/memory_stats.h"
+#include "automata/metabolism/animal_metabolism.h"
 #include "automata/organism.h"
 #include "automata/movement_factor.h"
+#include "automata/potential_field.h"
+#include "automata/trace.h"
 #include "gtest/gtest.h"
 
 namespace automata {
@@ -472,5 +480,514 @@ TEST_F(AutomataTest, OrganismStasisTest) {
   EXPECT_EQ(nullptr, grid_.GetPending(0, 0));
 }
 
+// Do immobile objects stay in place and generate conflicts without having to
+// request stasis every cycle?
+TEST_F(AutomataTest, ImmobileTest) {
+  Organism object1(&grid_, 0);
+  Organism object2(&grid_, 1);
+  ASSERT_TRUE(object1.Initialize(0, 0));
+  ASSERT_TRUE(object2.Initialize(1, 1));
+  object1.set_immobile(true);
+  ASSERT_TRUE(grid_.Update());
+
+  // Moving into its cell should generate a conflict.
+  EXPECT_FALSE(object2.SetPosition(0, 0));
+  EXPECT_EQ(&object2, grid_.GetConflict(0, 0));
+  EXPECT_EQ(&object1, grid_.GetPending(0, 0));
+  EXPECT_EQ(&object1, object2.GetConflict());
+  EXPECT_FALSE(grid_.Update());
+
+  // The default conflict handler should always move the mobile object.
+  EXPECT_TRUE(object1.DefaultConflictHandler());
+  EXPECT_EQ(nullptr, grid_.GetConflict(0, 0));
+  EXPECT_EQ(&object1, grid_.GetPending(0, 0));
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(&object1, grid_.GetOccupant(0, 0));
+
+  // It should still be conflicting on the next cycle.
+  int x, y;
+  object2.get_position(&x, &y);
+  EXPECT_TRUE(object2.SetPosition(x, y));
+  EXPECT_FALSE(object2.SetPosition(0, 0));
+  EXPECT_EQ(&object2, grid_.GetConflict(0, 0));
+  // Moving away should cancel the stasis request for its old cell.
+  EXPECT_EQ(nullptr, grid_.GetPending(x, y));
+
+  // Immobile objects can request stasis, but they can't move.
+  EXPECT_TRUE(object1.SetPosition(0, 0));
+  EXPECT_FALSE(object1.SetPosition(2, 2));
+
+  // If the immobile object goes away, the other one should take its place.
+  EXPECT_TRUE(object1.RemoveFromGrid());
+  EXPECT_EQ(nullptr, grid_.GetConflict(0, 0));
+  EXPECT_EQ(&object2, grid_.GetPending(0, 0));
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(&object2, grid_.GetOccupant(0, 0));
+  // It shouldn't have left anything behind in the cell it came from.
+  EXPECT_EQ(nullptr, grid_.GetOccupant(x, y));
+
+  // Clean up before the grid goes away.
+  EXPECT_TRUE(object2.RemoveFromGrid());
+  EXPECT_EQ(nullptr, grid_.GetOccupant(0, 0));
+}
+
+// Do grids that aren't square work?
+TEST_F(AutomataTest, RectangularTest) {
+  Grid grid(3, 7);
+  GridObject top(&grid, 0);
+  GridObject bottom(&grid, 1);
+  ASSERT_TRUE(top.Initialize(2, 0));
+  // These two used to end up in the same cell.
+  ASSERT_TRUE(bottom.Initialize(0, 6));
+  GridObject middle(&grid, 2);
+  ASSERT_TRUE(middle.Initialize(0, 2));
+  ASSERT_TRUE(grid.Update());
+
+  EXPECT_EQ(&top, grid.GetOccupant(2, 0));
+  EXPECT_EQ(&bottom, grid.GetOccupant(0, 6));
+  EXPECT_EQ(&middle, grid.GetOccupant(0, 2));
+  EXPECT_EQ(3, grid.CountObjects());
+
+  int indices[21];
+  ASSERT_TRUE(grid.ExportCells(Grid::kCellIndex, indices, 21));
+  EXPECT_EQ(0, indices[2]);
+  EXPECT_EQ(2, indices[6]);
+  EXPECT_EQ(1, indices[18]);
+
+  // Things should be able to move all the way to the far corner.
+  ASSERT_TRUE(bottom.SetPosition(1, 6));
+  ASSERT_TRUE(grid.Update());
+  EXPECT_EQ(&bottom, grid.GetOccupant(1, 6));
+  EXPECT_EQ(nullptr, grid.GetOccupant(0, 6));
+}
+
+// Do potential fields work, and do they agree with movement factors?
+TEST_F(AutomataTest, FieldTest) {
+  // Sources that are cut off by the edge of the grid should still work.
+  PotentialField field(9, 9);
+  field.AddSource(0, 0, 2, 2);
+  EXPECT_EQ(20, field.Get(0, 0));
+  EXPECT_EQ(2, field.Get(1, 0));
+  EXPECT_DOUBLE_EQ(2.0 / pow(2, 5), field.Get(0, 2));
+  // (2, 2) is farther than the radius.
+  EXPECT_EQ(0, field.Get(2, 2));
+  EXPECT_EQ(1, field.GetSources(1, 1));
+  EXPECT_EQ(0, field.GetSources(2, 2));
+  field.Clear();
+  EXPECT_EQ(0, field.Get(0, 0));
+  EXPECT_EQ(0, field.GetSources(0, 0));
+
+  GridObject prey(&grid_, 0);
+  prey.set_group(1);
+  ASSERT_TRUE(prey.Initialize(2, 1));
+  Organism hunter(&grid_, 1);
+  hunter.set_group(0);
+  hunter.set_field_movement(true);
+  ASSERT_TRUE(hunter.Initialize(1, 1));
+  ASSERT_TRUE(grid_.Update());
+
+  // There shouldn't be a field until something is a source for it.
+  EXPECT_EQ(nullptr, grid_.GetField(0));
+  EXPECT_EQ(0, grid_.GetFieldValue(0, 2, 1));
+
+  grid_.SetFieldSource(0, 1, 100, -1);
+  ASSERT_NE(nullptr, grid_.GetField(0));
+  EXPECT_EQ(1000, grid_.GetFieldValue(0, 2, 1));
+  EXPECT_EQ(100, grid_.GetFieldValue(0, 3, 1));
+  // The hunter should be able to perceive it.
+  EXPECT_EQ(1, grid_.GetField(0)->GetSources(1, 1));
+  // Nobody else should be affected.
+  EXPECT_EQ(nullptr, grid_.GetField(1));
+
+  // The field should give the same probabilities as the equivalent factor.
+  ::std::list<int> xs, ys;
+  grid_.GetNeighborhoodLocations(1, 1, &xs, &ys);
+  ::std::list<MovementFactor> factors;
+  factors.emplace_back(2, 1, 100, -1);
+  double from_factors[8], from_field[8];
+  grid_.CalculateProbabilities(factors, xs, ys, from_factors);
+  grid_.CalculateFieldProbabilities(*grid_.GetField(0), xs, ys, from_field);
+  for (int i = 0; i < 8; ++i) {
+    EXPECT_DOUBLE_EQ(from_factors[i], from_field[i]);
+  }
+
+  // Setting the source again should replace it.
+  grid_.SetFieldSource(0, 1, 100, 1);
+  EXPECT_EQ(100, grid_.GetFieldValue(0, 3, 1));
+  EXPECT_EQ(0, grid_.GetFieldValue(0, 4, 1));
+
+  // The field should follow the sources when the grid gets updated.
+  ASSERT_TRUE(prey.SetPosition(6, 6));
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(0, grid_.GetFieldValue(0, 2, 1));
+  EXPECT_EQ(1000, grid_.GetFieldValue(0, 6, 6));
+  EXPECT_EQ(0, grid_.GetField(0)->GetSources(1, 1));
+
+  // Moving should still work.
+  ASSERT_TRUE(hunter.UpdatePosition());
+  ASSERT_TRUE(grid_.Update());
+  int x, y;
+  hunter.get_position(&x, &y);
+  EXPECT_LE(abs(x - 1), 1);
+  EXPECT_LE(abs(y - 1), 1);
+}
+
+// Do factors from dead organisms get ignored before they are cleaned up?
+TEST_F(AutomataTest, DeadFactorTest) {
+  Organism organism1(&grid_, 0);
+  Organism organism2(&grid_, 1);
+  ASSERT_TRUE(organism1.Initialize(0, 0));
+  ASSERT_TRUE(organism2.Initialize(2, 2));
+  ASSERT_TRUE(grid_.Update());
+
+  organism1.AddFactorFromOrganism(&organism2, 1);
+  organism2.Die();
+
+  ::std::list<MovementFactor> factors = organism1.factors();
+  grid_.RemoveInvisible(0, 0, &factors, -1);
+  EXPECT_TRUE(factors.empty());
+}
+
+// Can we create organisms and factors in bulk?
+TEST_F(AutomataTest, SpawnTest) {
+  ::std::vector<Organism *> organisms =
+      Organism::Spawn(&grid_, {0, 1, 2}, {0, 1, 2});
+  ASSERT_EQ(3u, organisms.size());
+  for (int i = 0; i < 3; ++i) {
+    EXPECT_EQ(organisms[i], grid_.GetPending(i, i));
+  }
+
+  // Everyone should get a factor for everyone except themselves.
+  Organism::AddFactorsBetween(organisms, organisms, 1);
+  for (auto *organism : organisms) {
+    EXPECT_EQ(2u, organism->factors().size());
+  }
+
+  Organism::CleanupOrganismFrom(organisms, *organisms[0]);
+  EXPECT_EQ(2u, organisms[0]->factors().size());
+  EXPECT_EQ(1u, organisms[1]->factors().size());
+  EXPECT_EQ(organisms[2], organisms[1]->factors().begin()->GetOrganism());
+
+  // If any of them can't be placed, none of them should be.
+  EXPECT_TRUE(Organism::Spawn(&grid_, {3, 1}, {3, 1}).empty());
+  EXPECT_EQ(nullptr, grid_.GetPending(3, 3));
+
+  for (auto *organism : organisms) {
+    delete organism;
+  }
+}
+
+// Does finding the vacant locations around a cell work?
+TEST_F(AutomataTest, VacantLocationsTest) {
+  ::std::vector<int> xs, ys;
+  // Out of bounds should fail.
+  EXPECT_FALSE(grid_.GetVacantLocations(-1, -1, &xs, &ys));
+
+  // Everything around a corner should be vacant to start with.
+  ASSERT_TRUE(grid_.GetVacantLocations(0, 0, &xs, &ys));
+  EXPECT_EQ(3u, xs.size());
+  EXPECT_EQ(3u, ys.size());
+
+  // Baked objects, and ones that are about to move in, should both count.
+  GridObject baked(&grid_, 0);
+  ASSERT_TRUE(baked.Initialize(1, 0));
+  ASSERT_TRUE(grid_.Update());
+  GridObject pending(&grid_, 1);
+  ASSERT_TRUE(pending.Initialize(0, 1));
+
+  ASSERT_TRUE(grid_.GetVacantLocations(0, 0, &xs, &ys));
+  ASSERT_EQ(1u, xs.size());
+  EXPECT_EQ(1, xs[0]);
+  EXPECT_EQ(1, ys[0]);
+
+  // Bigger neighborhoods should work too.
+  ASSERT_TRUE(grid_.GetVacantLocations(0, 0, &xs, &ys, 2));
+  EXPECT_EQ(6u, xs.size());
+}
+
+// Can we get the state of the grid and the objects on it in bulk?
+TEST_F(AutomataTest, ExportTest) {
+  GridObject object(&grid_, 1);
+  object.set_group(2);
+  ASSERT_TRUE(object.Initialize(3, 1));
+  Organism organism(&grid_, 5);
+  metabolism::AnimalMetabolism metabolism(1.0, 0.1, 310.0, 0.5, 0.5);
+  organism.set_metabolism(&metabolism);
+  ASSERT_TRUE(organism.Initialize(0, 2));
+
+  // Nothing is there until the grid gets updated.
+  EXPECT_EQ(0, grid_.CountObjects());
+  ASSERT_TRUE(grid_.Update());
+  ASSERT_EQ(2, grid_.CountObjects());
+
+  int cells[81];
+  EXPECT_FALSE(grid_.ExportCells(Grid::kCellIndex, cells, 80));
+  ASSERT_TRUE(grid_.ExportCells(Grid::kCellIndex, cells, 81));
+  EXPECT_EQ(1, cells[1 * 9 + 3]);
+  EXPECT_EQ(5, cells[2 * 9 + 0]);
+  EXPECT_EQ(-1, cells[0]);
+  ASSERT_TRUE(grid_.ExportCells(Grid::kCellGroup, cells, 81));
+  EXPECT_EQ(2, cells[1 * 9 + 3]);
+  EXPECT_EQ(-1, cells[2 * 9 + 0]);
+
+  // Objects come out in the order of their cells.
+  double values[2];
+  EXPECT_EQ(-1, grid_.ExportObjects(Grid::kObjectIndex, values, 1));
+  ASSERT_EQ(2, grid_.ExportObjects(Grid::kObjectIndex, values, 2));
+  EXPECT_EQ(1, values[0]);
+  EXPECT_EQ(5, values[1]);
+  ASSERT_EQ(2, grid_.ExportObjects(Grid::kObjectX, values, 2));
+  EXPECT_EQ(3, values[0]);
+  EXPECT_EQ(0, values[1]);
+  ASSERT_EQ(2, grid_.ExportObjects(Grid::kObjectEnergy, values, 2));
+  EXPECT_TRUE(isnan(values[0]));
+  EXPECT_EQ(metabolism.energy(), values[1]);
+
+  // NaNs should get left out of totals.
+  EXPECT_EQ(6, grid_.SumObjects(Grid::kObjectIndex));
+  EXPECT_EQ(metabolism.energy(), grid_.SumObjects(Grid::kObjectEnergy));
+}
+
+// Does the grid keep track of how much moved when it was updated?
+TEST_F(AutomataTest, MovedObjectsTest) {
+  GridObject object(&grid_, 0);
+  ASSERT_TRUE(object.Initialize(0, 0));
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(1, grid_.moved_objects());
+
+  // Moving should only count once, even though two cells changed.
+  ASSERT_TRUE(object.SetPosition(1, 1));
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(1, grid_.moved_objects());
+
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(0, grid_.moved_objects());
+
+  // Leaving the grid doesn't count at all.
+  ASSERT_TRUE(object.RemoveFromGrid());
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(0, grid_.moved_objects());
+}
+
+// Do the queries for what's around a location work?
+TEST_F(AutomataTest, NearbyTest) {
+  GridObject center(&grid_, 1);
+  ASSERT_TRUE(center.Initialize(4, 4));
+  GridObject far(&grid_, 2);
+  far.set_group(0);
+  ASSERT_TRUE(far.Initialize(4, 7));
+  GridObject diagonal(&grid_, 3);
+  diagonal.set_group(0);
+  ASSERT_TRUE(diagonal.Initialize(6, 6));
+  GridObject straight(&grid_, 4);
+  straight.set_group(0);
+  ASSERT_TRUE(straight.Initialize(4, 2));
+  GridObject other(&grid_, 5);
+  other.set_group(1);
+  ASSERT_TRUE(other.Initialize(3, 3));
+
+  // Nothing is there until the grid gets updated.
+  EXPECT_EQ(0, grid_.CountObjectsNear(4, 4, 3, -1));
+  ASSERT_TRUE(grid_.Update());
+
+  // The closest ring comes first, and the center doesn't count.
+  int indices[4];
+  ASSERT_EQ(4, grid_.FindObjectsNear(4, 4, 3, -1, indices, 4));
+  EXPECT_EQ(5, indices[0]);
+  EXPECT_EQ(4, indices[1]);
+  EXPECT_EQ(3, indices[2]);
+  EXPECT_EQ(2, indices[3]);
+  // It still tells us how many there are when they don't fit.
+  EXPECT_EQ(3, grid_.FindObjectsNear(4, 4, 3, 0, indices, 1));
+  EXPECT_EQ(4, indices[0]);
+
+  EXPECT_EQ(1, grid_.CountObjectsNear(4, 4, 1, -1));
+  EXPECT_EQ(2, grid_.CountObjectsNear(4, 4, 2, 0));
+  EXPECT_EQ(1, grid_.CountObjectsNear(4, 4, 3, 1));
+
+  // Both of these are two rings away, but one is closer in a straight line.
+  const int groups[] = {0, 1};
+  EXPECT_EQ(4, grid_.FindNearest(4, 4, 3, groups, 1));
+  EXPECT_EQ(5, grid_.FindNearest(4, 4, 3, groups, 2));
+  EXPECT_EQ(5, grid_.FindNearest(4, 4, 3, groups, 0));
+  EXPECT_EQ(-1, grid_.FindNearest(4, 4, 1, groups, 1));
+  // Rings that go off the grid are fine.
+  EXPECT_EQ(2, grid_.FindNearest(0, 8, 8, groups, 1));
+}
+
+// Do the C++ objects keep track of how much memory they use?
+TEST_F(AutomataTest, MemoryStatsTest) {
+  const int chunks = MemoryStats::GetCount(MemoryStats::kGridChunks);
+  const int organisms = MemoryStats::GetCount(MemoryStats::kOrganisms);
+  const int factors = MemoryStats::GetCount(MemoryStats::kMovementFactors);
+  const double factor_bytes =
+      MemoryStats::GetBytes(MemoryStats::kMovementFactors);
+  const int metabolisms = MemoryStats::GetCount(MemoryStats::kMetabolisms);
+
+  {
+    Grid grid(100, 100);
+    Organism predator(&grid, 0);
+    ASSERT_TRUE(predator.Initialize(0, 0));
+    Organism prey(&grid, 1);
+    ASSERT_TRUE(prey.Initialize(50, 50));
+    metabolism::AnimalMetabolism metabolism(1.0, 0.1, 310.0, 0.5, 0.5);
+    predator.set_metabolism(&metabolism);
+    predator.AddFactorFromOrganism(&prey, 1, -1);
+    EXPECT_EQ(organisms + 2, MemoryStats::GetCount(MemoryStats::kOrganisms));
+    EXPECT_EQ(factors + 1,
+              MemoryStats::GetCount(MemoryStats::kMovementFactors));
+    EXPECT_LT(factor_bytes + sizeof(MovementFactor),
+              MemoryStats::GetBytes(MemoryStats::kMovementFactors));
+    EXPECT_EQ(metabolisms + 1,
+              MemoryStats::GetCount(MemoryStats::kMetabolisms));
+
+    ASSERT_TRUE(grid.Update());
+    EXPECT_EQ(chunks + 2, MemoryStats::GetCount(MemoryStats::kGridChunks));
+    EXPECT_EQ(grid.allocated_chunks(),
+              MemoryStats::GetCount(MemoryStats::kGridChunks) - chunks);
+
+    // Copies count too.
+    MovementFactor copy(*predator.factors().begin());
+    EXPECT_EQ(factors + 2,
+              MemoryStats::GetCount(MemoryStats::kMovementFactors));
+  }
+
+  // Everything should be back where it started.
+  EXPECT_EQ(chunks, MemoryStats::GetCount(MemoryStats::kGridChunks));
+  EXPECT_EQ(organisms, MemoryStats::GetCount(MemoryStats::kOrganisms));
+  EXPECT_EQ(factors, MemoryStats::GetCount(MemoryStats::kMovementFactors));
+  EXPECT_EQ(factor_bytes, MemoryStats::GetBytes(MemoryStats::kMovementFactors));
+  EXPECT_EQ(metabolisms, MemoryStats::GetCount(MemoryStats::kMetabolisms));
+}
+
+// Does a huge grid only use memory where there are things?
+TEST_F(AutomataTest, SparseTest) {
+  Grid grid(50000, 50000);
+  EXPECT_EQ(0, grid.allocated_chunks());
+  EXPECT_EQ(nullptr, grid.GetOccupant(49999, 49999));
+  EXPECT_EQ(0, grid.allocated_chunks());
+
+  GridObject first(&grid, 1);
+  ASSERT_TRUE(first.Initialize(40000, 3));
+  GridObject second(&grid, 2);
+  ASSERT_TRUE(second.Initialize(5, 40000));
+  GridObject third(&grid, 3);
+  ASSERT_TRUE(third.Initialize(10, 3));
+  ASSERT_TRUE(grid.Update());
+  EXPECT_EQ(3, grid.allocated_chunks());
+  EXPECT_EQ(&first, grid.GetOccupant(40000, 3));
+
+  // Objects still come out in the order of their cells, even when they are in
+  // different chunks.
+  double values[3];
+  ASSERT_EQ(3, grid.ExportObjects(Grid::kObjectIndex, values, 3));
+  EXPECT_EQ(3, values[0]);
+  EXPECT_EQ(1, values[1]);
+  EXPECT_EQ(2, values[2]);
+
+  // Moving into a new chunk allocates it, and the old one goes away once the
+  // grid gets updated.
+  ASSERT_TRUE(first.SetPosition(45000, 45000));
+  EXPECT_EQ(4, grid.allocated_chunks());
+  ASSERT_TRUE(grid.Update());
+  EXPECT_EQ(3, grid.allocated_chunks());
+  EXPECT_EQ(nullptr, grid.GetOccupant(40000, 3));
+  EXPECT_EQ(&first, grid.GetOccupant(45000, 45000));
+  EXPECT_EQ(3, grid.CountObjects());
+
+  // Moving within a chunk doesn't allocate anything.
+  ASSERT_TRUE(third.SetPosition(11, 4));
+  ASSERT_TRUE(grid.Update());
+  EXPECT_EQ(3, grid.allocated_chunks());
+  EXPECT_EQ(1, grid.moved_objects());
+}
+
+// Does the grid respect its environment?
+TEST_F(AutomataTest, EnvironmentTest) {
+  Environment small(8, 9);
+  EXPECT_FALSE(grid_.SetEnvironment(&small));
+
+  Environment environment(9, 9);
+  ::std::vector<int> blocked(81, 0);
+  EXPECT_FALSE(environment.SetBlocked(blocked.data(), 80));
+  blocked[3 * 9 + 2] = 1;
+  ASSERT_TRUE(environment.SetBlocked(blocked.data(), 81));
+  ASSERT_TRUE(grid_.SetEnvironment(&environment));
+
+  // Nothing should be able to go in a blocked cell, even after an update.
+  GridObject object(&grid_, 0);
+  EXPECT_FALSE(object.Initialize(2, 3));
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_FALSE(object.Initialize(2, 3));
+  // It shouldn't take any memory to keep it that way.
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(0, grid_.allocated_chunks());
+  ::std::vector<int> xs, ys;
+  ASSERT_TRUE(grid_.GetVacantLocations(2, 2, &xs, &ys));
+  EXPECT_EQ(7u, xs.size());
+
+  // If moving anywhere but one cell costs a lot, an object should either go
+  // there or stay put.
+  ::std::vector<double> costs(81, 1000000.0);
+  EXPECT_FALSE(environment.SetMovementCost(costs.data(), 80));
+  costs[4 * 9 + 5] = 1.0;
+  ASSERT_TRUE(environment.SetMovementCost(costs.data(), 81));
+  const ::std::list<MovementFactor> factors;
+  for (int i = 0; i < 20; ++i) {
+    int new_x, new_y;
+    ASSERT_TRUE(grid_.MoveObject(4, 4, factors, &new_x, &new_y));
+    EXPECT_EQ(4, new_y);
+    EXPECT_TRUE(new_x == 4 || new_x == 5);
+  }
+
+  // The sun should come up and go down.
+  const ::std::vector<double> sunlight(81, 0.5);
+  ASSERT_TRUE(environment.SetSunlight(sunlight.data(), 81));
+  EXPECT_EQ(0.5, environment.GetSunlight(1, 1));
+  environment.SetCycle(100, 0, 0);
+  EXPECT_DOUBLE_EQ(0.0, environment.GetSunlight(1, 1));
+  environment.SetTime(50);
+  EXPECT_DOUBLE_EQ(0.5, environment.GetSunlight(1, 1));
+  EXPECT_DOUBLE_EQ(0.5, environment.GetBaseSunlight(1, 1));
+
+  ASSERT_TRUE(grid_.SetEnvironment(nullptr));
+}
+
+// Do timers record events only while a trace is running?
+TEST_F(AutomataTest, TraceTest) {
+  ASSERT_TRUE(grid_.Update());
+  EXPECT_EQ(0, Trace::GetEventCount());
+
+  Trace::Start(2);
+  const double start = Trace::Now();
+  ASSERT_TRUE(grid_.Update());
+  {
+    ScopedTimer timer("Outer");
+    ScopedTimer inner("Inner");
+  }
+  Trace::Stop();
+  ASSERT_TRUE(grid_.Update());
+
+  // There should only be room for the first two.
+  ASSERT_EQ(2, Trace::GetEventCount());
+  EXPECT_EQ(1, Trace::GetDroppedCount());
+  EXPECT_STREQ("Grid::Update", Trace::GetEventName(0));
+  EXPECT_STREQ("Inner", Trace::GetEventName(1));
+  EXPECT_EQ(nullptr, Trace::GetEventName(2));
+
+  double values[4];
+  EXPECT_FALSE(Trace::GetEvents(values, 3));
+  ASSERT_TRUE(Trace::GetEvents(values, 4));
+  EXPECT_GE(values[0], start);
+  EXPECT_GE(values[1], 0);
+  EXPECT_GE(values[2], values[0] + values[1]);
+  EXPECT_LE(values[2] + values[3], Trace::Now());
+
+  // Starting over should get rid of everything.
+  Trace::Start(2);
+  Trace::Stop();
+  EXPECT_EQ(0, Trace::GetEventCount());
+}
+
 }  //  testing
 }  //  automata
@@ -0,0 +1,82 @@
+#include <math.h>
+
+#include <algorithm>
+
+#include "automata/environment.h"
+
+namespace automata {
+
+Environment::Environment(int x_size, int y_size)
+    : x_size_(x_size),
+      y_size_(y_size),
+      sunlight_(x_size * y_size, 1.0),
+      movement_cost_(x_size * y_size, 1.0),
+      blocked_(x_size * y_size, false) {}
+
+bool Environment::SetSunlight(const double *values, int size) {
+  if (size != x_size_ * y_size_ ||
+      ::std::any_of(values, values + size,
+                    [](double value) { return value < 0; })) {
+    return false;
+  }
+
+  sunlight_.assign(values, values + size);
+  return true;
+}
+
+bool Environment::SetMovementCost(const double *values, int size) {
+  if (size != x_size_ * y_size_ ||
+      ::std::any_of(values, values + size,
+                    [](double value) { return value <= 0; })) {
+    return false;
+  }
+
+  movement_cost_.assign(values, values + size);
+  return true;
+}
+
+bool Environment::SetBlocked(const int *values, int size) {
+  if (size != x_size_ * y_size_) {
+    return false;
+  }
+
+  blocked_cells_.clear();
+  for (int i = 0; i < size; ++i) {
+    blocked_[i] = values[i] != 0;
+    if (blocked_[i]) {
+      blocked_cells_.push_back(i);
+    }
+  }
+
+  return true;
+}
+
+void Environment::SetCycle(double day_length, double year_length,
+                           double seasonal_variation) {
+  day_length_ = day_length;
+  year_length_ = year_length;
+  seasonal_variation_ = seasonal_variation;
+
+  // The brightness at the current time might be different now.
+  SetTime(time_);
+}
+
+void Environment::SetTime(double time) {
+  time_ = time;
+  daylight_ = GetDaylight(time);
+}
+
+double Environment::GetDaylight(double time) const {
+  double daylight = 1;
+  if (day_length_ > 0) {
+    // The sun is down for half the day.
+    daylight *= ::std::max(0.0, -cos(2 * M_PI * time / day_length_));
+  }
+  if (year_length_ > 0) {
+    daylight *= 1 - seasonal_variation_ * cos(2 * M_PI * time / year_length_);
+  }
+
+  return daylight;
+}
+
+}  // namespace automata
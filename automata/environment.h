@@ -0,0 +1,130 @@
+#ifndef ECOSYSTEM_AUTOMATA_ENVIRONMENT_H_
+#define ECOSYSTEM_AUTOMATA_ENVIRONMENT_H_
+
+#include <vector>
+
+#include "automata/macros.h"
+
+namespace automata {
+
+// Holds the things about each cell of the grid that don't depend on what's in
+// it, like how much sunlight it gets and how hard it is to move through. Every
+// field is a raster with one value per cell, stored contiguously in row-major
+// order, so looking up a cell is just an index. Sunlight also changes over the
+// course of a day and a year, but the same change applies to every cell, so
+// that part is kept separately and only has to be updated once per time step.
+class Environment {
+ public:
+  // x_size: Size in the x dimension. Must be the same as the grid's.
+  // y_size: Size in the y dimension. Must be the same as the grid's.
+  Environment(int x_size, int y_size);
+
+  // All of the methods that set a raster take one value for each cell, in
+  // row-major order, so the value for the cell at (x, y) is at
+  // y * x_size + x. They return false without changing anything if size is
+  // wrong, or if any of the values are invalid.
+
+  // Sets how much sunlight each cell gets, relative to the average for the
+  // earth's surface. By default, every cell gets 1.
+  // values: The sunlight for every cell. They can't be negative.
+  // size: How many values there are.
+  bool SetSunlight(const double *values, int size);
+  // Sets how hard it is to move into each cell. Things are less likely to move
+  // into cells that cost more, and it takes more energy for them to do so. By
+  // default, every cell costs 1.
+  // values: The cost for every cell. They must be positive.
+  // size: How many values there are.
+  bool SetMovementCost(const double *values, int size);
+  // Sets which cells nothing can ever move into. The grid keeps these cells
+  // blacklisted.
+  // values: Nonzero for every cell that is blocked.
+  // size: How many values there are.
+  bool SetBlocked(const int *values, int size);
+  // Sets how sunlight changes over time. The sun comes up and goes down once a
+  // day, and is at its brightest at midday. On top of that, it is brighter in
+  // the summer than in the winter. Time 0 is midnight on the first day of
+  // winter.
+  // day_length: The length of a day. (s) If this is not positive, there is no
+  // daily cycle.
+  // year_length: The length of a year. (s) If this is not positive, there is
+  // no yearly cycle.
+  // seasonal_variation: How much brighter or darker the sun gets over the
+  // course of a year, as a fraction of its brightness.
+  void SetCycle(double day_length, double year_length,
+                double seasonal_variation);
+  // Moves the environment to a point in time. This only updates the part of
+  // the sunlight that is the same everywhere, so it doesn't matter how big the
+  // grid is.
+  // time: The time to move to. (s)
+  void SetTime(double time);
+  // Calculates how bright the sun is at some point in time.
+  // time: The time. (s)
+  // Returns: The brightness of the sun, relative to the average for the
+  // earth's surface.
+  double GetDaylight(double time) const;
+
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: How much sunlight the cell is getting right now, relative to the
+  // average for the earth's surface.
+  double GetSunlight(int x, int y) const {
+    return sunlight_[y * x_size_ + x] * daylight_;
+  }
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: How much sunlight the cell gets before the time of day and year
+  // are taken into account.
+  double GetBaseSunlight(int x, int y) const {
+    return sunlight_[y * x_size_ + x];
+  }
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: How hard it is to move into the cell.
+  double GetMovementCost(int x, int y) const {
+    return movement_cost_[y * x_size_ + x];
+  }
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: Whether nothing can move into the cell.
+  bool IsBlocked(int x, int y) const { return blocked_[y * x_size_ + x]; }
+  // Returns: The row-major index of every blocked cell.
+  const ::std::vector<int> &blocked_cells() const { return blocked_cells_; }
+
+  // Returns: The current time. (s)
+  double time() const { return time_; }
+  // Returns: How bright the sun is right now, everywhere.
+  double daylight() const { return daylight_; }
+  int x_size() const { return x_size_; }
+  int y_size() const { return y_size_; }
+
+ private:
+  DISSALOW_COPY_AND_ASSIGN(Environment);
+
+  // The dimensions of the rasters.
+  const int x_size_;
+  const int y_size_;
+
+  // How much sunlight each cell gets, before the time of day and year are
+  // taken into account.
+  ::std::vector<double> sunlight_;
+  // How hard it is to move into each cell.
+  ::std::vector<double> movement_cost_;
+  // Whether each cell is blocked.
+  ::std::vector<bool> blocked_;
+  // The indices of all the blocked cells, so the grid doesn't have to look
+  // through every cell to find them.
+  ::std::vector<int> blocked_cells_;
+
+  // The parameters of the sunlight cycle. See SetCycle().
+  double day_length_ = 0;
+  double year_length_ = 0;
+  double seasonal_variation_ = 0;
+  // The current time.
+  double time_ = 0;
+  // How bright the sun is at the current time.
+  double daylight_ = 1;
+};
+
+}  // namespace automata
+
+#endif  // ECOSYSTEM_AUTOMATA_ENVIRONMENT_H_
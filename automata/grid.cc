@@ -12,23 +12,20 @@
 // forward-declared incomplete version in the header because including it there
 // would cause a circular dependency issue.
 #include "automata/grid_object.h"
+#include "automata/organism.h"
+#include "automata/trace.h"
 
 namespace automata {
 
+constexpr int Grid::kChunkSize;
+const Grid::Cell Grid::kEmptyCell;
+
 Grid::Grid(int x_size, int y_size)
-    : x_size_(x_size), y_size_(y_size), grid_(new Cell[x_size * y_size]) {
+    : x_size_(x_size), y_size_(y_size),
+      x_chunks_((x_size + kChunkSize - 1) / kChunkSize),
+      y_chunks_((y_size + kChunkSize - 1) / kChunkSize),
+      chunks_(x_chunks_ * y_chunks_) {
   srand(time(NULL));
-
-  assert(grid_ && "Failed to allocate grid array!\n");
-
-  // Set everything to a default initialization.
-  for (int i = 0; i < x_size * y_size; ++i) {
-    grid_[i].Object = nullptr;
-    grid_[i].NewObject = nullptr;
-    grid_[i].ConflictedObject = nullptr;
-    grid_[i].Blacklisted = false;
-    grid_[i].RequestStasis = false;
-  }
 }
 
 Grid::~Grid() {
@@ -37,26 +34,40 @@ Grid::~Grid() {
   // on that grid, leading to odd segfaults when it goes to destroy the
   // dependents, and those dependents try to remove themselves from the
   // destroyed grid in their destructors.
-  for (int i = 0; i < x_size_ * y_size_; ++i) {
-    if (grid_[i].Object) {
-      // Technically, RemoveFromGrid() can return false, but there's not much we
-      // can do about it if it does.
-      grid_[i].Object->RemoveFromGrid();
-    }
-    if (grid_[i].NewObject) {
-      grid_[i].NewObject->RemoveFromGrid();
+  for (auto &chunk : chunks_) {
+    if (!chunk) {
+      continue;
     }
-    if (grid_[i].ConflictedObject) {
-      grid_[i].ConflictedObject->RemoveFromGrid();
+
+    for (Cell &cell : chunk->Cells) {
+      if (cell.Object) {
+        // Technically, RemoveFromGrid() can return false, but there's not much
+        // we can do about it if it does.
+        cell.Object->RemoveFromGrid();
+      }
+      if (cell.NewObject) {
+        cell.NewObject->RemoveFromGrid();
+      }
+      if (cell.ConflictedObject) {
+        cell.ConflictedObject->RemoveFromGrid();
+      }
     }
   }
+}
+
+Grid::Cell *Grid::GetCell(int x, int y) {
+  ::std::unique_ptr<Chunk> &chunk = chunks_[GetChunkIndex(x, y)];
+  if (!chunk) {
+    chunk.reset(new Chunk());
+    ++allocated_chunks_;
+  }
 
-  delete[] grid_;
+  return &chunk->Cells[(y % kChunkSize) * kChunkSize + x % kChunkSize];
 }
 
 bool Grid::SetOccupant(int x, int y, GridObject *occupant) {
-  Cell *cell = &grid_[x * x_size_ + y];
-  if (cell->Blacklisted) {
+  Cell *cell = GetCell(x, y);
+  if (IsBlacklisted(x, y, *cell)) {
     if (!occupant || occupant == cell->NewObject) {
       // We wouldn't do anything anyway in these cases, so this is not a
       // failure.
@@ -67,7 +78,7 @@ bool Grid::SetOccupant(int x, int y, GridObject *occupant) {
   }
 
   if (!cell->NewObject ||
-      (cell->NewObject == cell->Object && !cell->RequestStasis)) {
+      (cell->NewObject == cell->Object && !IsStasisRequested(*cell))) {
     // No occupants.
     assert(!cell->ConflictedObject && "Found conflict on vacant cell.");
     cell->NewObject = occupant;
@@ -94,7 +105,12 @@ bool Grid::SetOccupant(int x, int y, GridObject *occupant) {
 }
 
 bool Grid::PurgeNew(int x, int y, const GridObject *object) {
-  Cell *cell = &grid_[x * x_size_ + y];
+  Cell *cell = FindCell(x, y);
+  if (!cell) {
+    // Nothing has ever been here. Clearing nullptr is still a success.
+    return !object;
+  }
+
   if (object == cell->NewObject) {
     bool stasis = false;
     if (cell->ConflictedObject) {
@@ -106,6 +122,10 @@ bool Grid::PurgeNew(int x, int y, const GridObject *object) {
 
       cell->NewObject = cell->ConflictedObject;
       cell->ConflictedObject = nullptr;
+    } else if (object == cell->Object) {
+      // The occupant requested stasis, and now it's leaving. If we put it back
+      // in the pending slot, it would stay here after it moved.
+      cell->NewObject = nullptr;
     } else {
       cell->NewObject = cell->Object;
     }
@@ -126,8 +146,8 @@ bool Grid::PurgeNew(int x, int y, const GridObject *object) {
 }
 
 GridObject *Grid::GetPending(int x, int y) {
-  const Cell *cell = &grid_[x * x_size_ + y];
-  if (cell->NewObject == cell->Object && !cell->RequestStasis) {
+  const Cell *cell = &ReadCell(x, y);
+  if (cell->NewObject == cell->Object && !IsStasisRequested(*cell)) {
     // Technically, there is nothing pending insertion here.
     return nullptr;
   }
@@ -135,6 +155,10 @@ GridObject *Grid::GetPending(int x, int y) {
   return cell->NewObject;
 }
 
+bool Grid::IsStasisRequested(const Cell &cell) const {
+  return cell.RequestStasis || (cell.Object && cell.Object->immobile());
+}
+
 bool Grid::GetNeighborhoodLocations(int x, int y, ::std::list<int> *xs,
                                     ::std::list<int> *ys,
                                     int levels /* = 1*/) {
@@ -230,32 +254,312 @@ bool Grid::GetNeighborhood(
   return true;
 }
 
+bool Grid::GetVacantLocations(int x, int y, ::std::vector<int> *xs,
+                              ::std::vector<int> *ys, int levels /*= 1*/) {
+  xs->clear();
+  ys->clear();
+
+  ::std::list<int> neighborhood_xs, neighborhood_ys;
+  if (!GetNeighborhoodLocations(x, y, &neighborhood_xs, &neighborhood_ys,
+                                levels)) {
+    return false;
+  }
+
+  auto y_itr = neighborhood_ys.begin();
+  for (int neighbor_x : neighborhood_xs) {
+    const int neighbor_y = *y_itr++;
+
+    const Cell &cell = ReadCell(neighbor_x, neighbor_y);
+    if (cell.Object || cell.NewObject || cell.ConflictedObject ||
+        IsBlacklisted(neighbor_x, neighbor_y, cell)) {
+      // Something is already here, or it's about to be.
+      continue;
+    }
+
+    xs->push_back(neighbor_x);
+    ys->push_back(neighbor_y);
+  }
+
+  return true;
+}
+
+bool Grid::ExportCells(CellField field, int *values, int size) {
+  // Big grids can have more cells than fit in an int.
+  if (size < static_cast<int64_t>(x_size_) * y_size_) {
+    return false;
+  }
+
+  ::std::fill(values, values + x_size_ * y_size_, -1);
+  VisitOccupants([&](int x, int y, const GridObject &occupant) {
+    values[y * x_size_ + x] =
+        field == kCellIndex ? occupant.get_index() : occupant.group();
+  });
+
+  return true;
+}
+
+int Grid::ExportObjects(ObjectField field, double *values, int size) {
+  if (CountObjects() > size) {
+    return -1;
+  }
+
+  int count = 0;
+  VisitOccupants([&](int x, int y, const GridObject &occupant) {
+    values[count++] = GetObjectField(occupant, x, y, field);
+  });
+
+  return count;
+}
+
+double Grid::SumObjects(ObjectField field) {
+  double total = 0;
+  VisitOccupants([&](int x, int y, const GridObject &occupant) {
+    const double value = GetObjectField(occupant, x, y, field);
+    if (!isnan(value)) {
+      total += value;
+    }
+  });
+
+  return total;
+}
+
+double Grid::GetObjectField(const GridObject &occupant, int x, int y,
+                            ObjectField field) const {
+  switch (field) {
+    case kObjectIndex:
+      return occupant.get_index();
+    case kObjectX:
+      return x;
+    case kObjectY:
+      return y;
+    case kObjectGroup:
+      return occupant.group();
+    case kObjectMass:
+    case kObjectEnergy: {
+      const Organism *organism = dynamic_cast<const Organism *>(&occupant);
+      if (organism && organism->metabolism()) {
+        return field == kObjectMass ? organism->metabolism()->mass()
+                                    : organism->metabolism()->energy();
+      }
+      break;
+    }
+  }
+
+  return NAN;
+}
+
+int Grid::CountObjects() {
+  int count = 0;
+  VisitOccupants([&](int, int, const GridObject &) { ++count; });
+
+  return count;
+}
+
+int Grid::FindObjectsNear(int x, int y, int radius, int group, int *values,
+                          int size) {
+  int count = 0;
+  VisitNearby(x, y, radius, [&](int, int, int, const GridObject &occupant) {
+    if (group < 0 || occupant.group() == group) {
+      if (count < size) {
+        values[count] = occupant.get_index();
+      }
+      ++count;
+    }
+    return true;
+  });
+
+  return count;
+}
+
+int Grid::CountObjectsNear(int x, int y, int radius, int group) {
+  int count = 0;
+  VisitNearby(x, y, radius, [&](int, int, int, const GridObject &occupant) {
+    if (group < 0 || occupant.group() == group) {
+      ++count;
+    }
+    return true;
+  });
+
+  return count;
+}
+
+int Grid::FindNearest(int x, int y, int radius, const int *groups,
+                      int size) {
+  int nearest = -1;
+  int nearest_ring = 0;
+  int nearest_distance = 0;
+  VisitNearby(x, y, radius,
+              [&](int ring, int dx, int dy, const GridObject &occupant) {
+    if (nearest >= 0 && ring > nearest_ring) {
+      // Everything from here on is farther away.
+      return false;
+    }
+    if (size && ::std::find(groups, groups + size, occupant.group()) ==
+                    groups + size) {
+      return true;
+    }
+
+    const int distance = dx * dx + dy * dy;
+    if (nearest < 0 || distance < nearest_distance) {
+      nearest = occupant.get_index();
+      nearest_ring = ring;
+      nearest_distance = distance;
+    }
+    return true;
+  });
+
+  return nearest;
+}
+
 bool Grid::MoveObject(int x, int y,
                       const ::std::list<MovementFactor> &factors, int *new_x,
                       int *new_y, int levels /* = 1*/, int vision /* = -1*/) {
+  ScopedTimer timer("Grid::MoveObject");
+
   ::std::list<MovementFactor> visible_factors = factors;
   RemoveInvisible(x, y, &visible_factors, vision);
 
   ::std::list<int> xs, ys;
-  if (!GetNeighborhoodLocations(x, y, &xs, &ys, levels)) {
+  if (!GetMoveCandidates(x, y, &xs, &ys, levels)) {
+    return false;
+  }
+
+  // Bigger neighborhoods have more than eight locations, so this has to be
+  // sized to fit.
+  ::std::vector<double> probabilities(xs.size());
+  CalculateProbabilities(visible_factors, xs, ys, probabilities.data());
+  ChooseMove(x, y, xs, ys, probabilities.data(), new_x, new_y);
+
+  if (x == *new_x && y == *new_y) {
+    printf("Staying in the same place.\n");
+  }
+
+  return true;
+}
+
+bool Grid::MoveObjectInField(int x, int y, int group, int *new_x, int *new_y,
+                             int levels /* = 1*/) {
+  ::std::list<int> xs, ys;
+  if (!GetMoveCandidates(x, y, &xs, &ys, levels)) {
+    return false;
+  }
+
+  ::std::vector<double> probabilities(xs.size());
+  const PotentialField *field = GetField(group);
+  if (field) {
+    CalculateFieldProbabilities(*field, xs, ys, probabilities.data());
+  } else {
+    ::std::fill(probabilities.begin(), probabilities.end(), 1.0 / xs.size());
+  }
+  ChooseMove(x, y, xs, ys, probabilities.data(), new_x, new_y);
+
+  return true;
+}
+
+bool Grid::GetMoveCandidates(int x, int y, ::std::list<int> *xs,
+                             ::std::list<int> *ys, int levels) {
+  if (!GetNeighborhoodLocations(x, y, xs, ys, levels)) {
     return false;
   }
   // We want it to have the possibility of staying in the same place also.
-  xs.push_back(x);
-  ys.push_back(y);
+  xs->push_back(x);
+  ys->push_back(y);
   // Remove blacklisted and conflicted locations from consideration.
-  RemoveUnusable(&xs, &ys);
+  RemoveUnusable(xs, ys);
 
-  double probabilities[8];
-  CalculateProbabilities(visible_factors, xs, ys, probabilities);
+  return true;
+}
+
+void Grid::ChooseMove(int x, int y, const ::std::list<int> &xs,
+                      const ::std::list<int> &ys, double *probabilities,
+                      int *new_x, int *new_y) {
+  if (environment_) {
+    ApplyMovementCosts(x, y, xs, ys, probabilities);
+  }
 
   DoMovement(probabilities, xs, ys, new_x, new_y);
+}
 
-  if (x == *new_x && y == *new_y) {
-    printf("Staying in the same place.\n");
+void Grid::SetFieldSource(int group, int source_group, int strength,
+                          int visibility) {
+  ::std::vector<FieldSource> &sources = field_sources_[group];
+  auto existing = ::std::find_if(sources.begin(), sources.end(),
+      [source_group](const FieldSource &source) {
+        return source.SourceGroup == source_group;
+      });
+  if (existing == sources.end()) {
+    sources.push_back({source_group, strength, visibility});
+  } else {
+    existing->Strength = strength;
+    existing->Visibility = visibility;
   }
 
-  return true;
+  if (fields_.find(group) == fields_.end()) {
+    fields_.emplace(group, PotentialField(x_size_, y_size_));
+  }
+  // Don't make anyone wait for the next update to see the new sources.
+  UpdateField(group);
+}
+
+const PotentialField *Grid::GetField(int group) const {
+  auto found = fields_.find(group);
+  if (found == fields_.end()) {
+    return nullptr;
+  }
+  return &found->second;
+}
+
+double Grid::GetFieldValue(int group, int x, int y) const {
+  const PotentialField *field = GetField(group);
+  if (!field) {
+    return 0;
+  }
+  return field->Get(x, y);
+}
+
+void Grid::UpdateField(int group) {
+  PotentialField &field = fields_.find(group)->second;
+  field.Clear();
+
+  const ::std::vector<FieldSource> &sources = field_sources_[group];
+  VisitOccupants([&](int x, int y, const GridObject &occupant) {
+    // There are only ever a few kinds of sources, so it's fastest to just
+    // look through them.
+    for (const FieldSource &source : sources) {
+      if (source.SourceGroup == occupant.group()) {
+        field.AddSource(x, y, source.Strength, source.Visibility);
+      }
+    }
+  });
+}
+
+void Grid::CalculateFieldProbabilities(const PotentialField &field,
+                                       const ::std::list<int> &xs,
+                                       const ::std::list<int> &ys,
+                                       double *probabilities) {
+  // Shift everything to make it positive, the same way that
+  // CalculateProbabilities() does.
+  double min = 0;
+  auto x_itr = xs.begin();
+  auto y_itr = ys.begin();
+  for (uint32_t i = 0; i < xs.size(); ++i, ++x_itr, ++y_itr) {
+    probabilities[i] = field.Get(*x_itr, *y_itr);
+    min = ::std::min(min, probabilities[i]);
+  }
+  double total = 0;
+  for (uint32_t i = 0; i < xs.size(); ++i) {
+    probabilities[i] -= min;
+    total += probabilities[i];
+  }
+
+  for (uint32_t i = 0; i < xs.size(); ++i) {
+    if (total > 0) {
+      probabilities[i] /= total;
+    } else {
+      // Nothing here can perceive anything, or everything is the same.
+      probabilities[i] = 1.0 / xs.size();
+    }
+  }
 }
 
 void Grid::CalculateProbabilities(::std::list<MovementFactor> &factors,
@@ -321,6 +625,28 @@ void Grid::CalculateProbabilities(::std::list<MovementFactor> &factors,
   }
 }
 
+void Grid::ApplyMovementCosts(int x, int y, const ::std::list<int> &xs,
+                              const ::std::list<int> &ys,
+                              double *probabilities) {
+  double total = 0;
+  auto x_itr = xs.begin();
+  auto y_itr = ys.begin();
+  for (uint32_t i = 0; i < xs.size(); ++i, ++x_itr, ++y_itr) {
+    if (*x_itr != x || *y_itr != y) {
+      probabilities[i] /= environment_->GetMovementCost(*x_itr, *y_itr);
+    }
+    total += probabilities[i];
+  }
+
+  if (total <= 0) {
+    // Nothing changes if there's nowhere we're likely to go anyway.
+    return;
+  }
+  for (uint32_t i = 0; i < xs.size(); ++i) {
+    probabilities[i] /= total;
+  }
+}
+
 void Grid::DoMovement(const double *probabilities, const ::std::list<int> &xs,
                       const ::std::list<int> &ys, int *new_x, int *new_y) {
   // Get a random float that's somewhere between 0 and 1.
@@ -351,7 +677,10 @@ void Grid::RemoveInvisible(int x, int y, ::std::list<MovementFactor> *factors,
     const double radius = itr->GetDistance(x, y);
 
     printf("Radius: %f\n", radius);
-    if (((*itr).GetVisibility() > 0 &&
+    // Factors from dead organisms are invisible too, even if they haven't been
+    // cleaned up yet.
+    if ((itr->GetOrganism() && !itr->GetOrganism()->IsAlive()) ||
+        ((*itr).GetVisibility() > 0 &&
          radius > (*itr).GetVisibility()) ||
         (vision > 0 && radius > vision)) {
       // Decrement here so that it still points to something valid afterwards.
@@ -366,8 +695,8 @@ void Grid::RemoveUnusable(::std::list<int> *xs, ::std::list<int> *ys) {
 	auto x_itr = xs->begin();
 	auto y_itr = ys->begin();
   for (; x_itr != xs->end(); ++x_itr, ++y_itr) {
-    const Cell *cell = &grid_[*x_itr * x_size_ + *y_itr];
-    if (cell->Blacklisted || cell->ConflictedObject) {
+    const Cell *cell = &ReadCell(*x_itr, *y_itr);
+    if (IsBlacklisted(*x_itr, *y_itr, *cell) || cell->ConflictedObject) {
       // This cell is blacklisted or unusable. Remove it from consideration.
       auto temp_x = x_itr;
       auto temp_y = y_itr;
@@ -381,19 +710,59 @@ void Grid::RemoveUnusable(::std::list<int> *xs, ::std::list<int> *ys) {
 }
 
 bool Grid::Update() {
-  for (int i = 0; i < x_size_ * y_size_; ++i) {
-    if (grid_[i].ConflictedObject) {
-      // We can't update if we still have unresolved conflicts.
-      return false;
+  ScopedTimer timer("Grid::Update");
+
+  int moved_objects = 0;
+  for (auto &chunk : chunks_) {
+    if (!chunk) {
+      continue;
     }
 
-    grid_[i].Object = grid_[i].NewObject;
-    // Setting them both to be the same by default allows nullptr to be a valid
-    // thing to swap in.
-    grid_[i].Blacklisted = false;
-    grid_[i].RequestStasis = false;
+    bool empty = true;
+    for (Cell &cell : chunk->Cells) {
+      if (cell.ConflictedObject) {
+        // We can't update if we still have unresolved conflicts.
+        return false;
+      }
+
+      if (cell.NewObject && cell.Object != cell.NewObject) {
+        // Only count the cell that something arrived in, so that moving
+        // doesn't count twice.
+        ++moved_objects;
+      }
+      cell.Object = cell.NewObject;
+      // Setting them both to be the same by default allows nullptr to be a
+      // valid thing to swap in.
+      cell.Blacklisted = false;
+      cell.RequestStasis = false;
+
+      if (cell.Object) {
+        empty = false;
+      }
+    }
+
+    if (empty) {
+      // Nothing is here anymore, so we don't need to keep it around.
+      chunk.reset();
+      --allocated_chunks_;
+    }
   }
+  moved_objects_ = moved_objects;
 
+  for (auto &group_and_field : fields_) {
+    UpdateField(group_and_field.first);
+  }
+
+  return true;
+}
+
+bool Grid::SetEnvironment(const Environment *environment) {
+  if (environment && (environment->x_size() != x_size_ ||
+                      environment->y_size() != y_size_)) {
+    return false;
+  }
+
+  environment_ = environment;
   return true;
 }
 
@@ -402,10 +771,16 @@ void Grid::GetConflicted(::std::vector<GridObject *> *objects1,
   objects1->clear();
   objects2->clear();
 
-  for (int i = 0; i < x_size_ * y_size_; ++i) {
-    if (grid_[i].ConflictedObject) {
-      objects1->push_back(grid_[i].NewObject);
-      objects2->push_back(grid_[i].ConflictedObject);
+  for (auto &chunk : chunks_) {
+    if (!chunk) {
+      continue;
+    }
+
+    for (const Cell &cell : chunk->Cells) {
+      if (cell.ConflictedObject) {
+        objects1->push_back(cell.NewObject);
+        objects2->push_back(cell.ConflictedObject);
+      }
     }
   }
 }
@@ -1,11 +1,17 @@
 #ifndef ECOSYSTEM_AUTOMATA_GRID_H_
 #define ECOSYSTEM_AUTOMATA_GRID_H_
 
+#include <algorithm>
 #include <list>
+#include <map>
+#include <memory>
 #include <vector>
 
+#include "automata/environment.h"
 #include "automata/macros.h"
+#include "automata/memory_stats.h"
 #include "automata/movement_factor.h"
+#include "automata/potential_field.h"
 
 // Defines functions for dealing with the grid at a low level.
 
@@ -22,6 +28,8 @@ namespace testing {
 class AutomataTest_MotionTest_Test;
 class AutomataTest_MotionFactorsTest_Test;
 class AutomataTest_OutOfBoundsTest_Test;
+class AutomataTest_DeadFactorTest_Test;
+class AutomataTest_FieldTest_Test;
 }  //  namespace testing
 
 // Forward declaration of GridObject to break circular dependency.
@@ -53,7 +61,11 @@ class Grid {
   // x: The x coordinate of the location to purge.
   // y: The y coordinate of the location to purge.
   void ForcePurgeOccupant(int x, int y) {
-    Cell *cell = &grid_[x * x_size_ + y];
+    Cell *cell = FindCell(x, y);
+    if (!cell) {
+      // Nothing has ever been here.
+      return;
+    }
 
     if (cell->NewObject == cell->Object) {
       cell->NewObject = nullptr;
@@ -63,8 +75,8 @@ class Grid {
   // x: The x coordinate of the cell's location.
   // y: The y coordinate of the cell's location.
   // Returns: The occupant of the cell, or nullptr if that cell has no occupant.
-  GridObject *GetOccupant(int x, int y) {
-    return grid_[x * x_size_ + y].Object;
+  GridObject *GetOccupant(int x, int y) const {
+    return ReadCell(x, y).Object;
   }
   // Gets any occupant pending insertion at this cell.
   // x: The x coordinate of the cell's location.
@@ -77,12 +89,13 @@ class Grid {
   // y: The y coordinate of the cell's location.
   // Returns: The contents of the cell's conflicted slot.
   GridObject *GetConflict(int x, int y) const {
-    return grid_[x * x_size_ + y].ConflictedObject;
+    return ReadCell(x, y).ConflictedObject;
   }
   // Clears an object that is pending insertion at this cell. It will not
   // generate conflicts. Will clear anything pending insertion, including
   // nullptr. If object matches the conflicted object instead of the one pending
-  // insertion, it will clear the conflicted slot instead.
+  // insertion, it will clear the conflicted slot instead. If object is the
+  // cell's current occupant, which requested stasis, the cell will be vacated.
   // x: The x coordinate of the cell.
   // y: The y coordinate of the cell.
   // object: The object to clear from the cell.
@@ -94,7 +107,12 @@ class Grid {
   // y: The y coordinate of the cell.
   // blacklist: The blacklist status to set.
   void SetBlacklisted(int x, int y, bool blacklist) {
-    grid_[x * x_size_ + y].Blacklisted = blacklist;
+    if (!blacklist && !FindCell(x, y)) {
+      // It isn't blacklisted, and there's no need to allocate it just to say
+      // so.
+      return;
+    }
+    GetCell(x, y)->Blacklisted = blacklist;
   }
   // Gets the occupants of the locations in the extended neighborhood around
   // a specific location.
@@ -112,6 +130,94 @@ class Grid {
   bool GetNeighborhood(int x, int y,
                        ::std::vector< ::std::vector<GridObject *> > *objects,
                        int levels = 1, bool get_new = false);
+  // Gets the locations in the extended neighborhood around a specific location
+  // that nothing is in or about to move into. The vectors are cleared first,
+  // but they keep their capacity, so callers can reuse them.
+  // x: The x coordinate of the center cell.
+  // y: The y coordinate of the center cell.
+  // xs: Vector to be filled with the x coordinates of the vacant locations.
+  // ys: Vector to be filled with the y coordinates of the vacant locations.
+  // levels: How big the neighborhood is. See GetNeighborhood.
+  // Returns: True if it suceeds, false if the center cell is out of bounds
+  // of the grid.
+  bool GetVacantLocations(int x, int y, ::std::vector<int> *xs,
+                          ::std::vector<int> *ys, int levels = 1);
+  // The things that ExportCells() can write out about each cell.
+  enum CellField {
+    // The index of the object in the cell.
+    kCellIndex,
+    // The group of the object in the cell.
+    kCellGroup,
+  };
+  // Writes out one thing about every cell on the grid, from the last time it
+  // was updated. Cells are written in row-major order, so the cell at (x, y)
+  // ends up at y * x_size + x.
+  // field: What to write out. Empty cells are always -1.
+  // values: The buffer to write to.
+  // size: How many values fit in the buffer.
+  // Returns: True if it succeeds, false if the buffer is too small to hold
+  // every cell.
+  bool ExportCells(CellField field, int *values, int size);
+  // The things that ExportObjects() can write out about each object.
+  enum ObjectField {
+    kObjectIndex,
+    kObjectX,
+    kObjectY,
+    kObjectGroup,
+    // Objects that aren't organisms, or don't have a metabolism, get NaN for
+    // these.
+    kObjectMass,
+    kObjectEnergy,
+  };
+  // Writes out one thing about every object on the grid, from the last time it
+  // was updated. Objects are written in the order of the cells they are in, so
+  // separate calls line up with each other as long as the grid isn't updated
+  // in between. Dead objects are never on the grid.
+  // field: What to write out.
+  // values: The buffer to write to.
+  // size: How many values fit in the buffer.
+  // Returns: The number of objects written, or -1 if the buffer is too small
+  // to hold all of them.
+  int ExportObjects(ObjectField field, double *values, int size);
+  // Adds up one thing about every object on the grid, from the last time it
+  // was updated. Objects that would export NaN are left out.
+  // field: What to add up.
+  // Returns: The total.
+  double SumObjects(ObjectField field);
+  // Returns: The number of objects on the grid, from the last time it was
+  // updated.
+  int CountObjects();
+  // Finds the objects in a group around a location, from the last time the
+  // grid was updated. The center cell itself doesn't count. Objects come out
+  // one ring of cells at a time, starting with the closest, and in row-major
+  // order within each ring.
+  // x: The x coordinate of the center cell.
+  // y: The y coordinate of the center cell.
+  // radius: How many rings of cells to look in. See GetNeighborhood().
+  // group: Only find objects in this group, or -1 to find all of them.
+  // values: Gets filled with the indices of the objects.
+  // size: How many indices fit in values.
+  // Returns: How many objects there are. If that is more than size, only the
+  // first size of them get written, and the caller can try again with a
+  // bigger buffer.
+  int FindObjectsNear(int x, int y, int radius, int group, int *values,
+                      int size);
+  // Counts the objects in a group around a location. The arguments are the
+  // same as for FindObjectsNear().
+  // Returns: How many objects there are.
+  int CountObjectsNear(int x, int y, int radius, int group);
+  // Finds the closest object in any of a set of groups to a location. Distance
+  // is measured in rings of cells, like everything else on the grid, and ties
+  // go to the object that is closest in a straight line, and then to the first
+  // one in row-major order.
+  // x: The x coordinate of the center cell.
+  // y: The y coordinate of the center cell.
+  // radius: How many rings of cells to look in.
+  // groups: The groups to look for. If there aren't any, objects in every group
+  // count.
+  // size: How many groups there are.
+  // Returns: The index of the object, or -1 if there isn't one.
+  int FindNearest(int x, int y, int radius, const int *groups, int size);
   // Takes a vector of movement factors, and chooses a location for a grid
   // object to move to.
   // x: x coordinate of the organism's current position.
@@ -126,12 +232,52 @@ class Grid {
   // perceive it.
   bool MoveObject(int x, int y, const ::std::list<MovementFactor> &factors,
                   int *new_x, int *new_y, int levels = 1, int vision = -1);
+  // Chooses a location for a grid object to move to, like MoveObject(), but
+  // using the potential field for the object's group instead of a list of
+  // movement factors. This costs the same no matter how many things the object
+  // can perceive.
+  // x: x coordinate of the object's current position.
+  // y: y coordinate of the object's current position.
+  // group: The group of the object, which picks the field to use. If the
+  // group has no field, every location is equally likely.
+  // new_x: The x coordinate of the object's new position.
+  // new_y: The y coordinate of the object's new position.
+  // levels: See MoveObject().
+  // Returns: false if the object's position is out of bounds.
+  bool MoveObjectInField(int x, int y, int group, int *new_x, int *new_y,
+                         int levels = 1);
+  // Makes the objects in one group show up in the potential field for another
+  // group. Each group that has any sources gets its own field, which gets
+  // rebuilt from the positions of everything on the grid every time the grid is
+  // updated. Setting a source for the same pair of groups again replaces it.
+  // group: The group whose field the sources go in.
+  // source_group: The group whose objects are the sources.
+  // strength: The strength of each source. Positive means attractive, negative
+  // means repulsive.
+  // visibility: How far away the sources can be perceived from, in cells. Zero
+  // or less means that there is no limit.
+  void SetFieldSource(int group, int source_group, int strength,
+                      int visibility);
+  // group: The group to get the field for.
+  // Returns: The potential field for that group, or nullptr if it has none.
+  const PotentialField *GetField(int group) const;
+  // group: The group to get the field for.
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: The value of the group's potential field at that cell, or 0 if
+  // the group has no field.
+  double GetFieldValue(int group, int x, int y) const;
   // "Bakes" the state of the grid. Commits any new changes that were made since
   // the last time this was called to the actual grid. Also un-blacklists all
-  // cells on the grid.
+  // cells on the grid. Cells that the environment blocks stay blacklisted
+  // anyway.
   // Returns: false if any cell on the grid remains in a conflicted state. All
   // conflicts must be resolved before running this.
   bool Update();
+  // Returns: How many objects ended up in a different cell the last time the
+  // grid was updated, including ones that were just added to it. Objects that
+  // were removed don't count.
+  int moved_objects() const { return moved_objects_; }
   // Populates two lists with the objects currently involved in conflicts on the
   // grid.
   // objects1: The first set of objects.
@@ -144,6 +290,22 @@ class Grid {
   // Sets the scale of the grid.
   // scale: The length of one side of a grid square.
   void set_scale(double scale) { grid_scale_ = scale; }
+  // Sets the environment that the grid is in. Cells that it blocks are always
+  // blacklisted, without having to allocate them, and things are less likely
+  // to move into cells that cost more to move into. The grid does not take
+  // ownership of it.
+  // environment: The environment, or nullptr to go without one.
+  // Returns: false if the environment is not the same size as the grid.
+  bool SetEnvironment(const Environment *environment);
+  // Returns: The environment that the grid is in, or nullptr if it doesn't
+  // have one.
+  const Environment *environment() const { return environment_; }
+  // Returns: How many chunks of cells are allocated right now. Each one holds
+  // kChunkSize * kChunkSize cells.
+  int allocated_chunks() const { return allocated_chunks_; }
+
+  // How many cells there are on each side of a chunk.
+  static constexpr int kChunkSize = 32;
 
  private:
   DISSALOW_COPY_AND_ASSIGN(Grid);
@@ -151,28 +313,107 @@ class Grid {
   friend class testing::AutomataTest_MotionTest_Test;
   friend class testing::AutomataTest_MotionFactorsTest_Test;
   friend class testing::AutomataTest_OutOfBoundsTest_Test;
+  friend class testing::AutomataTest_DeadFactorTest_Test;
+  friend class testing::AutomataTest_FieldTest_Test;
 
   // A structure for representing cells in the grid.
   struct Cell {
     // The object that is currently occupying the cell.
-    GridObject *Object;
+    GridObject *Object = nullptr;
     // This object gets filled in to temporarily hold the next occupant of
     // the cell before Update() is run.
-    GridObject *NewObject;
+    GridObject *NewObject = nullptr;
     // This object gets filled in if we have a conflict.
-    GridObject *ConflictedObject;
+    GridObject *ConflictedObject = nullptr;
     // Whether we want to prevent things from moving here. This flag is mostly
     // meant to be used by things outside the grid to explicitly restrict
     // movement. It is meant to be set for a very limited time period, and gets
     // cleared at the end of every cycle.
-    bool Blacklisted;
+    bool Blacklisted = false;
     // Whether we want to request that this cell keeps its same occupant for the
     // next cycle. Normally, this is just the default and anything else
     // automatically overrides it, but setting this flag makes it conflict
-    // instead.
-    bool RequestStasis;
+    // instead. Immobile occupants behave as if this were always set.
+    bool RequestStasis = false;
+  };
+
+  // A square tile of cells. Cells are stored in chunks, which only get
+  // allocated once something needs to be stored in one of their cells, and get
+  // freed again when the grid is updated and they are empty. That way, memory
+  // scales with how much of the grid is in use, not how big it is. Like the
+  // grid itself, the cells are in row-major order.
+  struct Chunk : public Counted<MemoryStats::kGridChunks, Chunk> {
+    Cell Cells[kChunkSize * kChunkSize];
   };
 
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: The index of the chunk that the cell is in.
+  int GetChunkIndex(int x, int y) const {
+    return (y / kChunkSize) * x_chunks_ + x / kChunkSize;
+  }
+  // Finds a cell without allocating anything.
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: The cell, or nullptr if its chunk isn't allocated.
+  Cell *FindCell(int x, int y) const {
+    Chunk *chunk = chunks_[GetChunkIndex(x, y)].get();
+    if (!chunk) {
+      return nullptr;
+    }
+    return &chunk->Cells[(y % kChunkSize) * kChunkSize + x % kChunkSize];
+  }
+  // Gets a cell for reading. Cells in chunks that aren't allocated are empty.
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: The cell.
+  const Cell &ReadCell(int x, int y) const {
+    const Cell *cell = FindCell(x, y);
+    return cell ? *cell : kEmptyCell;
+  }
+  // Gets a cell for writing, allocating its chunk if necessary.
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: The cell.
+  Cell *GetCell(int x, int y);
+  // Calls a function for every object on the grid, as of the last update, in
+  // row-major order. Chunks that aren't allocated get skipped entirely.
+  // visit: Gets called with the x coordinate, y coordinate, and a reference to
+  // each object.
+  template <typename Visitor>
+  void VisitOccupants(Visitor visit) const;
+  // Calls a function for every occupied cell around a location, one ring at a
+  // time. See FindObjectsNear() for the order.
+  // x: The x coordinate of the center cell.
+  // y: The y coordinate of the center cell.
+  // radius: How many rings of cells to look in.
+  // visit: Gets called with the ring that a cell is in, its offset from the
+  // center, and its occupant. It returns false to stop early.
+  template <typename Visitor>
+  void VisitNearby(int x, int y, int radius, Visitor visit) const;
+
+  // One kind of source for a potential field. See SetFieldSource().
+  struct FieldSource {
+    // The group whose objects are the sources.
+    int SourceGroup;
+    int Strength;
+    int Visibility;
+  };
+
+  // Determines whether a cell's current occupant is going to stay there for
+  // the next cycle, either because it explicitly requested it, or because it is
+  // immobile.
+  // cell: The cell to check.
+  // Returns: true if the occupant is staying, false otherwise.
+  bool IsStasisRequested(const Cell &cell) const;
+  // Gets one thing about an object on the grid. See ExportObjects().
+  // occupant: The object.
+  // x: The x coordinate of the object.
+  // y: The y coordinate of the object.
+  // field: What to get.
+  // Returns: The value of the field.
+  double GetObjectField(const GridObject &occupant, int x, int y,
+                        ObjectField field) const;
   // Calculates the probability of moving to every square in the extended
   // neighborhood.
   // factors: a vector of factors in the grid, which are used to calculate the
@@ -185,6 +426,44 @@ class Grid {
                               const ::std::list<int> &xs,
                               const ::std::list<int> &ys,
                               double *probabilities);
+  // Calculates the probability of moving to every square in the extended
+  // neighborhood from a potential field. It works the same way as
+  // CalculateProbabilities(), so the two agree when the field holds the same
+  // sources as the factors.
+  // field: The field to use.
+  // xs: The x coordinates of the locations in the neighborhood.
+  // ys: The y coordinates of the locations in the neighborhood.
+  // probabilities: Gets filled with the probability for each location.
+  void CalculateFieldProbabilities(const PotentialField &field,
+                                   const ::std::list<int> &xs,
+                                   const ::std::list<int> &ys,
+                                   double *probabilities);
+  // Gets all the locations that an object could move to, including staying
+  // where it is, leaving out any that are blacklisted or conflicted.
+  // x: The x coordinate of the object's current position.
+  // y: The y coordinate of the object's current position.
+  // xs: List to be filled with the x coordinates of the locations.
+  // ys: List to be filled with the y coordinates of the locations.
+  // levels: How big the neighborhood is. See GetNeighborhoodLocations().
+  // Returns: false if the object's position is out of bounds.
+  bool GetMoveCandidates(int x, int y, ::std::list<int> *xs,
+                         ::std::list<int> *ys, int levels);
+  // Takes the probabilities of moving to each candidate location, adjusts
+  // them for the environment, and picks one.
+  // x: The x coordinate of the object's current position.
+  // y: The y coordinate of the object's current position.
+  // xs: The x coordinates of the candidate locations.
+  // ys: The y coordinates of the candidate locations.
+  // probabilities: The probability of moving to each location.
+  // new_x: The x coordinate of the object's new position.
+  // new_y: The y coordinate of the object's new position.
+  void ChooseMove(int x, int y, const ::std::list<int> &xs,
+                  const ::std::list<int> &ys, double *probabilities,
+                  int *new_x, int *new_y);
+  // Rebuilds the potential field for a group from where everything is on the
+  // grid.
+  // group: The group to rebuild the field for.
+  void UpdateField(int group);
   // Gets the locations that are in a neighborhood.
   // If any locations that should be in the neighborhood are outside the bounds
   // of the grid, they will not be included.
@@ -214,6 +493,26 @@ class Grid {
   // new_y: The y coordinate of the organism's new location.
   void DoMovement(const double *probabilities, const ::std::list<int> &xs,
                   const ::std::list<int> &ys, int *new_x, int *new_y);
+  // Makes cells less likely to be moved into in proportion to how much it
+  // costs to move into them, according to the environment. Staying in the same
+  // place doesn't cost anything.
+  // x: The x coordinate of the object's current position.
+  // y: The y coordinate of the object's current position.
+  // xs: The x coordinates of the locations in the neighborhood.
+  // ys: The y coordinates of the locations in the neighborhood.
+  // probabilities: The probabilities of moving to each location, which get
+  // changed in place. They still add up to one afterwards.
+  void ApplyMovementCosts(int x, int y, const ::std::list<int> &xs,
+                          const ::std::list<int> &ys, double *probabilities);
+  // Checks whether a cell is blacklisted, either because someone set it that
+  // way, or because the environment blocks it.
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // cell: The cell itself.
+  // Returns: true if nothing can go there.
+  bool IsBlacklisted(int x, int y, const Cell &cell) const {
+    return cell.Blacklisted || (environment_ && environment_->IsBlocked(x, y));
+  }
   // Looks at factor visibilities and removes any that are not visible to the
   // object.
   // x: The x coordinate of the objects's position.
@@ -223,8 +522,8 @@ class Grid {
   // perceive it. A negative value means that there is no limit.
   void RemoveInvisible(int x, int y, ::std::list<MovementFactor> *factors,
                        int vision);
-  // Removes any cells for which the Blacklisted attribute is set to true or
-  // which are conflicted from consideration for movement.
+  // Removes any cells that are blacklisted or which are conflicted from
+  // consideration for movement.
   // xs: The x coordinates of the cells to consider.
   // ys: The y coordinates of the cells to consider.
   void RemoveUnusable(::std::list<int> *xs, ::std::list<int> *ys);
@@ -237,12 +536,86 @@ class Grid {
   // The dimensions of the grid.
   int x_size_;
   int y_size_;
-  // A pointer to the underlying grid array.
-  Cell *grid_;
+  // The dimensions of the grid, in chunks.
+  int x_chunks_;
+  int y_chunks_;
+  // Every chunk on the grid, in row-major order. The ones that aren't
+  // allocated are null.
+  ::std::vector<::std::unique_ptr<Chunk>> chunks_;
+  // How many chunks are allocated.
+  int allocated_chunks_ = 0;
+  // What cells in chunks that aren't allocated look like.
+  static const Cell kEmptyCell;
   // The size of one side of a grid square.
   double grid_scale_ = -1;
+  // The environment that the grid is in.
+  const Environment *environment_ = nullptr;
+  // How many objects moved the last time the grid was updated.
+  int moved_objects_ = 0;
+  // The sources for the potential field of each group, keyed by group.
+  ::std::map<int, ::std::vector<FieldSource>> field_sources_;
+  // The potential field of each group that has sources, keyed by group.
+  ::std::map<int, PotentialField> fields_;
 };
 
+template <typename Visitor>
+void Grid::VisitOccupants(Visitor visit) const {
+  // The columns of the allocated chunks in the current row of chunks.
+  ::std::vector<int> columns;
+  for (int chunk_y = 0; chunk_y < y_chunks_; ++chunk_y) {
+    columns.clear();
+    for (int chunk_x = 0; chunk_x < x_chunks_; ++chunk_x) {
+      if (chunks_[chunk_y * x_chunks_ + chunk_x]) {
+        columns.push_back(chunk_x);
+      }
+    }
+    if (columns.empty()) {
+      continue;
+    }
+
+    const int end_y = ::std::min((chunk_y + 1) * kChunkSize, y_size_);
+    for (int y = chunk_y * kChunkSize; y < end_y; ++y) {
+      for (int chunk_x : columns) {
+        const Chunk &chunk = *chunks_[chunk_y * x_chunks_ + chunk_x];
+        const Cell *row = &chunk.Cells[(y % kChunkSize) * kChunkSize];
+        const int start_x = chunk_x * kChunkSize;
+        const int end_x = ::std::min(kChunkSize, x_size_ - start_x);
+        for (int x = 0; x < end_x; ++x) {
+          if (row[x].Object) {
+            visit(start_x + x, y, *row[x].Object);
+          }
+        }
+      }
+    }
+  }
+}
+
+template <typename Visitor>
+void Grid::VisitNearby(int x, int y, int radius, Visitor visit) const {
+  for (int ring = 1; ring <= radius; ++ring) {
+    // Don't bother with the parts of the ring that are off the grid.
+    const int start_y = ::std::max(y - ring, 0);
+    const int end_y = ::std::min(y + ring, y_size_ - 1);
+    for (int cell_y = start_y; cell_y <= end_y; ++cell_y) {
+      const int dy = cell_y - y;
+      // The top and bottom rows are whole, but in between we only want the
+      // two ends.
+      const int step = (dy == -ring || dy == ring) ? 1 : ring * 2;
+      for (int dx = -ring; dx <= ring; dx += step) {
+        const int cell_x = x + dx;
+        if (cell_x < 0 || cell_x >= x_size_) {
+          continue;
+        }
+
+        const GridObject *occupant = ReadCell(cell_x, cell_y).Object;
+        if (occupant && !visit(ring, dx, dy, *occupant)) {
+          return;
+        }
+      }
+    }
+  }
+}
+
 }  // namespace automata
 
 #endif
@@ -43,6 +43,9 @@ bool GridObject::SetPosition(int x, int y) {
   bool request_stasis = false;
   if (x == x_ && y == y_) {
     request_stasis = true;
+  } else if (immobile_) {
+    // We can't go anywhere.
+    return false;
   }
 
   // Set ourselves at our new location.
@@ -31,6 +31,11 @@ class GridObject {
   void set_index(int index) { index_ = index; }
   // Returns: The organism's index in the Python code.
   int get_index() const { return index_; };
+  // Sets which group the object belongs to, for instance its species.
+  // group: The ID of the group, or -1 if it isn't in one.
+  void set_group(int group) { group_ = group; }
+  // Returns: The ID of the object's group, or -1 if it isn't in one.
+  int group() const { return group_; }
   // Set the position of the object.
   // x: The x coordinate of the object's position.
   // y: The y coordinate of the object's position.
@@ -58,6 +63,14 @@ class GridObject {
   // Returns: A pointer to the object we are conflicted with, or nullptr if we
   // are not conflicted with anybody.
   GridObject *GetConflict();
+  // Sets whether the object is immobile. An immobile object stays where it is
+  // without having to request stasis every cycle, so anything that tries to
+  // move into its cell will still generate a conflict. Immobile objects can't
+  // be moved with SetPosition().
+  // immobile: Whether the object should be immobile.
+  void set_immobile(bool immobile) { immobile_ = immobile; }
+  // Returns: Whether the object is immobile.
+  bool immobile() const { return immobile_; }
 
  protected:
   // x and y coordinates of the object's position, present and past, index of
@@ -65,12 +78,16 @@ class GridObject {
   int x_, y_, index_;
   int last_x_ = -1;
   int last_y_ = -1;
+  // The group that the object belongs to.
+  int group_ = -1;
 
   // The grid that this object exists on.
   Grid *grid_;
 
   // Whether we are on the grid or not.
   bool on_grid_ = false;
+  // Whether we are permanently staying in the same place.
+  bool immobile_ = false;
 
  private:
   DISSALOW_COPY_AND_ASSIGN(GridObject);
@@ -0,0 +1,16 @@
+#include "automata/memory_stats.h"
+
+namespace automata {
+
+int MemoryStats::counts_[kNumSubsystems] = {};
+int64_t MemoryStats::bytes_[kNumSubsystems] = {};
+
+int MemoryStats::GetCount(Subsystem subsystem) {
+  return counts_[subsystem];
+}
+
+double MemoryStats::GetBytes(Subsystem subsystem) {
+  return bytes_[subsystem];
+}
+
+}  // namespace automata
@@ -0,0 +1,75 @@
+#ifndef ECOSYSTEM_AUTOMATA_MEMORY_STATS_H_
+#define ECOSYSTEM_AUTOMATA_MEMORY_STATS_H_
+
+#include <stdint.h>
+
+namespace automata {
+
+// Keeps track of how much memory the biggest things in the C++ code are using,
+// so that we can tell where it all goes. It only counts the objects
+// themselves, not anything they point to, and it is only meant to be used from
+// one thread.
+class MemoryStats {
+ public:
+  // The things that we keep track of.
+  enum Subsystem {
+    // The chunks of cells that make up grids.
+    kGridChunks,
+    // Organisms, not including their movement factors.
+    kOrganisms,
+    // Movement factors, including the list nodes that hold them.
+    kMovementFactors,
+    // The metabolisms of organisms.
+    kMetabolisms,
+    kNumSubsystems,
+  };
+
+  // Notes that an object was created.
+  // subsystem: What the object is part of.
+  // bytes: How big it is.
+  static void Allocated(Subsystem subsystem, int bytes) {
+    ++counts_[subsystem];
+    bytes_[subsystem] += bytes;
+  }
+  // Notes that an object was destroyed.
+  // subsystem: What the object is part of.
+  // bytes: How big it is.
+  static void Freed(Subsystem subsystem, int bytes) {
+    --counts_[subsystem];
+    bytes_[subsystem] -= bytes;
+  }
+
+  // subsystem: The subsystem to look at.
+  // Returns: How many objects in that subsystem there are right now.
+  static int GetCount(Subsystem subsystem);
+  // subsystem: The subsystem to look at.
+  // Returns: How many bytes the objects in that subsystem take up right now.
+  // It's a double so that it can get to Python without any trouble.
+  static double GetBytes(Subsystem subsystem);
+
+ private:
+  static int counts_[kNumSubsystems];
+  static int64_t bytes_[kNumSubsystems];
+};
+
+// Makes a class count its objects in MemoryStats. It's meant to be used as a
+// base class, like this:
+//   class Thing : public Counted<MemoryStats::kThings, Thing> { ... };
+// It doesn't make anything bigger, and it counts copies too.
+// subsystem: What the objects are part of.
+// T: The class of the objects.
+// overhead: How much memory each object needs besides itself, in bytes.
+template <MemoryStats::Subsystem subsystem, typename T, int overhead = 0>
+class Counted {
+ protected:
+  Counted() { MemoryStats::Allocated(subsystem, sizeof(T) + overhead); }
+  Counted(const Counted &other) {
+    MemoryStats::Allocated(subsystem, sizeof(T) + overhead);
+  }
+  Counted &operator=(const Counted &other) = default;
+  ~Counted() { MemoryStats::Freed(subsystem, sizeof(T) + overhead); }
+};
+
+}  // namespace automata
+
+#endif  // ECOSYSTEM_AUTOMATA_MEMORY_STATS_H_
@@ -1,6 +1,7 @@
 #include <cmath>
 
 #include "animal_metabolism.h"
+#include "automata/trace.h"
 
 namespace automata {
 namespace metabolism {
@@ -47,6 +48,8 @@ void AnimalMetabolism::Consume(const Metabolism *metabolism) {
 }
 
 void AnimalMetabolism::Update(int time) {
+  ScopedTimer timer("AnimalMetabolism::Update");
+
   // Calculate energy losses due to basal metabolic rate.
   UpdateBasalRate();
   const double energy_loss = basal_rate_ * time;
@@ -1,13 +1,16 @@
 #ifndef ECOSYSTEM_AUTOMATA_METABOLISM_ANIMAL_METABOLISM_H_
 #define ECOSYSTEM_AUTOMATA_METABOLISM_ANIMAL_METABOLISM_H_
 
+#include "automata/memory_stats.h"
 #include "automata/metabolism/metabolism.h"
 
 namespace automata {
 namespace metabolism {
 
 // Class for simulating animal metabolism.
-class AnimalMetabolism : public Metabolism {
+class AnimalMetabolism
+    : public Metabolism,
+      public Counted<MemoryStats::kMetabolisms, AnimalMetabolism> {
  public:
   // mass: The initial total mass of the animal. (kg)
   // fat_mass: The initial mass of the animal's fat reserves. (kg)
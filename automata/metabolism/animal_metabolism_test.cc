@@ -52,6 +52,20 @@ TEST_F(AnimalMetabolismTest, Update) {
   EXPECT_LT(metabolism_.mass() - new_mass, mass_change);
 }
 
+// Can we set the state directly, and does it carry on from there?
+TEST_F(AnimalMetabolismTest, SetState) {
+  AnimalMetabolism copy(1.0, 0.5, kBodyTemp, kScale, kDragCoefficient);
+  metabolism_.Update(10);
+  copy.SetState(metabolism_.mass(), metabolism_.energy());
+  EXPECT_EQ(metabolism_.mass(), copy.mass());
+  EXPECT_EQ(metabolism_.energy(), copy.energy());
+
+  metabolism_.Update(10);
+  copy.Update(10);
+  EXPECT_DOUBLE_EQ(metabolism_.mass(), copy.mass());
+  EXPECT_DOUBLE_EQ(metabolism_.energy(), copy.energy());
+}
+
 // Can we use energy the way we expect?
 TEST_F(AnimalMetabolismTest, UseEnergy) {
   const double start_energy = metabolism_.energy();
@@ -105,5 +119,41 @@ TEST_F(AnimalMetabolismTest, BasalRateUpdateTest) {
   EXPECT_LT(new_energy - metabolism_.energy(), energy_loss);
 }
 
+// Does fast-forwarding give us the same thing as updating repeatedly?
+TEST_F(AnimalMetabolismTest, FastForwardTest) {
+  AnimalMetabolism stepped(kInitialMass, kFatMass, kBodyTemp, kScale,
+                           kDragCoefficient);
+  for (int i = 0; i < 5; ++i) {
+    stepped.Update(10);
+  }
+
+  EXPECT_EQ(5, metabolism_.FastForward(10, 5));
+  EXPECT_DOUBLE_EQ(stepped.energy(), metabolism_.energy());
+  EXPECT_DOUBLE_EQ(stepped.mass(), metabolism_.mass());
+
+  // Leave just enough energy for two more iterations.
+  stepped.Update(10);
+  const double iteration_loss = metabolism_.energy() - stepped.energy();
+  metabolism_.UseEnergy(metabolism_.energy() - iteration_loss * 1.5);
+
+  // It should tell us exactly when it ran out.
+  EXPECT_EQ(2, metabolism_.FastForward(10, 100));
+  EXPECT_LE(metabolism_.energy(), 0.0);
+}
+
+// Do steps that aren't whole numbers still add up to the right amount of time?
+TEST_F(AnimalMetabolismTest, FractionalFastForwardTest) {
+  AnimalMetabolism stepped(kInitialMass, kFatMass, kBodyTemp, kScale,
+                           kDragCoefficient);
+  stepped.Update(3);
+  stepped.Update(2);
+  stepped.Update(3);
+  stepped.Update(2);
+
+  EXPECT_EQ(4, metabolism_.FastForward(2.5, 4));
+  EXPECT_DOUBLE_EQ(stepped.energy(), metabolism_.energy());
+  EXPECT_DOUBLE_EQ(stepped.mass(), metabolism_.mass());
+}
+
 }  // namespace metabolism
 }  // namespace automata
@@ -6,6 +6,11 @@
       'sources': [
         'plant_metabolism.cc',
         'animal_metabolism.cc',
+        'random_stream.cc',
+      ],
+      'dependencies': [
+        # For the environment that plants get their sunlight from.
+        '../automata.gyp:automata',
       ],
     },
     {
@@ -19,6 +24,17 @@
         '<(externals):gtest',
       ],
     },
+    {
+      'target_name': 'random_stream_test',
+      'type': 'executable',
+      'sources': [
+        'random_stream_test.cc',
+      ],
+      'dependencies': [
+        'metabolism',
+        '<(externals):gtest',
+      ],
+    },
     {
       'target_name': 'animal_metabolism_test',
       'type': 'executable',
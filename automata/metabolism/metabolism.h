@@ -1,6 +1,8 @@
 #ifndef ECOSYSTEM_AUTOMATA_METABOLISM_METABOLISM_H_
 #define ECOSYSTEM_AUTOMATA_METABOLISM_METABOLISM_H_
 
+#include <cmath>
+
 namespace automata {
 namespace metabolism {
 
@@ -17,6 +19,37 @@ class Metabolism {
   // Subtracts a given amount of energy from the organism to be used.
   // amount: Joules of energy to use.
   virtual void UseEnergy(double amount) = 0;
+  // Advances the metabolism by a number of iterations at once. This is meant
+  // for handlers that don't run every iteration, so that they can catch up on
+  // the ones they skipped in one call. By default, it just runs Update() for
+  // each iteration.
+  // time: How much time each iteration takes. (s) This doesn't have to be a
+  // whole number, in which case Update() gets steps that are rounded so that
+  // they still add up to the right total.
+  // iterations: How many iterations to advance by.
+  // Returns: The number of iterations that were simulated. If the organism ran
+  // out of energy, this is the iteration where that happened, and the
+  // metabolism is left in the state it was in at that point.
+  virtual int FastForward(double time, int iterations) {
+    for (int i = 1; i <= iterations; ++i) {
+      Update(::std::lround(time * i) - ::std::lround(time * (i - 1)));
+      if (energy_ <= 0) {
+        return i;
+      }
+    }
+    return iterations;
+  }
+
+  // Sets the mass and energy of the organism directly, so that it can be
+  // recreated somewhere else, like in another process, without losing its
+  // state. Anything that depends on them gets worked out again on the next
+  // update.
+  // mass: The new mass. (kg)
+  // energy: The new energy reserves. (J)
+  void SetState(double mass, double energy) {
+    mass_ = mass;
+    energy_ = energy;
+  }
 
   // Returns: The current mass of the organism in Kg's.
   double mass() const { return mass_; }
@@ -1,6 +1,8 @@
-#include <time.h>
+#include <algorithm>
+#include <cmath>
 
 #include "automata/metabolism/plant_metabolism.h"
+#include "automata/trace.h"
 
 namespace automata {
 namespace metabolism {
@@ -25,8 +27,9 @@ PlantMetabolism::PlantMetabolism(double mass, double efficiency,
                                  double lignin)
     : Metabolism(mass),
       efficiency_(efficiency),
-      leaf_area_curve_(area_mean, area_stddev),
-      generator_(time(NULL)),
+      area_mean_(area_mean),
+      area_stddev_(area_stddev),
+      random_(RandomStream::Substream()),
       cellulose_(cellulose),
       hemicellulose_(hemicellulose),
       lignin_(lignin) {
@@ -37,13 +40,74 @@ PlantMetabolism::PlantMetabolism(double mass, double efficiency,
 }
 
 void PlantMetabolism::Update(int time) {
+  ScopedTimer timer("PlantMetabolism::Update");
+
   // Assuming a normal distribution, extract a value for the leaf area
   // exposed
   // to light.
-  const double leaf_area = leaf_area_curve_(generator_);
+  const double leaf_area = area_mean_ + area_stddev_ * random_.Normal();
+
+  Photosynthesize(leaf_area, time, GetSunlight(time, 1));
+}
+
+int PlantMetabolism::FastForward(double time, int iterations) {
+  if (iterations <= 0) {
+    return 0;
+  }
+
+  // The sum of the leaf areas over all the iterations is a sum of independent
+  // normal variables, so it is normal itself, and we only have to draw it
+  // once.
+  double total_leaf_area = area_mean_ * iterations +
+                           area_stddev_ * ::std::sqrt(iterations) *
+                               random_.Normal();
+
+  // Spread the change in energy evenly over the iterations to figure out
+  // whether and when we ran out.
+  const double start_energy = energy_;
+  const double sunlight = GetSunlight(time, iterations);
+  const double energy_per_area = sunlight * efficiency_ * time *
+                                 (1 - (cellulose_ + hemicellulose_ + lignin_));
+  const double iteration_gain =
+      total_leaf_area / iterations * energy_per_area;
+  int simulated = iterations;
+  if (start_energy + iteration_gain * iterations <= 0) {
+    if (iteration_gain < 0 && start_energy > 0) {
+      simulated = static_cast<int>(::std::ceil(start_energy / -iteration_gain));
+      simulated = ::std::max(1, ::std::min(simulated, iterations));
+    } else {
+      simulated = 1;
+    }
+    // Only count the iterations up to when we ran out.
+    total_leaf_area *= static_cast<double>(simulated) / iterations;
+  }
+
+  Photosynthesize(total_leaf_area, time, sunlight);
+  return simulated;
+}
+
+double PlantMetabolism::GetSunlight(double time, int iterations) const {
+  if (!environment_) {
+    return kSolarEnergy;
+  }
+  if (iterations == 1) {
+    return kSolarEnergy * environment_->GetSunlight(x_, y_);
+  }
+
+  // The brightness of the sun is the only part that changes over time.
+  double daylight = 0;
+  for (int i = 0; i < iterations; ++i) {
+    daylight += environment_->GetDaylight(environment_->time() - i * time);
+  }
+  daylight /= iterations;
+
+  return kSolarEnergy * environment_->GetBaseSunlight(x_, y_) * daylight;
+}
 
+void PlantMetabolism::Photosynthesize(double leaf_area, double time,
+                                      double sunlight) {
   // Calculate the power of the plant, in watts.
-  const double power = leaf_area * kSolarEnergy * efficiency_;
+  const double power = leaf_area * sunlight * efficiency_;
   // Calculate how much energy we produced in this time, in Joules.
   double energy_gain = power * time;
 
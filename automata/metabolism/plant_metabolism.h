@@ -1,15 +1,18 @@
 #ifndef ECOSYSTEM_AUTOMATA_PLANT_METABOLISM_H_
 #define ECOSYSTEM_AUTOMATA_PLANT_METABOLISM_H_
 
-#include <random>
-
+#include "automata/environment.h"
+#include "automata/memory_stats.h"
 #include "automata/metabolism/metabolism.h"
+#include "automata/metabolism/random_stream.h"
 
 namespace automata {
 namespace metabolism {
 
 // Class for simulating plant metabolism.
-class PlantMetabolism : public Metabolism {
+class PlantMetabolism
+    : public Metabolism,
+      public Counted<MemoryStats::kMetabolisms, PlantMetabolism> {
  public:
   // efficiency: Efficiency of photosynthesis, i.e. what percent of the total
   // energy in the incoming sunlight hitting the leaves gets converted to
@@ -29,20 +32,54 @@ class PlantMetabolism : public Metabolism {
 
   virtual void Update(int time);
   virtual void UseEnergy(double amount);
+  // Instead of drawing a leaf area for every iteration, this draws the total
+  // leaf area for all of them at once.
+  virtual int FastForward(double time, int iterations);
+  // Makes the plant get its sunlight from the environment, instead of always
+  // getting the average for the earth's surface. When fast-forwarding, it gets
+  // the average sunlight over the iterations leading up to the environment's
+  // current time.
+  // environment: The environment. It must outlive the plant.
+  // x: The x coordinate of the plant.
+  // y: The y coordinate of the plant.
+  void set_environment(const Environment *environment, int x, int y) {
+    environment_ = environment;
+    x_ = x;
+    y_ = y;
+  }
 
  private:
+  // Calculates the energy and mass produced by photosynthesis and adds it.
+  // leaf_area: The total leaf area exposed to sunlight. (m^2)
+  // time: How long the leaves were exposed. (s)
+  // sunlight: The intensity of the sunlight. (W/m^2)
+  void Photosynthesize(double leaf_area, double time, double sunlight);
+  // Figures out how much sunlight the plant has been getting.
+  // time: How long each iteration is. (s)
+  // iterations: How many iterations to average the sunlight over.
+  // Returns: The average intensity of the sunlight. (W/m^2)
+  double GetSunlight(double time, int iterations) const;
+
   // Efficiency of photosynthesis.
   const double efficiency_;
 
-  // Normal distribution for picking leaf area.
-  ::std::normal_distribution<double> leaf_area_curve_;
-  // Number generator for normal distributions.
-  ::std::default_random_engine generator_;
+  // Mean and standard deviation of the leaf area exposed to sunlight.
+  const double area_mean_;
+  const double area_stddev_;
+  // Where we get random numbers for picking leaf area. Every plant has its own
+  // stream, so plants that are created at the same time don't end up the same.
+  RandomStream random_;
 
   // Percent of dry biomass that is composed of these compounds.
   const double cellulose_;
   const double hemicellulose_;
   const double lignin_;
+
+  // The environment that the plant gets its sunlight from, if it has one.
+  const Environment *environment_ = nullptr;
+  // Where the plant is in the environment.
+  int x_ = 0;
+  int y_ = 0;
 };
 
 }  // automata
@@ -63,5 +63,100 @@ TEST_F(PlantMetabolismTest, UseEnergy) {
             metabolism_.mass());
 }
 
+// Does fast-forwarding give us the same thing as updating repeatedly?
+TEST_F(PlantMetabolismTest, FastForwardTest) {
+  // Since the leaf area has no variance, the results should be the same.
+  PlantMetabolism stepped(kInitialMass, 0.02, 0.1, 0.0, kPercentCellulose,
+                          kPercentHemicellulose, kPercentLignin);
+  for (int i = 0; i < 5; ++i) {
+    stepped.Update(10);
+  }
+
+  EXPECT_EQ(5, metabolism_.FastForward(10, 5));
+  EXPECT_DOUBLE_EQ(stepped.energy(), metabolism_.energy());
+  EXPECT_DOUBLE_EQ(stepped.mass(), metabolism_.mass());
+
+  // A plant with negative leaf area loses energy, so it will eventually run
+  // out.
+  PlantMetabolism dying(kInitialMass, 0.02, -0.1, 0.0, kPercentCellulose,
+                        kPercentHemicellulose, kPercentLignin);
+  PlantMetabolism dying_stepped(kInitialMass, 0.02, -0.1, 0.0,
+                                kPercentCellulose, kPercentHemicellulose,
+                                kPercentLignin);
+  int expected = 0;
+  while (dying_stepped.energy() > 0) {
+    dying_stepped.Update(1000);
+    ++expected;
+  }
+
+  // It should tell us exactly when it ran out.
+  EXPECT_EQ(expected, dying.FastForward(1000, expected + 100));
+  EXPECT_LE(dying.energy(), 0.0);
+}
+
+// Do plants that are created at the same time get different leaf areas?
+TEST_F(PlantMetabolismTest, IndependentTest) {
+  PlantMetabolism first(kInitialMass, 0.02, 0.1, 0.05, kPercentCellulose,
+                        kPercentHemicellulose, kPercentLignin);
+  PlantMetabolism second(kInitialMass, 0.02, 0.1, 0.05, kPercentCellulose,
+                         kPercentHemicellulose, kPercentLignin);
+  first.Update(10);
+  second.Update(10);
+  EXPECT_NE(first.energy(), second.energy());
+
+  // With the same seed, they should come out the same as before.
+  RandomStream::SetSeed(1);
+  PlantMetabolism seeded(kInitialMass, 0.02, 0.1, 0.05, kPercentCellulose,
+                         kPercentHemicellulose, kPercentLignin);
+  RandomStream::SetSeed(1);
+  PlantMetabolism seeded_again(kInitialMass, 0.02, 0.1, 0.05,
+                               kPercentCellulose, kPercentHemicellulose,
+                               kPercentLignin);
+  seeded.Update(10);
+  seeded_again.Update(10);
+  EXPECT_EQ(seeded.energy(), seeded_again.energy());
+}
+
+// Does the plant get its sunlight from the environment?
+TEST_F(PlantMetabolismTest, EnvironmentTest) {
+  Environment environment(2, 1);
+  const double sunlight[] = {0.0, 2.0};
+  ASSERT_TRUE(environment.SetSunlight(sunlight, 2));
+
+  // No sunlight means no energy.
+  const double start_energy = metabolism_.energy();
+  metabolism_.set_environment(&environment, 0, 0);
+  metabolism_.Update(10);
+  EXPECT_EQ(start_energy, metabolism_.energy());
+
+  // Twice as much sunlight means twice as much energy.
+  PlantMetabolism normal(kInitialMass, 0.02, 0.1, 0.0, kPercentCellulose,
+                         kPercentHemicellulose, kPercentLignin);
+  PlantMetabolism bright(kInitialMass, 0.02, 0.1, 0.0, kPercentCellulose,
+                         kPercentHemicellulose, kPercentLignin);
+  bright.set_environment(&environment, 1, 0);
+  normal.Update(10);
+  bright.Update(10);
+  EXPECT_DOUBLE_EQ((normal.energy() - start_energy) * 2,
+                   bright.energy() - start_energy);
+
+  // Fast-forwarding should follow the sun over the iterations that it skips.
+  environment.SetCycle(100, 0, 0);
+  PlantMetabolism stepped(kInitialMass, 0.02, 0.1, 0.0, kPercentCellulose,
+                          kPercentHemicellulose, kPercentLignin);
+  PlantMetabolism fast(kInitialMass, 0.02, 0.1, 0.0, kPercentCellulose,
+                       kPercentHemicellulose, kPercentLignin);
+  stepped.set_environment(&environment, 1, 0);
+  fast.set_environment(&environment, 1, 0);
+  for (int time = 10; time <= 100; time += 10) {
+    environment.SetTime(time);
+    stepped.Update(10);
+  }
+
+  EXPECT_EQ(10, fast.FastForward(10, 10));
+  EXPECT_DOUBLE_EQ(stepped.energy(), fast.energy());
+  EXPECT_GT(fast.energy(), start_energy);
+}
+
 }  // namespace metabolism
 }  // namespace automata
@@ -0,0 +1,75 @@
+#include <math.h>
+
+#include <random>
+
+#include "automata/metabolism/random_stream.h"
+
+namespace automata {
+namespace metabolism {
+namespace {
+
+// The increment for the SplitMix64 generator, which is what we base everything
+// on. (See http://prng.di.unimi.it/splitmix64.c)
+constexpr uint64_t kGoldenGamma = 0x9e3779b97f4a7c15;
+
+// Scrambles the bits of a number, so that numbers that are close together end
+// up completely different.
+// value: The number to scramble.
+// Returns: The scrambled number.
+uint64_t Mix(uint64_t value) {
+  value = (value ^ (value >> 30)) * 0xbf58476d1ce4e5b9;
+  value = (value ^ (value >> 27)) * 0x94d049bb133111eb;
+  return value ^ (value >> 31);
+}
+
+// Returns: A seed that's different every time the program runs.
+uint64_t RandomSeed() {
+  ::std::random_device device;
+  return (static_cast<uint64_t>(device()) << 32) ^ device();
+}
+
+// The seed that new streams are based on.
+uint64_t g_seed = RandomSeed();
+// The number of the next stream to create.
+uint64_t g_next_stream = 0;
+
+}  // namespace
+
+RandomStream::RandomStream(uint64_t seed, uint64_t stream)
+    : key_(Mix(seed + Mix(stream + kGoldenGamma))) {}
+
+void RandomStream::SetSeed(uint64_t seed) {
+  g_seed = seed;
+  g_next_stream = 0;
+}
+
+RandomStream RandomStream::Substream() {
+  return RandomStream(g_seed, g_next_stream++);
+}
+
+uint64_t RandomStream::Next() {
+  return Mix(key_ + ++counter_ * kGoldenGamma);
+}
+
+double RandomStream::Uniform() {
+  // Use the top 53 bits, which is all that fits in a double.
+  return (Next() >> 11) * (1.0 / (UINT64_C(1) << 53));
+}
+
+double RandomStream::Normal() {
+  if (has_spare_normal_) {
+    has_spare_normal_ = false;
+    return spare_normal_;
+  }
+
+  // Box-Muller transform. The first number can't be zero, or we would take the
+  // log of it.
+  const double radius = sqrt(-2.0 * log(1.0 - Uniform()));
+  const double angle = 2.0 * M_PI * Uniform();
+  spare_normal_ = radius * sin(angle);
+  has_spare_normal_ = true;
+  return radius * cos(angle);
+}
+
+}  // namespace metabolism
+}  // namespace automata
@@ -0,0 +1,52 @@
+#ifndef ECOSYSTEM_AUTOMATA_METABOLISM_RANDOM_STREAM_H_
+#define ECOSYSTEM_AUTOMATA_METABOLISM_RANDOM_STREAM_H_
+
+#include <stdint.h>
+
+namespace automata {
+namespace metabolism {
+
+// A counter-based random number generator. Every value is a hash of a key and
+// the position in the stream, so a stream is just two integers, and it costs
+// nothing to create one. Streams that are created with Substream() all share a
+// process-wide seed, but each one gets a different key, so they are
+// independent of each other no matter when they were created.
+class RandomStream {
+ public:
+  // seed: The seed that the stream is based on.
+  // stream: Which stream to get for that seed.
+  RandomStream(uint64_t seed, uint64_t stream);
+
+  // Sets the seed for all the streams that Substream() creates from now on,
+  // and starts numbering them from zero again. By default, the seed is picked
+  // randomly when the program starts.
+  // seed: The new seed.
+  static void SetSeed(uint64_t seed);
+  // Creates a new stream that is independent from all the other ones that were
+  // created since the seed was last set.
+  // Returns: The new stream.
+  static RandomStream Substream();
+
+  // Returns: The next 64 random bits in the stream.
+  uint64_t Next();
+  // Returns: A random number that is uniformly distributed in [0, 1).
+  double Uniform();
+  // Returns: A random number from the standard normal distribution. They get
+  // generated in pairs, so every other call is almost free.
+  double Normal();
+
+ private:
+  // Uniquely identifies this stream.
+  uint64_t key_;
+  // How far along in the stream we are.
+  uint64_t counter_ = 0;
+  // The second number from the last pair of normal numbers, which is what the
+  // next call to Normal() returns.
+  double spare_normal_ = 0;
+  bool has_spare_normal_ = false;
+};
+
+}  // namespace metabolism
+}  // namespace automata
+
+#endif  // ECOSYSTEM_AUTOMATA_METABOLISM_RANDOM_STREAM_H_
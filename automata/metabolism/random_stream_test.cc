@@ -0,0 +1,61 @@
+#include <math.h>
+
+#include "gtest/gtest.h"
+
+#include "automata/metabolism/random_stream.h"
+
+namespace automata {
+namespace metabolism {
+
+// Do streams give us the same numbers when they should, and different ones
+// when they shouldn't?
+TEST(RandomStreamTest, StreamTest) {
+  RandomStream stream(42, 0);
+  RandomStream same(42, 0);
+  RandomStream other_stream(42, 1);
+  RandomStream other_seed(43, 0);
+
+  for (int i = 0; i < 10; ++i) {
+    const uint64_t value = stream.Next();
+    EXPECT_EQ(value, same.Next());
+    EXPECT_NE(value, other_stream.Next());
+    EXPECT_NE(value, other_seed.Next());
+  }
+
+  // Substreams from the same seed should come out the same way every time.
+  RandomStream::SetSeed(7);
+  RandomStream first = RandomStream::Substream();
+  RandomStream second = RandomStream::Substream();
+  RandomStream::SetSeed(7);
+  RandomStream first_again = RandomStream::Substream();
+  const uint64_t value = first.Next();
+  EXPECT_EQ(value, first_again.Next());
+  EXPECT_NE(value, second.Next());
+}
+
+// Do the distributions look right?
+TEST(RandomStreamTest, DistributionTest) {
+  RandomStream stream(1, 2);
+  constexpr int kSamples = 100000;
+
+  double uniform_sum = 0;
+  double normal_sum = 0;
+  double normal_square_sum = 0;
+  for (int i = 0; i < kSamples; ++i) {
+    const double uniform = stream.Uniform();
+    ASSERT_GE(uniform, 0.0);
+    ASSERT_LT(uniform, 1.0);
+    uniform_sum += uniform;
+
+    const double normal = stream.Normal();
+    normal_sum += normal;
+    normal_square_sum += normal * normal;
+  }
+
+  EXPECT_NEAR(0.5, uniform_sum / kSamples, 0.01);
+  EXPECT_NEAR(0.0, normal_sum / kSamples, 0.02);
+  EXPECT_NEAR(1.0, normal_square_sum / kSamples, 0.02);
+}
+
+}  // namespace metabolism
+}  // namespace automata
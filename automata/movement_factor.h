@@ -2,6 +2,7 @@
 #define ECOSYSTEM_AUTOMATA_MOVEMENT_FACTOR_H_
 
 #include "automata/macros.h"
+#include "automata/memory_stats.h"
 
 namespace automata {
 
@@ -10,8 +11,11 @@ class Organism;
 
 // A class for representing factors that affect an organism's movement. Movement
 // factors are things that change the likelihood that an organism will move to a
-// specific location in its neighborhood.
-class MovementFactor {
+// specific location in its neighborhood. Most of them live in the lists that
+// organisms keep, so the memory for a list node gets counted with each one.
+class MovementFactor
+    : public Counted<MemoryStats::kMovementFactors, MovementFactor,
+                     2 * sizeof(void *)> {
  public:
   // A simple constructor that sets nothing.
   MovementFactor();
@@ -8,6 +8,7 @@
 #include <vector>
 
 #include "automata/organism.h"
+#include "automata/trace.h"
 
 namespace automata {
 
@@ -16,6 +17,44 @@ Organism::Organism(Grid *grid, int index)
   srand(time(NULL));
 }
 
+::std::vector<Organism *> Organism::Spawn(Grid *grid,
+                                          const ::std::vector<int> &xs,
+                                          const ::std::vector<int> &ys) {
+  ::std::vector<Organism *> organisms;
+  if (xs.size() != ys.size()) {
+    return organisms;
+  }
+
+  organisms.reserve(xs.size());
+  for (uint32_t i = 0; i < xs.size(); ++i) {
+    Organism *organism = new Organism(grid, 0);
+    organisms.push_back(organism);
+
+    if (!organism->Initialize(xs[i], ys[i])) {
+      // Take everything back off the grid.
+      for (auto *created : organisms) {
+        delete created;
+      }
+      organisms.clear();
+      break;
+    }
+  }
+
+  return organisms;
+}
+
+void Organism::AddFactorsBetween(const ::std::vector<Organism *> &targets,
+                                 const ::std::vector<Organism *> &sources,
+                                 int strength, int visibility /*= -1*/) {
+  for (auto *target : targets) {
+    for (auto *source : sources) {
+      if (source != target) {
+        target->factors_.emplace_back(source, strength, visibility);
+      }
+    }
+  }
+}
+
 bool Organism::UpdatePosition(int use_x /*= -1*/, int use_y /*= -1*/) {
   int x, y;
   if (use_x < 0 || use_y < 0) {
@@ -24,9 +63,17 @@ bool Organism::UpdatePosition(int use_x /*= -1*/, int use_y /*= -1*/) {
   }
   // This only returns false if x and y are out of range, so if it is, we have a
   // pretty serious problem.
-  printf("%d: Have %zu factors.\n", index_, factors_.size());
-  assert(grid_->MoveObject(use_x, use_y, factors_, &x, &y, speed_, vision_) &&
-         "MoveObject() failed unexpectedly.");
+  if (field_movement_) {
+    // The field already takes what we can perceive into account.
+    const bool moved =
+        grid_->MoveObjectInField(use_x, use_y, group(), &x, &y, speed_);
+    assert(moved && "MoveObjectInField() failed unexpectedly.");
+    (void)moved;
+  } else {
+    printf("%d: Have %zu factors.\n", index_, factors_.size());
+    assert(grid_->MoveObject(use_x, use_y, factors_, &x, &y, speed_, vision_) &&
+           "MoveObject() failed unexpectedly.");
+  }
 
   if (x_ == x && y_ == y) {
     printf("Still staying in the same place.\n");
@@ -56,6 +103,8 @@ void Organism::BlacklistOccupied(int x, int y, bool blacklisting, int levels) {
 }
 
 bool Organism::DefaultConflictHandler() {
+  ScopedTimer timer("Organism::DefaultConflictHandler");
+
   // Get the other organism that we are conflicted with.
   printf("Checking conflict.\n");
   Organism *organism = dynamic_cast<Organism *>(grid_->GetConflict(x_, y_));
@@ -68,11 +117,14 @@ bool Organism::DefaultConflictHandler() {
     organism = dynamic_cast<Organism *>(grid_->GetPending(x_, y_));
   }
 
-  // In this case, we'll pick one of the organisms to move again at random.
-  int random = rand() % 2;
-
+  // In this case, we'll pick one of the organisms to move again at random,
+  // unless one of them can't move at all.
   Organism *to_move;
-  if (random) {
+  if (immobile()) {
+    to_move = organism;
+  } else if (organism->immobile()) {
+    to_move = this;
+  } else if (rand() % 2) {
     to_move = this;
   } else {
     to_move = organism;
@@ -120,14 +172,16 @@ void Organism::Die() {
 }
 
 void Organism::CleanupOrganism(const Organism &organism) {
-  // Check to see if we have any movement factors related to this organism.
-  auto itr = factors_.begin();
-  for (; itr != factors_.end(); ++itr) {
-    if (&organism == itr->GetOrganism()) {
-      // This one has to go.
-      // Post-decrement so that it still points to something valid.
-      factors_.erase(itr--);
-    }
+  // Remove any movement factors related to this organism.
+  factors_.remove_if([&organism](const MovementFactor &factor) {
+    return factor.GetOrganism() == &organism;
+  });
+}
+
+void Organism::CleanupOrganismFrom(const ::std::vector<Organism *> &holders,
+                                   const Organism &organism) {
+  for (auto *holder : holders) {
+    holder->CleanupOrganism(organism);
   }
 }
 
@@ -5,21 +5,34 @@
 #include <stdio.h>  // TEMP
 
 #include <list>
+#include <vector>
 
 #include "automata/grid.h"
 #include "automata/grid_object.h"
 #include "automata/macros.h"
+#include "automata/memory_stats.h"
+#include "automata/metabolism/metabolism.h"
 #include "automata/movement_factor.h"
 
 namespace automata {
 
 // A class for representing an organism. Designed to facilitate handling things
 // like grid indices and movement factors.
-class Organism : public GridObject {
+class Organism : public GridObject,
+                 public Counted<MemoryStats::kOrganisms, Organism> {
  public:
   // grid:  The grid that this organism will exist in.
   // index: The organism's index in the Python code.
   Organism(Grid *grid, int index);
+  // Creates a whole batch of organisms at once, and puts them on the grid.
+  // grid: The grid that the organisms will exist in.
+  // xs: The x coordinates of the organisms.
+  // ys: The y coordinates of the organisms. Must be the same size as xs.
+  // Returns: The new organisms, which the caller takes ownership of. If any of
+  // them can't be put on the grid, none of them are created, and it is empty.
+  static ::std::vector<Organism *> Spawn(Grid *grid,
+                                         const ::std::vector<int> &xs,
+                                         const ::std::vector<int> &ys);
   // Set organism's vision.
   // vision: Organism's new vision.
   void set_vision(int vision) { vision_ = vision; }
@@ -30,6 +43,15 @@ class Organism : public GridObject {
   void set_speed(int speed) { speed_ = speed; }
   // Returns: Organism's speed.
   int get_speed() const { return speed_; }
+  // Sets whether the organism moves using the potential field for its group,
+  // instead of its own movement factors. (See Grid::MoveObjectInField().)
+  // field_movement: Whether to use the field.
+  void set_field_movement(bool field_movement) {
+    field_movement_ = field_movement;
+  }
+  // Returns: Whether the organism moves using the potential field for its
+  // group.
+  bool field_movement() const { return field_movement_; }
   // Calculates if the organism should move, and where it should move.
   // use_x: Allows user to specify a custom position to calculate movement from.
   // use_y: See use_x.
@@ -57,6 +79,16 @@ class Organism : public GridObject {
     factors_.push_back(factor);
     printf("%d: We now have %zu factors.\n", index_, factors_.size());
   }
+  // Adds a movement factor for every one of a set of organisms to every one of
+  // another set of organisms. Organisms never get factors for themselves.
+  // targets: The organisms to add the factors to.
+  // sources: The organisms to turn into factors.
+  // strength: The strength of the factors.
+  // visibility: How far away the factors can be perceived, in cells. A negative
+  // value means there is no limit.
+  static void AddFactorsBetween(const ::std::vector<Organism *> &targets,
+                                const ::std::vector<Organism *> &sources,
+                                int strength, int visibility = -1);
   const ::std::list<MovementFactor> &factors() const { return factors_; }
   // Cleans up any references this organism contains to a specified other
   // organism. For now, it only removes movement factors. This is generally
@@ -64,6 +96,11 @@ class Organism : public GridObject {
   // are about to become dead pointers.
   // organism: The organism we want to remove references to.
   void CleanupOrganism(const Organism &organism);
+  // Runs CleanupOrganism() on a set of organisms.
+  // holders: The organisms to remove references from.
+  // organism: The organism we want to remove references to.
+  static void CleanupOrganismFrom(const ::std::vector<Organism *> &holders,
+                                  const Organism &organism);
   // A default handler for conflicts on the grid between this organism and
   // another. It resolves the conflict by forcing a random one of them to
   // move again. This method can be called on either organism involved in a
@@ -77,6 +114,14 @@ class Organism : public GridObject {
   inline bool IsAlive() const {
     return alive_;
   }
+  // Sets the organism's metabolism, so that its state can be read from C++.
+  // The organism does not take ownership of it.
+  // metabolism: The metabolism, or nullptr if the organism doesn't have one.
+  void set_metabolism(const metabolism::Metabolism *metabolism) {
+    metabolism_ = metabolism;
+  }
+  // Returns: The organism's metabolism, or nullptr if it doesn't have one.
+  const metabolism::Metabolism *metabolism() const { return metabolism_; }
 
  private:
   DISSALOW_COPY_AND_ASSIGN(Organism);
@@ -99,8 +144,12 @@ class Organism : public GridObject {
   int vision_ = -1;
   // Maximum distance in cells that the organism can move at one time.
   uint32_t speed_ = 1;
+  // Whether the organism moves using the potential field for its group.
+  bool field_movement_ = false;
   // Whether the organism is alive.
   bool alive_ = true;
+  // The organism's metabolism, if it has one. It is owned by the Python code.
+  const metabolism::Metabolism *metabolism_ = nullptr;
 };
 
 }  //  automata
@@ -0,0 +1,76 @@
+#include <math.h>
+
+#include <algorithm>
+
+#include "automata/potential_field.h"
+
+namespace automata {
+
+PotentialField::PotentialField(int x_size, int y_size)
+    : x_size_(x_size),
+      y_size_(y_size),
+      values_(x_size * y_size, 0.0),
+      sources_(x_size * y_size, 0) {}
+
+void PotentialField::Clear() {
+  ::std::fill(values_.begin(), values_.end(), 0.0);
+  ::std::fill(sources_.begin(), sources_.end(), 0);
+}
+
+void PotentialField::AddSource(int x, int y, int strength, int radius) {
+  if (radius <= 0) {
+    // This is just far enough to reach every cell from anywhere.
+    radius = ceil(hypot(x_size_ - 1, y_size_ - 1));
+  }
+  const ::std::vector<double> &stencil = GetStencil(radius);
+  const int side = 2 * radius + 1;
+
+  // Only go over the part of the stencil that's on the grid.
+  const int min_x = ::std::max(x - radius, 0);
+  const int max_x = ::std::min(x + radius, x_size_ - 1);
+  const int min_y = ::std::max(y - radius, 0);
+  const int max_y = ::std::min(y + radius, y_size_ - 1);
+  for (int cell_y = min_y; cell_y <= max_y; ++cell_y) {
+    const double *row = stencil.data() + (cell_y - y + radius) * side;
+    for (int cell_x = min_x; cell_x <= max_x; ++cell_x) {
+      const double value = row[cell_x - x + radius];
+      if (!value) {
+        // Too far away.
+        continue;
+      }
+
+      const int index = cell_y * x_size_ + cell_x;
+      values_[index] += value * strength;
+      ++sources_[index];
+    }
+  }
+}
+
+const ::std::vector<double> &PotentialField::GetStencil(int radius) {
+  auto found = stencils_.find(radius);
+  if (found != stencils_.end()) {
+    return found->second;
+  }
+
+  const int side = 2 * radius + 1;
+  ::std::vector<double> &stencil = stencils_[radius];
+  stencil.resize(side * side);
+  for (int y = -radius; y <= radius; ++y) {
+    for (int x = -radius; x <= radius; ++x) {
+      const double distance = sqrt(x * x + y * y);
+
+      double value = 0;
+      if (!distance) {
+        // The source is right here. This is what Grid::MoveObject() does too.
+        value = 10;
+      } else if (distance <= radius) {
+        value = 1.0 / pow(distance, 5);
+      }
+      stencil[(y + radius) * side + x + radius] = value;
+    }
+  }
+
+  return stencil;
+}
+
+}  // namespace automata
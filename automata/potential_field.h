@@ -0,0 +1,64 @@
+#ifndef ECOSYSTEM_AUTOMATA_POTENTIAL_FIELD_H_
+#define ECOSYSTEM_AUTOMATA_POTENTIAL_FIELD_H_
+
+#include <map>
+#include <vector>
+
+namespace automata {
+
+// A raster that holds the combined pull of a set of sources on every cell of
+// the grid. Each source adds strength / r^5 to every cell within its radius,
+// which is the same thing that movement factors do, except that it is worked
+// out once for the whole grid instead of once for every organism that can see
+// the source. That way, moving an organism only means reading the field around
+// it, no matter how many sources there are. Like the environment rasters, it is
+// stored in row-major order, so the cell at (x, y) is at y * x_size + x.
+class PotentialField {
+ public:
+  // x_size: Size in the x dimension. Must be the same as the grid's.
+  // y_size: Size in the y dimension. Must be the same as the grid's.
+  PotentialField(int x_size, int y_size);
+
+  // Removes all the sources from the field.
+  void Clear();
+  // Adds the contribution of a source to every cell that it can reach.
+  // x: The x coordinate of the source.
+  // y: The y coordinate of the source.
+  // strength: The strength of the source. Positive means attractive, negative
+  // means repulsive.
+  // radius: How far away the source can be perceived from, in cells. Zero or
+  // less means that it can be perceived from anywhere on the grid. That makes
+  // it touch every cell, so it is slow on big grids.
+  void AddSource(int x, int y, int strength, int radius);
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: The value of the field at that cell.
+  double Get(int x, int y) const { return values_[y * x_size_ + x]; }
+  // x: The x coordinate of the cell.
+  // y: The y coordinate of the cell.
+  // Returns: How many sources can be perceived from that cell.
+  int GetSources(int x, int y) const { return sources_[y * x_size_ + x]; }
+
+ private:
+  // Gets the contribution of a source with a strength of one to every cell
+  // around it, out to a certain radius. Cells that are farther away than the
+  // radius are zero. They get cached, since most sources share a few radii.
+  // radius: The radius of the source.
+  // Returns: The stencil, which is 2 * radius + 1 cells on each side, with the
+  // source in the middle, in row-major order.
+  const ::std::vector<double> &GetStencil(int radius);
+
+  // The dimensions of the field.
+  int x_size_;
+  int y_size_;
+  // The value of the field at every cell.
+  ::std::vector<double> values_;
+  // How many sources can be perceived from every cell.
+  ::std::vector<int> sources_;
+  // Stencils that we've already made, keyed by radius.
+  ::std::map<int, ::std::vector<double>> stencils_;
+};
+
+}  // namespace automata
+
+#endif  // ECOSYSTEM_AUTOMATA_POTENTIAL_FIELD_H_
@@ -3,9 +3,12 @@
 %include std_vector.i
 
 %{
+#include "../environment.h"
 #include "../grid.h"
 #include "../grid_object.h"
+#include "../memory_stats.h"
 #include "../organism.h"
+#include "../trace.h"
 #include "../metabolism/plant_metabolism.h"
 #include "../metabolism/animal_metabolism.h"
 using namespace ::automata;
@@ -14,25 +17,147 @@ using namespace ::automata::metabolism;
 
 %include metabolism.i
 
+// Lets C++ write straight into anything that supports the buffer protocol, like
+// an array.array or a NumPy array, so nothing has to be copied in Python.
+%define %output_buffer(TYPE, FORMAT)
+%typemap(arginit) (TYPE *values, int size) {
+  view$argnum.obj = NULL;
+}
+%typemap(in) (TYPE *values, int size) (Py_buffer view) {
+  if (PyObject_GetBuffer($input, &view,
+                         PyBUF_WRITABLE | PyBUF_FORMAT | PyBUF_C_CONTIGUOUS)) {
+    SWIG_fail;
+  }
+  if (view.itemsize != sizeof(TYPE) || !view.format ||
+      view.format[strlen(view.format) - 1] != FORMAT) {
+    PyErr_SetString(PyExc_TypeError, "Buffer must hold values of type " #TYPE);
+    SWIG_fail;
+  }
+  $1 = (TYPE *)view.buf;
+  $2 = view.len / sizeof(TYPE);
+}
+%typemap(freearg) (TYPE *values, int size) {
+  if (view$argnum.obj) {
+    PyBuffer_Release(&view$argnum);
+  }
+}
+%enddef
+
+// The same thing, but for reading from the buffer instead.
+%define %input_buffer(TYPE, FORMAT)
+%typemap(arginit) (const TYPE *values, int size) {
+  view$argnum.obj = NULL;
+}
+%typemap(in) (const TYPE *values, int size) (Py_buffer view) {
+  if (PyObject_GetBuffer($input, &view, PyBUF_FORMAT | PyBUF_C_CONTIGUOUS)) {
+    SWIG_fail;
+  }
+  if (view.itemsize != sizeof(TYPE) || !view.format ||
+      view.format[strlen(view.format) - 1] != FORMAT) {
+    PyErr_SetString(PyExc_TypeError, "Buffer must hold values of type " #TYPE);
+    SWIG_fail;
+  }
+  $1 = ($1_ltype)view.buf;
+  $2 = view.len / sizeof(TYPE);
+}
+%typemap(freearg) (const TYPE *values, int size) {
+  if (view$argnum.obj) {
+    PyBuffer_Release(&view$argnum);
+  }
+}
+%enddef
+
+%output_buffer(int, 'i')
+%output_buffer(double, 'd')
+%input_buffer(int, 'i')
+%input_buffer(double, 'd')
+
+class Environment {
+ public:
+  Environment(int x_size, int y_size);
+  bool SetSunlight(const double *values, int size);
+  bool SetMovementCost(const double *values, int size);
+  bool SetBlocked(const int *values, int size);
+  void SetCycle(double day_length, double year_length,
+                double seasonal_variation);
+  void SetTime(double time);
+  double GetDaylight(double time) const;
+  double GetSunlight(int x, int y) const;
+  double GetBaseSunlight(int x, int y) const;
+  double GetMovementCost(int x, int y) const;
+  bool IsBlocked(int x, int y) const;
+  double time() const;
+  double daylight() const;
+  int x_size() const;
+  int y_size() const;
+};
+
+class Trace {
+ public:
+  static void Start(int capacity);
+  static void Stop();
+  static bool enabled();
+  static double Now();
+  static int GetEventCount();
+  static int GetDroppedCount();
+  static bool GetEvents(double *values, int size);
+  static const char *GetEventName(int event);
+};
+
+class MemoryStats {
+ public:
+  enum Subsystem {
+    kGridChunks,
+    kOrganisms,
+    kMovementFactors,
+    kMetabolisms,
+    kNumSubsystems,
+  };
+
+  static int GetCount(Subsystem subsystem);
+  static double GetBytes(Subsystem subsystem);
+};
+
 class GridObject {
  public:
   GridObject(Grid *grid, int index);
   bool Initialize(int x, int y);
   void set_index(int index);
   int get_index() const;
+  void set_group(int group);
+  int group() const;
   bool SetPosition(int x, int y);
   void get_position(int *OUTPUT, int *OUTPUT) const;
   bool RemoveFromGrid();
   GridObject *GetConflict();
+  void set_immobile(bool immobile);
+  bool immobile() const;
 };
 
+class Organism;
+
 namespace std {
   %template(GridObjectVector) vector<GridObject *>;
+  %template(OrganismVector) vector<Organism *>;
+  %template(IntVector) vector<int>;
+}
+
+// Spawn() hands ownership of the new organisms to the caller, so they need to
+// be wrapped the same way as if Python had constructed them.
+%typemap(out) ::std::vector<Organism *> Spawn {
+  $result = PyList_New($1.size());
+  for (size_t i = 0; i < $1.size(); ++i) {
+    PyList_SET_ITEM($result, i, SWIG_NewPointerObj($1[i], $descriptor(Organism *),
+                                                   SWIG_POINTER_OWN));
+  }
 }
 
 class Organism : public GridObject {
  public:
   Organism(Grid *grid, int index);
+  static ::std::vector<Organism *> Spawn(Grid *grid,
+                                         const ::std::vector<int> &xs,
+                                         const ::std::vector<int> &ys);
   bool Initialize(int x, int y);
   void set_index(int index);
   int get_index() const;
@@ -40,6 +165,8 @@ class Organism : public GridObject {
   int get_vision() const;
   void set_speed(int speed);
   int get_speed() const;
+  void set_field_movement(bool field_movement);
+  bool field_movement() const;
   bool SetPosition(int x, int y);
   void get_position(int *OUTPUT, int *OUTPUT) const;
   bool UpdatePosition(int use_x = -1, int use_y = -1);
@@ -49,8 +176,16 @@ class Organism : public GridObject {
   bool DefaultConflictHandler();
   void Die();
   bool IsAlive() const;
+  void set_metabolism(const Metabolism *metabolism);
   GridObject *GetConflict();
+  void set_immobile(bool immobile);
+  bool immobile() const;
   void CleanupOrganism(const Organism &organism);
+  static void AddFactorsBetween(const ::std::vector<Organism *> &targets,
+                                const ::std::vector<Organism *> &sources,
+                                int strength, int visibility = -1);
+  static void CleanupOrganismFrom(const ::std::vector<Organism *> &holders,
+                                  const Organism &organism);
 };
 
 class Grid {
@@ -59,9 +194,34 @@ class Grid {
   ~Grid();
   void GetConflicted(::std::vector<GridObject *> *OUTPUT,
       ::std::vector<GridObject *> *OUTPUT);
+  bool GetVacantLocations(int x, int y, ::std::vector<int> *xs,
+                          ::std::vector<int> *ys, int levels = 1);
+  enum CellField { kCellIndex, kCellGroup };
+  bool ExportCells(CellField field, int *values, int size);
+  enum ObjectField {
+    kObjectIndex,
+    kObjectX,
+    kObjectY,
+    kObjectGroup,
+    kObjectMass,
+    kObjectEnergy,
+  };
+  int ExportObjects(ObjectField field, double *values, int size);
+  double SumObjects(ObjectField field);
+  int CountObjects();
+  int FindObjectsNear(int x, int y, int radius, int group, int *values,
+                      int size);
+  int CountObjectsNear(int x, int y, int radius, int group);
+  int FindNearest(int x, int y, int radius, const int *values, int size);
+  void SetFieldSource(int group, int source_group, int strength,
+                      int visibility);
+  double GetFieldValue(int group, int x, int y) const;
   bool Update();
+  int moved_objects() const;
+  int allocated_chunks() const;
   double scale() const;
   void set_scale(double scale);
+  bool SetEnvironment(const Environment *environment);
 };
 
 class PlantMetabolism : public Metabolism {
@@ -72,6 +232,8 @@ class PlantMetabolism : public Metabolism {
   ~PlantMetabolism();
   void Update(int time);
   void UseEnergy(double amount);
+  int FastForward(double time, int iterations);
+  void set_environment(const Environment *environment, int x, int y);
   double mass() const;
   double energy() const;
 };
@@ -83,6 +245,7 @@ class AnimalMetabolism : public Metabolism {
   ~AnimalMetabolism();
   void Update(int time);
   void UseEnergy(double amount);
+  int FastForward(double time, int iterations);
   double mass() const;
   double energy() const;
 
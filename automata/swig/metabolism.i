@@ -1,10 +1,22 @@
 %module automata
 
+%include stdint.i
+
 %{
 #include "../metabolism/metabolism.h"
+#include "../metabolism/random_stream.h"
 using namespace ::automata::metabolism;
 %}
 
+class RandomStream {
+ public:
+  RandomStream(uint64_t seed, uint64_t stream);
+  static void SetSeed(uint64_t seed);
+  uint64_t Next();
+  double Uniform();
+  double Normal();
+};
+
 class Metabolism {
  public:
   Metabolism(double mass);
@@ -12,7 +24,9 @@ class Metabolism {
 
   virtual void Update(int time) = 0;
   virtual void UseEnergy(double amount) = 0;
+  virtual int FastForward(double time, int iterations);
 
+  void SetState(double mass, double energy);
   double mass() const { return mass_; }
   double energy() const { return energy_; }
 };
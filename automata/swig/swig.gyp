@@ -21,18 +21,28 @@
             'libautomata_files': [
               # We include the .h files so the swig library gets rebuilt when
               # they get updated.
+              '<(DEPTH)/automata/environment.cc',
+              '<(DEPTH)/automata/environment.h',
               '<(DEPTH)/automata/grid.cc',
               '<(DEPTH)/automata/grid.h',
               '<(DEPTH)/automata/grid_object.cc',
               '<(DEPTH)/automata/grid_object.h',
+              '<(DEPTH)/automata/memory_stats.cc',
+              '<(DEPTH)/automata/memory_stats.h',
               '<(DEPTH)/automata/movement_factor.cc',
               '<(DEPTH)/automata/movement_factor.h',
               '<(DEPTH)/automata/organism.cc',
               '<(DEPTH)/automata/organism.h',
+              '<(DEPTH)/automata/potential_field.cc',
+              '<(DEPTH)/automata/potential_field.h',
+              '<(DEPTH)/automata/trace.cc',
+              '<(DEPTH)/automata/trace.h',
               '<(DEPTH)/automata/metabolism/plant_metabolism.cc',
               '<(DEPTH)/automata/metabolism/plant_metabolism.h',
               '<(DEPTH)/automata/metabolism/animal_metabolism.cc',
               '<(DEPTH)/automata/metabolism/animal_metabolism.h',
+              '<(DEPTH)/automata/metabolism/random_stream.cc',
+              '<(DEPTH)/automata/metabolism/random_stream.h',
               '<(DEPTH)/automata/macros.h',
             ],
           },
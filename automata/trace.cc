@@ -0,0 +1,68 @@
+#include <chrono>
+
+#include "automata/trace.h"
+
+namespace automata {
+
+bool Trace::enabled_ = false;
+int Trace::capacity_ = 0;
+int Trace::dropped_ = 0;
+::std::vector<Trace::Event> Trace::events_;
+
+void Trace::Start(int capacity) {
+  events_.clear();
+  // Reserving everything up front means that recording never has to allocate,
+  // which would throw off the timing of whatever we are in the middle of.
+  events_.reserve(capacity);
+  capacity_ = capacity;
+  dropped_ = 0;
+  enabled_ = true;
+}
+
+void Trace::Stop() {
+  enabled_ = false;
+}
+
+double Trace::Now() {
+  const auto since_epoch =
+      ::std::chrono::steady_clock::now().time_since_epoch();
+  return ::std::chrono::duration<double, ::std::micro>(since_epoch).count();
+}
+
+void Trace::Record(const char *name, double start, double end) {
+  if (static_cast<int>(events_.size()) >= capacity_) {
+    ++dropped_;
+    return;
+  }
+
+  events_.push_back({name, start, end - start});
+}
+
+int Trace::GetEventCount() {
+  return events_.size();
+}
+
+int Trace::GetDroppedCount() {
+  return dropped_;
+}
+
+bool Trace::GetEvents(double *values, int size) {
+  if (size < static_cast<int>(events_.size()) * 2) {
+    return false;
+  }
+
+  for (const Event &event : events_) {
+    *values++ = event.Start;
+    *values++ = event.Duration;
+  }
+  return true;
+}
+
+const char *Trace::GetEventName(int event) {
+  if (event < 0 || event >= static_cast<int>(events_.size())) {
+    return nullptr;
+  }
+  return events_[event].Name;
+}
+
+}  // namespace automata
@@ -0,0 +1,90 @@
+#ifndef ECOSYSTEM_AUTOMATA_TRACE_H_
+#define ECOSYSTEM_AUTOMATA_TRACE_H_
+
+#include <vector>
+
+#include "automata/macros.h"
+
+namespace automata {
+
+// Records how long selected parts of the C++ code take, so that they can be
+// lined up with samples of the Python code in a profile. Nothing gets recorded
+// unless a trace has been started, and checking for that is the only cost of a
+// ScopedTimer otherwise.
+class Trace {
+ public:
+  // Throws away anything that was already recorded, and starts recording.
+  // capacity: The most events to record. Anything after that gets dropped, so
+  // that a long trace can't use up all our memory.
+  static void Start(int capacity);
+  // Stops recording. Everything that was recorded stays around until the next
+  // trace is started.
+  static void Stop();
+  // Returns: Whether we are recording.
+  static bool enabled() { return enabled_; }
+  // Returns: The current time, in microseconds, on the same monotonic clock
+  // that events are recorded with.
+  static double Now();
+
+  // Records an event.
+  // name: What happened. It must stay valid for as long as the event is
+  // around, which it does if it is a string literal.
+  // start: When it started, from Now().
+  // end: When it ended, from Now().
+  static void Record(const char *name, double start, double end);
+
+  // Returns: How many events have been recorded.
+  static int GetEventCount();
+  // Returns: How many events were dropped because there was no room for them.
+  static int GetDroppedCount();
+  // Copies the timing of every event into a buffer.
+  // values: The buffer. Each event takes up two values, its start time and how
+  // long it took, both in microseconds.
+  // size: The size of the buffer. It must have room for every event.
+  // Returns: True if it succeeded, false if the buffer is too small.
+  static bool GetEvents(double *values, int size);
+  // event: The number of an event, in the order they were recorded.
+  // Returns: The name of the event.
+  static const char *GetEventName(int event);
+
+ private:
+  // A single thing that happened.
+  struct Event {
+    const char *Name;
+    double Start;
+    double Duration;
+  };
+
+  static bool enabled_;
+  // The most events that we will record.
+  static int capacity_;
+  // How many events we didn't have room for.
+  static int dropped_;
+  static ::std::vector<Event> events_;
+};
+
+// Records how long the scope it is declared in takes, if a trace is running.
+class ScopedTimer {
+ public:
+  // name: What the scope is called in the trace. This should be a string
+  // literal.
+  explicit ScopedTimer(const char *name)
+      : name_(name), start_(Trace::enabled() ? Trace::Now() : -1) {}
+  ~ScopedTimer() {
+    // If tracing got turned on partway through, we don't know when we started.
+    if (start_ >= 0) {
+      Trace::Record(name_, start_, Trace::Now());
+    }
+  }
+
+  DISSALOW_COPY_AND_ASSIGN(ScopedTimer);
+
+ private:
+  const char *name_;
+  // When we started, or -1 if we aren't recording.
+  double start_;
+};
+
+}  // namespace automata
+
+#endif  // ECOSYSTEM_AUTOMATA_TRACE_H_
@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+
+""" Measures how long it takes to start up. Sweep workers and command line runs
+pay this cost every time, so it adds up. Every measurement is taken in a fresh
+interpreter, so nothing has been imported or cached yet. """
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# This runs before every benchmark. The logger has to be set up before anything
+# else gets imported.
+_PRELUDE = """
+import time
+_start = time.perf_counter()
+from modified_logger import Logger
+Logger.set_path(%r)
+"""
+
+# This runs after every benchmark, and reports how long it took. C++ prints
+# debugging output to stdout, so the time goes to stderr instead. Nothing gets
+# written there after it.
+_EPILOGUE = """
+import sys
+print(time.perf_counter() - _start, file=sys.stderr)
+"""
+
+# Runs a few iterations with lots of animals that can all see each other, which
+# is where the cost of movement shows up. It gets formatted with the movement
+# mode to use.
+_MOVEMENT = """from simulation import Simulation
+simulation = Simulation(40, 40, 10)
+overrides = {"Metabolism": {"Animal": {"MovementMode": "%s"}}}
+simulation.add_organisms("species_library", "agrostis stolonifera", 400)
+simulation.add_organisms("species_library", "sciurus carolinensis", 60,
+                         overrides)
+simulation.run(3)"""
+
+# Moving animals using fields on a grid the size of a real run. This is where
+# the size of the fields shows up. With factors, every animal would have one for
+# every plant, so there's no point in comparing.
+_LARGE_MOVEMENT = """from simulation import Simulation
+simulation = Simulation(1000, 1000, 10)
+overrides = {"Metabolism": {"Animal": {"MovementMode": "%s"}}}
+simulation.add_organisms("species_library", "agrostis stolonifera", 10000)
+simulation.add_organisms("species_library", "sciurus carolinensis", 1000,
+                         overrides)
+simulation.run(3)"""
+
+# The benchmarks, keyed by name.
+_BENCHMARKS = {
+  # Everything that a headless run needs to import.
+  "import simulation": "import simulation",
+  # Importing the handlers, and getting them ready to use.
+  "load handlers": "import organism\n"
+                   "from update_handler import UpdateHandler\n"
+                   "UpdateHandler.load_handlers()",
+  # A whole headless run, up to the end of the first iteration.
+  "first iteration": "from simulation import Simulation\n"
+                     "simulation = Simulation(10, 10, 10)\n"
+                     "simulation.add_organisms('species_library',\n"
+                     "                         'agrostis stolonifera', 10)\n"
+                     "simulation.run(1)",
+  # Moving animals with a movement factor for everything they can see, and with
+  # one potential field for each species.
+  "factor movement": _MOVEMENT % ("Factors"),
+  "field movement": _MOVEMENT % ("Field"),
+  "large field movement": _LARGE_MOVEMENT % ("Field"),
+}
+
+
+""" Runs a benchmark once.
+code: The code to benchmark.
+log_path: Where the benchmark should log to.
+Returns: How long the code took to run, and how long the whole interpreter took,
+in seconds. """
+def run_once(code, log_path):
+  script = (_PRELUDE % (log_path)) + code + _EPILOGUE
+
+  start = time.perf_counter()
+  directory = os.path.dirname(os.path.abspath(__file__))
+  process = subprocess.run([sys.executable, "-c", script], cwd=directory,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                           check=True)
+  total = time.perf_counter() - start
+
+  # The logger prints to stderr too, but the time is always last.
+  return float(process.stderr.split()[-1]), total
+
+
+""" Runs every benchmark a number of times, and prints the results.
+repetitions: How many times to run each benchmark. """
+def run_all(repetitions):
+  log_file, log_path = tempfile.mkstemp(suffix=".log")
+  os.close(log_file)
+
+  print("%-20s %12s %12s %12s" % ("Benchmark", "Min (ms)", "Median (ms)",
+                                  "Process (ms)"))
+  try:
+    for name, code in _BENCHMARKS.items():
+      times = []
+      totals = []
+      for i in range(0, repetitions):
+        elapsed, total = run_once(code, log_path)
+        times.append(elapsed * 1000)
+        totals.append(total * 1000)
+
+      print("%-20s %12.1f %12.1f %12.1f" % (name, min(times),
+                                             statistics.median(times),
+                                             statistics.median(totals)))
+  finally:
+    os.remove(log_path)
+
+
+def main():
+  if len(sys.argv) > 2:
+    print("Usage: benchmarks.py [repetitions]")
+    sys.exit()
+
+  repetitions = 10
+  if len(sys.argv) == 2:
+    repetitions = int(sys.argv[1])
+  run_all(repetitions)
+
+
+if __name__ == "__main__":
+  main()
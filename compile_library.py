@@ -0,0 +1,28 @@
+#!/usr/bin/python3
+
+""" Compiles a species library into a bundle, which loads a lot faster than
+parsing all the yaml files. Once a library directory has an up-to-date bundle in
+it, it gets used automatically. """
+
+from modified_logger import Logger
+# This has to happen before anything uses a Logger.
+Logger.set_path("compile_library.log")
+
+import sys
+
+from library import compile_library
+
+
+def main():
+  if len(sys.argv) not in (2, 3):
+    print("Usage: compile_library.py library_dir [bundle_file]")
+    sys.exit()
+
+  output = None
+  if len(sys.argv) == 3:
+    output = sys.argv[2]
+  compile_library(sys.argv[1], output)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,272 @@
+#!/usr/bin/python3
+
+""" Lets someone control and monitor a simulation while it runs. The process
+that starts the simulation serves a Unix socket, and passes commands that come
+in on it along to the simulation process. Running this as a script connects to
+that socket. """
+
+from modified_logger import Logger
+if __name__ == "__main__":
+  # This has to happen before anything uses a Logger.
+  Logger.set_path("control.log")
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ControlError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Keeps track of how long each phase of an iteration takes. Times are added
+up until someone takes them. """
+class PhaseTimer:
+  def __init__(self):
+    # The total time spent in each phase, keyed by phase name.
+    self.__totals = {}
+    # How many times each phase has run.
+    self.__counts = {}
+    # When the current phase started.
+    self.__start = time.perf_counter()
+
+  """ Starts timing the first phase of an iteration. """
+  def start(self):
+    self.__start = time.perf_counter()
+
+  """ Ends the current phase, and starts timing the next one.
+  phase: The name of the phase that just ended. """
+  def mark(self, phase):
+    now = time.perf_counter()
+    self.__totals[phase] = self.__totals.get(phase, 0.0) + now - self.__start
+    self.__counts[phase] = self.__counts.get(phase, 0) + 1
+    self.__start = now
+
+  """ Gets the average time for each phase, and starts over.
+  Returns: The average time that each phase took, in seconds, keyed by phase
+  name. """
+  def take(self):
+    averages = {phase: total / self.__counts[phase] \
+                for phase, total in self.__totals.items()}
+    self.__totals = {}
+    self.__counts = {}
+    return averages
+
+
+""" Connects a simulation process to the control server in its parent. It has
+to be created before the simulation process is started, so that both of them
+end up with it.
+
+The simulation process only looks for commands while a client is connected, so
+it costs next to nothing otherwise. """
+class Controller:
+  def __init__(self):
+    # Carries commands to the simulation process, and replies back.
+    self.__server_end, self.__simulation_end = multiprocessing.Pipe()
+    # How many clients are connected. The simulation process only reads this,
+    # so it doesn't need a lock.
+    self.__clients = multiprocessing.Value("i", 0, lock=False)
+    # Times the phases of each iteration, while anyone is watching.
+    self.__timer = PhaseTimer()
+
+  """ Returns: Whether any clients are connected. """
+  def is_active(self):
+    return self.__clients.value > 0
+
+  """ Returns: A timer for the phases of an iteration, or None if nobody is
+  connected to look at the results. """
+  def get_timer(self):
+    if not self.__clients.value:
+      return None
+    return self.__timer
+
+  """ Handles every command that is waiting. This should be called once per
+  iteration of the simulation loop, but only does anything while a client is
+  connected.
+  handler: Gets called with the name of each command and a list of its
+  arguments, and returns the result to send back. It can raise ControlError if
+  the command is no good. Anything else that it raises gets sent back as an
+  error too. """
+  def poll(self, handler):
+    if not self.__clients.value:
+      return
+
+    connection = self.__simulation_end
+    while connection.poll():
+      command, arguments = connection.recv()
+      try:
+        connection.send((True, handler(command, arguments)))
+      except ControlError as error:
+        connection.send((False, error.value))
+      except Exception as error:
+        # The server is waiting for a reply, so we always have to send one, and
+        # a bad command shouldn't take the whole simulation down.
+        logger.exception("Command '%s' failed." % (command))
+        connection.send((False, "%s: %s" % (type(error).__name__,
+                                             str(error))))
+
+  """ Serves the control socket forever. This is meant to be run by the process
+  that started the simulation, in place of just waiting for it.
+  path: The path of the Unix socket to listen on. """
+  def serve(self, path):
+    asyncio.run(ControlServer(self.__server_end, self.__clients).serve(path))
+
+
+""" Accepts clients on a Unix socket, and passes their commands along to the
+simulation process. Clients send one JSON object per line, in the form
+{"command": name, "arguments": [...]}, and get one back for each, in the form
+{"ok": true, "result": ...} or {"ok": false, "error": message}. The "watch"
+command is special: it gets a line of statistics from the simulation every
+so often until the client goes away. """
+class ControlServer:
+  """ connection: Our end of the pipe to the simulation process.
+  clients: The shared count of connected clients. """
+  def __init__(self, connection, clients):
+    self.__connection = connection
+    self.__clients = clients
+    # Only one command can be waiting on the simulation at once, or the replies
+    # would get mixed up.
+    self.__lock = None
+
+  """ Serves the socket until we get killed.
+  path: The path of the Unix socket to listen on. """
+  async def serve(self, path):
+    self.__lock = asyncio.Lock()
+
+    if os.path.exists(path):
+      # It's left over from before.
+      os.remove(path)
+    server = await asyncio.start_unix_server(self.__handle_client, path=path)
+    logger.info("Serving control socket at '%s'." % (path))
+
+    try:
+      async with server:
+        await server.serve_forever()
+    finally:
+      os.remove(path)
+
+  """ Sends a command to the simulation process, and waits for the reply.
+  command: The name of the command.
+  arguments: A list of its arguments.
+  Returns: Whether it worked, and the result or error message. """
+  async def __request(self, command, arguments):
+    async with self.__lock:
+      self.__connection.send((command, arguments))
+      # The simulation process only answers between iterations, so don't tie up
+      # everyone else while we wait.
+      return await asyncio.get_running_loop().run_in_executor(
+          None, self.__connection.recv)
+
+  """ Talks to one client until it disconnects.
+  reader: The stream to read from the client.
+  writer: The stream to write to the client. """
+  async def __handle_client(self, reader, writer):
+    self.__clients.value += 1
+    try:
+      while True:
+        line = await reader.readline()
+        if not line:
+          break
+
+        try:
+          request = json.loads(line)
+          command = request["command"]
+          arguments = request.get("arguments", [])
+        except (ValueError, KeyError, TypeError):
+          await self.__reply(writer, False, "Malformed request.")
+          continue
+
+        if command == "watch":
+          interval = float(arguments[0]) if arguments else 1.0
+          await self.__watch(writer, interval)
+          break
+
+        ok, result = await self.__request(command, arguments)
+        await self.__reply(writer, ok, result)
+
+    except ConnectionError:
+      logger.info("Control client went away.")
+    finally:
+      self.__clients.value -= 1
+      writer.close()
+
+  """ Sends statistics to a client until it disconnects.
+  writer: The stream to write to the client.
+  interval: How long to wait between each set of statistics, in seconds. """
+  async def __watch(self, writer, interval):
+    while not writer.is_closing():
+      ok, result = await self.__request("stats", [])
+      await self.__reply(writer, ok, result)
+      await asyncio.sleep(interval)
+
+  """ Sends a reply to a client.
+  writer: The stream to write to the client.
+  ok: Whether the command worked.
+  result: The result of the command, or an error message if it didn't work.
+  """
+  async def __reply(self, writer, ok, result):
+    if ok:
+      reply = {"ok": True, "result": result}
+    else:
+      reply = {"ok": False, "error": result}
+    writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+""" Sends a command to a running simulation.
+path: The path of the simulation's control socket.
+command: The name of the command.
+arguments: A list of its arguments.
+Returns: A file to read the replies from, one JSON object per line. """
+def send_command(path, command, arguments=()):
+  client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  client.connect(path)
+  request = {"command": command, "arguments": list(arguments)}
+  client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+  replies = client.makefile("r", encoding="utf-8")
+  client.close()
+  return replies
+
+
+def main():
+  if len(sys.argv) < 3:
+    print("Usage: control.py socket command [arguments]")
+    print("Commands: pause, resume, step [count], rate iterations_per_second,")
+    print("          checkpoint file, stats, watch [interval],")
+    print("          profile seconds file, memory")
+    sys.exit()
+
+  path, command = sys.argv[1:3]
+  arguments = sys.argv[3:]
+  if command in ("rate", "step", "watch", "profile") and arguments:
+    # The first argument is a number, but profile also takes a file name.
+    arguments[0] = float(arguments[0])
+
+  replies = send_command(path, command, arguments)
+  try:
+    for line in replies:
+      reply = json.loads(line)
+      if not reply["ok"]:
+        print("Error: %s" % (reply["error"]))
+        sys.exit(1)
+      print(json.dumps(reply["result"], sort_keys=True))
+      if command != "watch":
+        break
+  except KeyboardInterrupt:
+    pass
+  finally:
+    replies.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,494 @@
+#!/usr/bin/python3
+
+from modified_logger import Logger
+if __name__ == "__main__":
+  # This has to happen before anything uses a Logger.
+  Logger.set_path("domain.log")
+
+import logging
+import multiprocessing
+import random
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+import yaml
+try:
+  from yaml import CLoader as Loader, CDumper as Dumper
+except ImportError:
+  logger.warning("Falling back on Python yaml parser.")
+  from yaml import Loader, Dumper
+
+try:
+  from mpi4py import MPI
+except ImportError:
+  # We can still run everything on one machine.
+  MPI = None
+
+from organism import Organism, OrganismError
+from swig_modules.automata import Organism as C_Organism
+
+
+class DomainError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Splits the columns of the grid into strips that are as close to the same
+width as possible.
+x_size: The width of the whole grid.
+parts: How many strips to make.
+Returns: A list of the strips, in the form (start, end), where end is one past
+the last column. """
+def split_columns(x_size, parts):
+  if parts < 1 or parts > x_size:
+    logger.log_and_raise(DomainError,
+        "Can't split %d columns into %d parts." % (x_size, parts))
+
+  width, extra = divmod(x_size, parts)
+  strips = []
+  start = 0
+  for i in range(0, parts):
+    # The first few strips pick up the leftover columns.
+    end = start + width + (1 if i < extra else 0)
+    strips.append((start, end))
+    start = end
+
+  return strips
+
+
+""" Carries messages between the workers in a decomposed simulation. Every
+worker has a rank, from 0 up to the number of workers, and messages are
+anything that can be pickled. This is the interface that all transports
+implement. """
+class Transport:
+  """ rank: The rank of this worker.
+  size: How many workers there are. """
+  def __init__(self, rank, size):
+    self.__rank = rank
+    self.__size = size
+
+  """ Returns: The rank of this worker. """
+  def get_rank(self):
+    return self.__rank
+
+  """ Returns: How many workers there are. """
+  def get_size(self):
+    return self.__size
+
+  """ Sends a message to another worker.
+  rank: The worker to send it to.
+  message: The message. """
+  def send(self, rank, message):
+    logger.log_and_raise(NotImplementedError,
+        "'send' must be implemented by subclass.")
+
+  """ Waits for a message from another worker.
+  rank: The worker to get it from.
+  Returns: The message. """
+  def receive(self, rank):
+    logger.log_and_raise(NotImplementedError,
+        "'receive' must be implemented by subclass.")
+
+  """ Sends a message to each of a set of workers, and gets one back from each
+  of them. Every pair of workers does their half in the same order, with the
+  lower rank sending first, so nobody ever waits on someone who is waiting on
+  them.
+  messages: The messages to send, keyed by rank.
+  Returns: The messages that came back, keyed by rank. """
+  def exchange(self, messages):
+    received = {}
+    for rank in sorted(messages.keys()):
+      if self.__rank < rank:
+        self.send(rank, messages[rank])
+        received[rank] = self.receive(rank)
+      else:
+        received[rank] = self.receive(rank)
+        self.send(rank, messages[rank])
+
+    return received
+
+  """ Collects something from every worker on worker 0.
+  message: What this worker has to contribute.
+  Returns: On worker 0, a list of what every worker contributed, in rank order.
+  On every other worker, None. """
+  def gather(self, message):
+    if self.__rank:
+      self.send(0, message)
+      return None
+
+    return [message] + [self.receive(rank) \
+                        for rank in range(1, self.__size)]
+
+
+""" A transport for workers on the same machine, built from pipes. """
+class PipeTransport(Transport):
+  """ Makes a transport for every worker, with a pipe between every pair of
+  them. They have to be handed out to the workers before any of them get used.
+  size: How many workers there are.
+  Returns: A list of the transports, in rank order. """
+  @classmethod
+  def create(cls, size):
+    connections = [{} for i in range(0, size)]
+    for rank in range(0, size):
+      for other in range(rank + 1, size):
+        ours, theirs = multiprocessing.Pipe()
+        connections[rank][other] = ours
+        connections[other][rank] = theirs
+
+    return [cls(rank, size, connections[rank]) for rank in range(0, size)]
+
+  """ rank: The rank of this worker.
+  size: How many workers there are.
+  connections: The end of the pipe to every other worker, keyed by rank. """
+  def __init__(self, rank, size, connections):
+    super().__init__(rank, size)
+    self.__connections = connections
+
+  def send(self, rank, message):
+    self.__connections[rank].send(message)
+
+  def receive(self, rank):
+    return self.__connections[rank].recv()
+
+
+""" A transport that uses MPI, for running workers across many machines. It
+needs mpi4py. """
+class MpiTransport(Transport):
+  # The tag that all our messages get, so we don't get mixed up with anyone
+  # else using the same communicator.
+  _TAG = 37
+
+  """ communicator: The MPI communicator to use. Defaults to every process that
+  was started. """
+  def __init__(self, communicator=None):
+    if MPI is None:
+      logger.log_and_raise(DomainError, "MPI transport needs mpi4py.")
+
+    self.__communicator = communicator or MPI.COMM_WORLD
+    super().__init__(self.__communicator.Get_rank(),
+                     self.__communicator.Get_size())
+
+  def send(self, rank, message):
+    self.__communicator.send(message, dest=rank, tag=self._TAG)
+
+  def receive(self, rank):
+    return self.__communicator.recv(source=rank, tag=self._TAG)
+
+
+""" One worker's part of a decomposed simulation. The grid is split into strips
+of columns, and each worker's grid holds its own strip plus a halo of columns
+from its neighbors on either side. Once per iteration, right before the grid
+gets updated, neighbors swap two things:
+
+  - Organisms that moved into the halo belong to the neighbor now, so they get
+    sent over, with their attributes and state.
+  - The cells along each edge of the strip get copied into the neighbor's halo,
+    so that things there can see across the edge.
+
+The copies in the halo are immobile C++ organisms that aren't registered
+anywhere. Anything that tries to move into one gets moved somewhere else, the
+same way as with any other conflict, and organisms that move using fields can
+see them. Organisms that use movement factors can't, and nothing can be eaten
+across an edge. Organisms that arrive from a neighbor go through the grid's
+pending and conflicted slots like any other move. If one loses a conflict,
+because something here is already moving into its cell, it goes in the nearest
+vacant cell instead. """
+class Subdomain:
+  """ x_size: The width of the whole grid.
+  y_size: The height of the whole grid.
+  transport: The transport to use to talk to the other workers. There is one
+  strip for every worker.
+  halo: How many columns each side of the halo has. Nothing can move farther
+  than this in one iteration without being held back at the edge. """
+  def __init__(self, x_size, y_size, transport, halo=1):
+    self.__transport = transport
+    self.__rank = transport.get_rank()
+    self.__y_size = y_size
+    self.__halo = halo
+
+    strips = split_columns(x_size, transport.get_size())
+    if halo < 1 or halo > min([end - start for start, end in strips]):
+      logger.log_and_raise(DomainError,
+          "Halo must be between 1 and the width of the narrowest strip.")
+    self.__strips = strips
+    self.__start, self.__end = strips[self.__rank]
+
+    # The columns that our grid covers, including the halo.
+    self.__offset = max(self.__start - halo, 0)
+    self.__x_size = min(self.__end + halo, x_size) - self.__offset
+
+    self.__neighbors = []
+    if self.__rank > 0:
+      self.__neighbors.append(self.__rank - 1)
+    if self.__rank < len(strips) - 1:
+      self.__neighbors.append(self.__rank + 1)
+
+    # The copies of our neighbors' organisms that are in our halo.
+    self.__ghosts = []
+    # How many organisms we have sent to our neighbors.
+    self.__migrations = 0
+
+  """ Returns: The rank of this worker. """
+  def get_rank(self):
+    return self.__rank
+
+  """ Returns: The size of the grid that this worker needs, in the form
+  (x_size, y_size). """
+  def get_grid_size(self):
+    return (self.__x_size, self.__y_size)
+
+  """ Returns: How many organisms this worker has sent to its neighbors. """
+  def get_migrations(self):
+    return self.__migrations
+
+  """ Figures out which worker owns a column.
+  x: The column, on the whole grid.
+  Returns: The rank of the worker. """
+  def get_owner(self, x):
+    for rank, (start, end) in enumerate(self.__strips):
+      if start <= x < end:
+        return rank
+
+    logger.log_and_raise(DomainError, "Column %d is not on the grid." % (x))
+
+  """ Converts a position on the whole grid to one on our grid.
+  position: The position, in the form (x, y).
+  Returns: The position on our grid. """
+  def to_local(self, position):
+    return (position[0] - self.__offset, position[1])
+
+  """ Converts a position on our grid to one on the whole grid.
+  position: The position, in the form (x, y).
+  Returns: The position on the whole grid. """
+  def to_global(self, position):
+    return (position[0] + self.__offset, position[1])
+
+  """ Picks out the positions that we own from a set of positions on the whole
+  grid. Every worker places organisms the same way, so this is how they get
+  divided up.
+  positions: The positions, in the form (x, y).
+  Returns: The ones that we own, converted to positions on our grid. """
+  def claim(self, positions):
+    return [self.to_local(position) for position in positions \
+            if self.__start <= position[0] < self.__end]
+
+  """ Makes the random numbers that this worker uses from now on different from
+  every other worker's. Everyone needs the same ones for placing organisms, but
+  after that, they would all just be doing the same thing. """
+  def split_random(self):
+    random.seed(random.getrandbits(64) + self.__rank)
+
+  """ Sends organisms that left our strip to their new owners, takes in the ones
+  that came to us, and refreshes the halo. This has to be run by every worker
+  at the same point in every iteration, after everything has moved, but before
+  the grid is updated.
+  grid: Our grid.
+  Returns: A list of the organisms that left, which have already been deleted,
+  and a list of the ones that arrived. """
+  def exchange(self, grid):
+    registry = grid.registry
+    migrants = {rank: [] for rank in self.__neighbors}
+    edges = {rank: [] for rank in self.__neighbors}
+
+    departed = []
+    for grid_object in registry:
+      x, y = self.to_global(grid_object.get_position())
+      if self.__start <= x < self.__end:
+        # It's still ours, but our neighbors might be able to see it.
+        group = registry.get_group_name(grid_object.get_group())
+        if x < self.__start + self.__halo and self.__rank - 1 in edges:
+          edges[self.__rank - 1].append((x, y, group))
+        if x >= self.__end - self.__halo and self.__rank + 1 in edges:
+          edges[self.__rank + 1].append((x, y, group))
+        continue
+
+      migrants[self.get_owner(x)].append(
+          (grid_object.get_all_attributes(), (x, y), grid_object.get_state()))
+      departed.append(grid_object)
+
+    for grid_object in departed:
+      grid_object.delete()
+    self.__migrations += len(departed)
+
+    received = self.__transport.exchange(
+        {rank: (migrants[rank], edges[rank]) for rank in self.__neighbors})
+
+    arrived = []
+    for rank in sorted(received.keys()):
+      for attributes, position, state in received[rank][0]:
+        arrived.append(self.__place(grid, attributes,
+                                    self.to_local(position), state))
+    self.__update_halo(grid, [cell for rank in sorted(received.keys()) \
+                              for cell in received[rank][1]])
+
+    return departed, arrived
+
+  """ Puts an organism that came from a neighbor on our grid.
+  grid: Our grid.
+  attributes: The organism's attributes.
+  position: Where it moved to, on our grid.
+  state: The organism's state, from Organism.get_state().
+  Returns: The new organism. """
+  def __place(self, grid, attributes, position, state):
+    candidates = [position]
+    levels = 1
+    while True:
+      for candidate in candidates:
+        try:
+          organism = Organism.spawn(grid, [candidate], attributes)[0]
+        except OrganismError:
+          # Something here is already moving in.
+          continue
+
+        organism.set_state(state)
+        return organism
+
+      # Look farther out, but stay in our strip.
+      if levels > max(self.__x_size, self.__y_size):
+        logger.log_and_raise(DomainError,
+            "No room for organism arriving at %s." % (str(position)))
+      candidates = [candidate for candidate in \
+                    grid.get_vacant_locations(position, levels) \
+                    if self.__start <= self.to_global(candidate)[0] < \
+                                       self.__end]
+      random.shuffle(candidates)
+      levels += 1
+
+  """ Replaces the copies of our neighbors' organisms in our halo.
+  grid: Our grid.
+  cells: The cells along the edges of our neighbors' strips that have
+  something in them, in the form (x, y, group), on the whole grid. """
+  def __update_halo(self, grid, cells):
+    for ghost in self.__ghosts:
+      ghost.RemoveFromGrid()
+    self.__ghosts = []
+
+    registry = grid.registry
+    for x, y, group in cells:
+      x, y = self.to_local((x, y))
+
+      # Unregistered objects have an index of -1, so that we can tell them
+      # apart.
+      ghost = C_Organism(grid, -1)
+      if group is not None:
+        ghost.set_group(registry.get_group_id(group))
+      ghost.set_immobile(True)
+      if not ghost.Initialize(x, y):
+        logger.log_and_raise(DomainError,
+            "Could not copy neighbor's organism to %s." % (str((x, y))))
+      self.__ghosts.append(ghost)
+
+
+""" Runs one worker of a decomposed simulation.
+config: The simulation configuration, in the same format that main.py takes.
+transport: The transport for this worker.
+iterations: How many iterations to run for.
+halo: How many columns each side of the halo has.
+seed: The seed for placing organisms. Every worker has to use the same one.
+Returns: On worker 0, the summary statistics for the whole simulation. On every
+other worker, None. """
+def run_worker(config, transport, iterations, halo=1, seed=0):
+  # This imports a lot of things that the workers don't need until they start.
+  from simulation import Simulation
+
+  for key in ("Statistics", "Environment", "AdaptiveTime", "Memory"):
+    if config.get(key):
+      logger.log_and_raise(DomainError,
+          "%s is not supported with domain decomposition." % (key))
+
+  random.seed(seed)
+  domain = Subdomain(config["GridXSize"], config["GridYSize"], transport, halo)
+  simulation = Simulation(config["GridXSize"], config["GridYSize"],
+                          config["IterationTime"], domain=domain,
+                          handlers=config.get("Handlers"))
+  for organism in config["Organisms"]:
+    simulation.add_organisms(organism["Library"], organism["Name"],
+                             organism["Quantity"], organism.get("Overrides"),
+                             organism.get("Placement"))
+
+  result = simulation.run(iterations)
+  result["Migrations"] = domain.get_migrations()
+  results = transport.gather(result)
+  if results is None:
+    return None
+  return _merge_results(results)
+
+""" Combines the summary statistics from every worker.
+results: The results from Simulation.run() on each worker.
+Returns: The summary statistics for the whole simulation. """
+def _merge_results(results):
+  merged = {"Iterations": results[0]["Iterations"],
+            "SimulationTime": results[0]["SimulationTime"],
+            "WallTime": max([result["WallTime"] for result in results]),
+            "Migrations": sum([result["Migrations"] for result in results]),
+            "InitialPopulation": {}, "FinalPopulation": {}, "Extinctions": {}}
+
+  for result in results:
+    for key in ("InitialPopulation", "FinalPopulation"):
+      for species, count in result[key].items():
+        merged[key][species] = merged[key].get(species, 0) + count
+
+  # A species is only extinct once it is gone from every strip, which is the
+  # last time that it went extinct in any of them.
+  for species, count in merged["FinalPopulation"].items():
+    if count:
+      continue
+    merged["Extinctions"][species] = \
+        max([result["Extinctions"].get(species, 0) for result in results])
+
+  return merged
+
+""" Runs a decomposed simulation with every worker on this machine, connected by
+pipes. This process is worker 0.
+config: The simulation configuration, in the same format that main.py takes.
+parts: How many workers to split it between.
+iterations: How many iterations to run for.
+halo: How many columns each side of the halo has.
+seed: The seed for placing organisms.
+Returns: The summary statistics for the whole simulation. """
+def run_local(config, parts, iterations, halo=1, seed=0):
+  transports = PipeTransport.create(parts)
+
+  workers = []
+  for transport in transports[1:]:
+    worker = multiprocessing.Process(target=run_worker,
+        args=(config, transport, iterations, halo, seed))
+    worker.start()
+    workers.append(worker)
+
+  try:
+    return run_worker(config, transports[0], iterations, halo, seed)
+  finally:
+    for worker in workers:
+      worker.join()
+
+
+def main():
+  if len(sys.argv) not in (3, 4):
+    print("Usage: domain.py conf_file iterations [parts]")
+    print("Under mpirun, there is one part for every MPI process.")
+    sys.exit()
+
+  config_file = open(sys.argv[1])
+  config = yaml.load(config_file, Loader=Loader)
+  config_file.close()
+  iterations = int(sys.argv[2])
+
+  if MPI is not None and MPI.COMM_WORLD.Get_size() > 1:
+    result = run_worker(config, MpiTransport(), iterations)
+  else:
+    parts = 2
+    if len(sys.argv) == 4:
+      parts = int(sys.argv[3])
+    result = run_local(config, parts, iterations)
+
+  if result is not None:
+    yaml.dump(result, sys.stdout, Dumper=Dumper)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,115 @@
+class EnvironmentConfigError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+from array import array
+
+import logging
+
+from placement import read_map
+from swig_modules.automata import Environment as C_Environment
+
+
+logger = logging.getLogger(__name__)
+
+
+""" The Python representation of the environment that a grid is in. It holds
+rasters with one value for each cell, for things like how much sunlight the
+cell gets, and how hard it is to move into. The rasters live in C++, so the
+grid and the metabolism simulations can look them up without going through
+Python. """
+class Environment(C_Environment):
+  """ Creates an environment from the Environment section of a configuration.
+  Every raster in it is either a list of rows of values, or the path to a file
+  with one row per line. (See placement.read_map() for the format.) Like density
+  maps, rasters get stretched to cover the whole grid.
+  config: The Environment section.
+  x_size: The horizontal size of the grid.
+  y_size: The vertical size of the grid.
+  Returns: The new environment. """
+  @classmethod
+  def from_config(cls, config, x_size, y_size):
+    environment = cls(x_size, y_size)
+
+    if "Sunlight" in config:
+      environment.set_sunlight(config["Sunlight"])
+    if "MovementCost" in config:
+      environment.set_movement_cost(config["MovementCost"])
+    if "Blocked" in config:
+      environment.set_blocked(config["Blocked"])
+    environment.SetCycle(config.get("DayLength", 0),
+                         config.get("YearLength", 0),
+                         config.get("SeasonalVariation", 0))
+
+    return environment
+
+  """ x_size: The horizontal size of the grid.
+  y_size: The vertical size of the grid. """
+  def __init__(self, x_size, y_size):
+    super().__init__(x_size, y_size)
+
+    self.__x_size = x_size
+    self.__y_size = y_size
+    # The positions of all the blocked cells.
+    self.__blocked_cells = []
+
+  """ Sets how much sunlight each cell gets, relative to the average for the
+  earth's surface.
+  source: The raster, either as a list of rows or a path. """
+  def set_sunlight(self, source):
+    if not self.SetSunlight(self.__load("d", source)):
+      logger.log_and_raise(EnvironmentConfigError,
+                           "Sunlight cannot be negative.")
+
+  """ Sets how hard it is to move into each cell. Organisms are less likely to
+  move into cells that cost more, and they use more energy doing it.
+  source: The raster, either as a list of rows or a path. """
+  def set_movement_cost(self, source):
+    if not self.SetMovementCost(self.__load("d", source)):
+      logger.log_and_raise(EnvironmentConfigError,
+                           "Movement costs must be positive.")
+
+  """ Sets which cells nothing can go in.
+  source: The raster, either as a list of rows or a path. Any cell with a
+  nonzero value is blocked. """
+  def set_blocked(self, source):
+    blocked = self.__load("i", source)
+    if not self.SetBlocked(blocked):
+      logger.log_and_raise(EnvironmentConfigError,
+                           "Failed to set blocked cells.")
+
+    self.__blocked_cells = [(i % self.__x_size, i // self.__x_size) \
+                            for i, value in enumerate(blocked) if value]
+
+  """ Returns: A list of the positions of all the blocked cells, in the form
+  (x, y). """
+  def get_blocked_cells(self):
+    return self.__blocked_cells
+
+  """ Loads a raster and stretches it to cover the grid.
+  typecode: Either "i" for ints or "d" for doubles.
+  source: The raster, either as a list of rows or a path.
+  Returns: An array with one value for each cell, in row-major order. """
+  def __load(self, typecode, source):
+    rows = source
+    if type(source) is str:
+      rows = read_map(source)
+
+    if not rows or not all(rows):
+      logger.log_and_raise(EnvironmentConfigError,
+                           "Environment rasters cannot be empty.")
+    if any(len(row) != len(rows[0]) for row in rows):
+      logger.log_and_raise(EnvironmentConfigError,
+          "All the rows in an environment raster must be the same length.")
+
+    values = array(typecode)
+    for y in range(0, self.__y_size):
+      row = rows[y * len(rows) // self.__y_size]
+      for x in range(0, self.__x_size):
+        value = row[x * len(row) // self.__x_size]
+        values.append(int(value != 0) if typecode == "i" else value)
+
+    return values
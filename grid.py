@@ -0,0 +1,296 @@
+class GridError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+from array import array
+
+import logging
+
+from swig_modules.automata import Grid as C_Grid
+from swig_modules.automata import IntVector
+from registry import Registry
+
+try:
+  import numpy
+except ImportError:
+  # We can still hand out memoryviews.
+  numpy = None
+
+
+logger = logging.getLogger(__name__)
+
+""" The Python representation of the grid. Besides the grid itself, it owns the
+registry of every object that is on it, so nothing about a simulation is global,
+and more than one of them can exist at once. """
+class Grid(C_Grid):
+  # The columns that get_object_columns() returns, and what C++ calls them.
+  OBJECT_COLUMNS = (("Index", C_Grid.kObjectIndex), ("X", C_Grid.kObjectX),
+                    ("Y", C_Grid.kObjectY), ("Group", C_Grid.kObjectGroup),
+                    ("Mass", C_Grid.kObjectMass),
+                    ("Energy", C_Grid.kObjectEnergy))
+
+  """ x_size: The horizontal size of the grid.
+  y_size: The vertical size of the grid. """
+  def __init__(self, x_size, y_size):
+    super().__init__(x_size, y_size)
+
+    self.__x_size = x_size
+    self.__y_size = y_size
+
+    # All the objects on this grid.
+    self.registry = Registry()
+    # The environment that the grid is in, if it has one.
+    self.environment = None
+
+    # Buffers for getting locations back from C++. They get reused, so we don't
+    # have to allocate new ones every time.
+    self.__xs = IntVector()
+    self.__ys = IntVector()
+
+    # Buffers that C++ writes the state of the grid into, keyed by field. They
+    # get allocated the first time they're needed.
+    self.__cell_buffers = {}
+    self.__object_buffers = {}
+    # How many objects fit in the object buffers.
+    self.__object_capacity = 0
+
+    # Answers questions about what is around each location.
+    self.perception = Perception(self)
+
+  """ Bakes everything that moved into the grid. Anything that Perception
+  remembered is out of date after this.
+  Returns: False if there are unresolved conflicts, True otherwise. """
+  def Update(self):
+    self.perception.clear()
+    return super().Update()
+
+  """ Puts the grid in an environment. This should happen before anything goes
+  on the grid, so that nothing ends up in a blocked cell, and so that plants
+  know where to get their sunlight from.
+  environment: The Environment, or None to go without one. """
+  def set_environment(self, environment):
+    if not self.SetEnvironment(environment):
+      logger.log_and_raise(GridError,
+          "Environment must be the same size as the grid.")
+    # C++ doesn't own it, so we have to keep it alive.
+    self.environment = environment
+
+  """ Finds the cells around a location that nothing is in, or about to move
+  into.
+  position: The location to look around, in the form (x, y).
+  levels: How far away from the location to look, in cells.
+  Returns: A list of the vacant cells, in the form (x, y). """
+  def get_vacant_locations(self, position, levels=1):
+    if not self.GetVacantLocations(position[0], position[1], self.__xs,
+                                   self.__ys, levels):
+      return []
+    return list(zip(self.__xs, self.__ys))
+
+  """ Gets the index of the object in every cell, as of the last grid update.
+  Returns: A read-only view indexed by [y, x], with -1 for empty cells. It is a
+  NumPy array if NumPy is installed, and a memoryview otherwise. The view is
+  only good until the next time this is called, because the same buffer gets
+  reused. """
+  def get_occupants(self):
+    return self.__export_cells(C_Grid.kCellIndex)
+
+  """ Gets the group of the object in every cell, as of the last grid update.
+  Organisms are grouped by species, and the registry knows the name of each
+  group. (See Registry.get_group_name().)
+  Returns: The same kind of view as get_occupants(). """
+  def get_groups(self):
+    return self.__export_cells(C_Grid.kCellGroup)
+
+  """ Gets the state of every object on the grid, as of the last grid update.
+  Returns: A dictionary mapping the names in OBJECT_COLUMNS to read-only views
+  with one item for each object. The same position in every column refers to
+  the same object. Objects without a metabolism have NaN mass and energy. Like
+  get_occupants(), the views are only good until this is called again. """
+  def get_object_columns(self):
+    count = self.CountObjects()
+    if count > self.__object_capacity:
+      # Leave some room to grow, so we don't have to do this every time.
+      self.__object_capacity = max(count, self.__object_capacity * 2)
+      self.__object_buffers.clear()
+
+    columns = {}
+    for name, field in self.OBJECT_COLUMNS:
+      buffer = self.__object_buffers.get(field)
+      if buffer is None:
+        buffer = _allocate("d", self.__object_capacity)
+        self.__object_buffers[field] = buffer
+
+      self.ExportObjects(field, buffer)
+      columns[name] = _read_only(buffer, count)
+
+    return columns
+
+  """ Has C++ write one field for every cell into a buffer.
+  field: The field to write.
+  Returns: A read-only view of the buffer, indexed by [y, x]. """
+  def __export_cells(self, field):
+    buffer = self.__cell_buffers.get(field)
+    if buffer is None:
+      buffer = _allocate("i", self.__x_size * self.__y_size)
+      self.__cell_buffers[field] = buffer
+
+    self.ExportCells(field, buffer)
+
+    if numpy is not None:
+      return _read_only(buffer.reshape(self.__y_size, self.__x_size))
+    return _read_only(memoryview(buffer).cast("B").cast(
+        "i", shape=(self.__y_size, self.__x_size)))
+
+
+""" Answers questions about what is around a location, so that handlers can
+react to their surroundings without looking through every organism. Answers
+come from the grid as of its last update, so they can't change until the next
+one, and they get remembered until then. That way, the same question doesn't
+cost anything the second time, even if it comes from a different handler.
+
+Species are given by their scientific names, and objects are given back as
+their handles. (See Registry.get().) """
+class Perception:
+  """ grid: The grid to look at. """
+  def __init__(self, grid):
+    self.__grid = grid
+
+    # Answers we've already worked out, keyed by the question.
+    self.__answers = {}
+    # Buffer for C++ to write handles into. It grows when something doesn't fit.
+    self.__buffer = _allocate("i", 64)
+    # How many questions were answered from what we remembered, and how many
+    # had to go to C++.
+    self.__hits = 0
+    self.__misses = 0
+
+  """ Forgets all the answers. The grid does this every time it updates. """
+  def clear(self):
+    self.__answers.clear()
+
+  """ Finds the objects around a location.
+  position: The location to look around, in the form (x, y). Whatever is at
+  the location itself doesn't count.
+  radius: How far away to look, in cells.
+  species: Only find organisms of this species, or None to find everything.
+  Returns: A read-only view with the handle of each object, closest first. It
+  is a NumPy array if NumPy is installed, and a memoryview otherwise. """
+  def find_neighbors(self, position, radius, species=None):
+    question = ("find", tuple(position), radius, species)
+    answer = self.__recall(question)
+    if answer is not None:
+      return answer
+
+    x, y = position
+    group = self.__get_group(species)
+    count = self.__grid.FindObjectsNear(x, y, radius, group, self.__buffer)
+    if count > len(self.__buffer):
+      self.__buffer = _allocate("i", max(count, len(self.__buffer) * 2))
+      self.__grid.FindObjectsNear(x, y, radius, group, self.__buffer)
+
+    # The buffer gets reused, so we need our own copy to remember.
+    answer = _allocate("i", count)
+    answer[:] = self.__buffer[:count]
+    answer = _read_only(answer)
+    self.__answers[question] = answer
+    return answer
+
+  """ Counts the objects around a location. The arguments are the same as for
+  find_neighbors().
+  Returns: How many objects there are. """
+  def count_neighbors(self, position, radius, species=None):
+    question = ("count", tuple(position), radius, species)
+    answer = self.__recall(question)
+    if answer is not None:
+      return answer
+
+    answer = self.__grid.CountObjectsNear(position[0], position[1], radius,
+                                          self.__get_group(species))
+    self.__answers[question] = answer
+    return answer
+
+  """ Finds the closest object to a location. Distance is measured in rings of
+  cells, the same way as vision, and ties go to whichever is closest in a
+  straight line.
+  position: The location to look around, in the form (x, y).
+  radius: How far away to look, in cells.
+  species: Only find organisms of this species. It can also be a list of
+  species, to find the closest organism of any of them, or None to find the
+  closest of anything.
+  Returns: The handle of the object, or None if there isn't one. """
+  def find_nearest(self, position, radius, species=None):
+    if isinstance(species, list):
+      # Lists can't be used as keys.
+      species = tuple(species)
+    question = ("nearest", tuple(position), radius, species)
+    if question in self.__answers:
+      self.__hits += 1
+      return self.__answers[question]
+    self.__misses += 1
+
+    if species is None:
+      groups = []
+    elif isinstance(species, tuple):
+      groups = [self.__get_group(name) for name in species]
+    else:
+      groups = [self.__get_group(species)]
+
+    handle = self.__grid.FindNearest(position[0], position[1], radius,
+                                     array("i", groups))
+    answer = handle if handle >= 0 else None
+    self.__answers[question] = answer
+    return answer
+
+  """ Returns: How many questions were answered from memory, how many had to
+  be worked out, and how many answers are remembered right now, in a
+  dictionary. """
+  def get_stats(self):
+    return {"Hits": self.__hits, "Misses": self.__misses,
+            "Remembered": len(self.__answers)}
+
+  """ Looks for an answer we already have.
+  question: The question, as it is used for a key.
+  Returns: The answer, or None if we don't have it. """
+  def __recall(self, question):
+    answer = self.__answers.get(question)
+    if answer is None:
+      self.__misses += 1
+    else:
+      self.__hits += 1
+    return answer
+
+  """ species: The name of a species, or None for all of them.
+  Returns: The group number that C++ uses for it, or -1 for all of them. """
+  def __get_group(self, species):
+    if species is None:
+      return -1
+    return self.__grid.registry.get_group_id(species)
+
+
+""" Allocates a buffer that C++ can write into.
+typecode: Either "i" for ints or "d" for doubles.
+size: How many items the buffer holds.
+Returns: A NumPy array if NumPy is installed, otherwise an array.array. """
+def _allocate(typecode, size):
+  if numpy is not None:
+    return numpy.empty(size, dtype=numpy.dtype(typecode))
+  return array(typecode, [0]) * size
+
+""" Makes a read-only view of a buffer, without copying it.
+buffer: The buffer, which is either a NumPy array, a memoryview, or an
+array.array.
+count: If this is given, only the first count items are in the view.
+Returns: The view. """
+def _read_only(buffer, count=None):
+  if numpy is not None:
+    view = buffer[:count]
+    view.flags.writeable = False
+    return view
+
+  view = memoryview(buffer)
+  if count is not None:
+    view = view[:count]
+  return view.toreadonly()
@@ -16,24 +16,19 @@ class GridObjectError(Exception):
 """ A generic superclass for representing objects that are on the grid.
 Basically a thin wrapper around the C++ version of this class."""
 class GridObject(C_GridObject):
-  # A global set of all the grid objects in this simulation.
-  grid_objects = set([])
-  # A dictionary of all the grid objects in the simulation, keyed by index.
-  objects_by_index = {}
-  # The current index we are on.
-  current_index = 0
-
   """ grid: The grid to create this object on.
   position: The coordinates of the objects."""
   def __init__(self, grid, position):
-    self._object = C_GridObject(grid, GridObject.current_index);
+    self._object = C_GridObject(grid, 0);
 
     if not self._object.Initialize(position[0], position[1]):
       raise GridObjectError("Failed to initialize grid object.")
 
-    GridObject._add_object(self)
+    # The registry of the grid we are on. Adding ourselves sets our index.
+    self._registry = grid.registry
+    self._registry.add(self)
 
-  """ We always have references sitting around in the grid_objects set, so this
+  """ We always have references sitting around in the grid's registry, so this
   method deletes it manually.
   IMPORTANT: This should be called whenever someone is done with a grid object,
   otherwise, it will NEVER be garbage collected! """
@@ -41,41 +36,19 @@ class GridObject(C_GridObject):
     # Remove ourselves from the grid.
     self.remove()
 
-    GridObject.grid_objects.remove(self)
-    GridObject.objects_by_index.pop(self.get_index())
-
-  """ Add a new object to the list of grid objects, and increments
-  current_index.
-  grid_object: The object to add. """
-  @classmethod
-  def _add_object(cls, grid_object):
-    logger.debug("Adding grid object with index %d." % (cls.current_index))
-
-    cls.grid_objects.add(grid_object)
-    cls.objects_by_index[grid_object.get_index()] = grid_object
-    cls.current_index += 1
-
-  """ Gets a grid object from the list of grid objects by index.
-  index: The index of the object we are looking for.
-  Returns: The grid object with the specified index. """
-  @classmethod
-  def get_by_index(cls, index):
-    grid_object = cls.objects_by_index[index]
-    if grid_object.get_index() != index:
-      logger.log_and_raise(ValueError,
-          "Grid object has set index %d, but is at index %d." % \
-          (grid_object.get_index(), index))
-
-    return grid_object
-
-  """ Removes all the objects from the grid_objects list and resets
-  current_index. This could easily break stuff, so it should only really be used
-  for testing purposes or if you really know what you are doing. """
-  @classmethod
-  def clear_objects(cls):
-    cls.grid_objects.clear()
-    cls.objects_by_index = {}
-    cls.current_index = 0
+    self._registry.remove(self)
+
+  """ Takes the object off the grid right away, but waits to actually delete it
+  until the next time process_deletions() is called on the registry. This way, a
+  whole batch of objects can be cleaned up at once at the end of an iteration.
+  """
+  def delete_later(self):
+    self.remove()
+    self._registry.delete_later(self)
+
+  """ Returns: The registry that this object belongs to. """
+  def get_registry(self):
+    return self._registry
 
   """ Does whatever changes that are required for this object from one iteration
   to the next. """
@@ -93,6 +66,17 @@ class GridObject(C_GridObject):
   def get_index(self):
     return self._object.get_index()
 
+  """ Sets the number of the registry group that this object is in, so that
+  C++ knows about it. (See Registry.add_to_group().)
+  group_id: The number of the group, or -1 if it isn't in one. """
+  def set_group(self, group_id):
+    self._object.set_group(group_id)
+
+  """ Returns: The number of the registry group that this object is in, or -1
+  if it isn't in one. """
+  def get_group(self):
+    return self._object.group()
+
   """ Sets the current position of this object.
   position: The object's position in the form (x, y). """
   def set_position(self, position):
@@ -107,6 +91,17 @@ class GridObject(C_GridObject):
   def get_position(self):
     return tuple(self._object.get_position())
 
+  """ Sets whether this object is immobile. Immobile objects keep their cell
+  from one iteration to the next without having to set their position again,
+  and anything that tries to move into that cell generates a conflict.
+  immobile: Whether the object should be immobile. """
+  def set_immobile(self, immobile):
+    self._object.set_immobile(immobile)
+
+  """ Returns: Whether this object is immobile. """
+  def is_immobile(self):
+    return self._object.immobile()
+
   """ Remove ourselves from the grid. It is okay to call this more than once.
   """
   def remove(self):
@@ -1,5 +1,9 @@
 import copy
 import logging
+import mmap
+import os
+import pickle
+import struct
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +24,25 @@ class LibraryError(Exception):
     return repr(self.__value)
 
 
+class BundleError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+# Identifies a file as a compiled species library.
+_BUNDLE_MAGIC = b"ECOLIB\0\0"
+# Gets bumped whenever the bundle format changes, so we don't try to read old
+# bundles.
+_BUNDLE_VERSION = 1
+# The header at the start of every bundle: the magic string, the version, and
+# the size of the index that comes right after it.
+_BUNDLE_HEADER = struct.Struct("<8sII")
+# What a compiled library is called inside a library directory.
+BUNDLE_NAME = "library.bundle"
+
+
 """ Merges two yaml data structures together, using the contents of defaults
 to fill in anything not specified in the other data structure.
 target: The main tree that we are adding defaults to.
@@ -128,48 +151,275 @@ def _expand_tree(flat_tree):
   return tree
 
 
+""" Turns a species name into the key that it is stored under in the library.
+name: The species' scientific name.
+Returns: The key for the species. """
+def _species_key(name):
+  return name.lower().replace(" ", "_")
+
+""" Reads a single yaml file.
+path: The file to read.
+Returns: The parsed yaml. """
+def _read_yaml(path):
+  yaml_file = open(path)
+  data = yaml.load(yaml_file, Loader=Loader)
+  yaml_file.close()
+  return data
+
+""" Makes sure that a species has everything it needs to be turned into an
+organism.
+name: The name of the species, for error messages.
+attributes: The attributes of the species, with the defaults merged in. """
+def _validate_species(name, attributes):
+  if type(attributes) is not dict:
+    logger.log_and_raise(LibraryError,
+        "Species '%s' is not a yaml mapping." % (name))
+  if "Scale" not in attributes:
+    logger.log_and_raise(LibraryError,
+        "Species '%s' does not specify a Scale." % (name))
+
+  taxonomy = attributes.get("Taxonomy")
+  if type(taxonomy) is not dict or "Genus" not in taxonomy or \
+      "Species" not in taxonomy:
+    logger.log_and_raise(LibraryError,
+        "Species '%s' needs a Taxonomy with a Genus and Species." % (name))
+
+""" Compiles a whole species library directory into a single bundle. All the
+defaults get merged in and every species gets checked at compile time, so
+loading a species from the bundle is just a matter of unpickling it.
+library_location: The library directory to compile.
+output: Where to write the bundle. By default, it goes in the library directory,
+which is where Library looks for it.
+Returns: The path to the bundle. """
+def compile_library(library_location, output=None):
+  if output is None:
+    output = os.path.join(library_location, BUNDLE_NAME)
+
+  defaults = _read_yaml(os.path.join(library_location, "defaults.yaml"))
+
+  # Pickle each species separately, so they can be loaded one at a time.
+  species = {}
+  for filename in sorted(os.listdir(library_location)):
+    key, extension = os.path.splitext(filename)
+    if extension != ".yaml" or key == "defaults":
+      continue
+
+    data = _read_yaml(os.path.join(library_location, filename))
+    merged = _merge_trees(data, defaults)
+    _validate_species(key, merged)
+    species[key] = pickle.dumps(merged, protocol=pickle.HIGHEST_PROTOCOL)
+
+  # Offsets in the index are from the end of the index, so that they don't
+  # depend on how big it is.
+  index = {}
+  offset = 0
+  for key, data in species.items():
+    index[key] = (offset, len(data))
+    offset += len(data)
+  index_data = pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)
+
+  # Write it somewhere else first, so nobody ever sees half a bundle.
+  temporary = output + ".tmp"
+  bundle_file = open(temporary, "wb")
+  bundle_file.write(_BUNDLE_HEADER.pack(_BUNDLE_MAGIC, _BUNDLE_VERSION,
+                                        len(index_data)))
+  bundle_file.write(index_data)
+  for data in species.values():
+    bundle_file.write(data)
+  bundle_file.close()
+  os.replace(temporary, output)
+  # Anyone who opens it from now on should get the new version.
+  _Bundle.close(output)
+
+  logger.info("Compiled %d species from '%s' into '%s'." % \
+              (len(species), library_location, output))
+  return output
+
+""" Checks whether a bundle is at least as new as all the files it was compiled
+from.
+bundle_path: The bundle to check.
+library_location: The library directory that it was compiled from.
+Returns: True if the bundle can be used, False if it needs to be compiled
+again. """
+def _bundle_is_current(bundle_path, library_location):
+  try:
+    compiled = os.path.getmtime(bundle_path)
+  except OSError:
+    return False
+
+  for entry in os.scandir(library_location):
+    if entry.name.endswith(".yaml") and entry.stat().st_mtime > compiled:
+      logger.warning("'%s' is older than '%s', not using it." % \
+                     (bundle_path, entry.path))
+      return False
+  return True
+
+
+""" A compiled species library. The file is memory-mapped, and species only get
+unpickled when someone asks for them, so opening one is cheap no matter how big
+it is. Because the mapping is read-only, processes that fork after a bundle is
+opened all share the same copy of it. """
+class _Bundle:
+  # Bundles that are already open, keyed by path.
+  _open_bundles = {}
+
+  """ Opens a bundle, or gets it if it is already open.
+  path: The bundle to open.
+  Returns: The bundle. """
+  @classmethod
+  def open(cls, path):
+    path = os.path.abspath(path)
+    if path not in cls._open_bundles:
+      cls._open_bundles[path] = cls(path)
+    return cls._open_bundles[path]
+
+  """ Forgets about an open bundle, so that the next time it is opened, it gets
+  read from the file again. Anything still using the old one can keep using it.
+  path: The bundle to close. """
+  @classmethod
+  def close(cls, path):
+    cls._open_bundles.pop(os.path.abspath(path), None)
+
+  """ path: The bundle file. """
+  def __init__(self, path):
+    self.__path = path
+
+    bundle_file = open(path, "rb")
+    try:
+      self.__data = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+      # The mapping stays valid after the file is closed.
+      bundle_file.close()
+
+    if len(self.__data) < _BUNDLE_HEADER.size:
+      logger.log_and_raise(BundleError, "'%s' is not a bundle." % (path))
+    magic, version, index_size = _BUNDLE_HEADER.unpack_from(self.__data)
+    if magic != _BUNDLE_MAGIC:
+      logger.log_and_raise(BundleError, "'%s' is not a bundle." % (path))
+    if version != _BUNDLE_VERSION:
+      logger.log_and_raise(BundleError,
+          "'%s' is version %d, but we need version %d. Compile it again." % \
+          (path, version, _BUNDLE_VERSION))
+
+    start = _BUNDLE_HEADER.size
+    self.__index = pickle.loads(self.__data[start:start + index_size])
+    # Where the species themselves start.
+    self.__data_start = start + index_size
+
+  """ Returns: The keys of all the species in the bundle. """
+  def get_species(self):
+    return list(self.__index.keys())
+
+  """ Loads a species from the bundle.
+  key: The species' key, as made by _species_key().
+  Returns: The attributes of the species. """
+  def load(self, key):
+    if key not in self.__index:
+      logger.log_and_raise(LibraryError,
+          "No species '%s' in '%s'." % (key, self.__path))
+
+    offset, length = self.__index[key]
+    offset += self.__data_start
+    return pickle.loads(self.__data[offset:offset + length])
+
+
 """ Class designed for importing and managing species from a species library.
 """
 class Library:
+  # Species attributes that we've already loaded, keyed by library and name.
+  _species_cache = {}
+
   """ library_location: Where the library from which we want to import species
-  is located. """
+  is located. This can either be a directory, or a bundle made by
+  compile_library(). If a directory has an up-to-date bundle in it, that gets
+  used instead of the yaml files. """
   def __init__(self, library_location):
     self.__library = library_location
+    # The bundle to load species from, if we have one. We don't look for it
+    # until we actually need a species.
+    self.__bundle = None
+
+  """ Returns: The bundle for this library, or None if we have to read the yaml
+  files. """
+  def __get_bundle(self):
+    if self.__bundle is None:
+      if os.path.isfile(self.__library):
+        self.__bundle = _Bundle.open(self.__library)
+      else:
+        bundle_path = os.path.join(self.__library, BUNDLE_NAME)
+        if _bundle_is_current(bundle_path, self.__library):
+          self.__bundle = _Bundle.open(bundle_path)
+        else:
+          # Don't bother checking again.
+          self.__bundle = False
+
+    return self.__bundle or None
+
+  """ Loads the attributes of a species from the library. These get cached, so
+  that loading lots of organisms of the same species doesn't mean parsing the
+  same files over and over again.
+  name: The species' scientific name.
+  Returns: The attributes of the species, with the defaults incorporated. """
+  def load_species(self, name):
+    name = _species_key(name)
+
+    key = (self.__library, name)
+    if key not in Library._species_cache:
+      bundle = self.__get_bundle()
+      if bundle:
+        # The defaults are already in there.
+        Library._species_cache[key] = bundle.load(name)
+      else:
+        data = _read_yaml("%s/%s.yaml" % (self.__library, name))
+
+        # Read defaults and use them to populate anything not specified.
+        defaults = _read_yaml("%s/defaults.yaml" % (self.__library))
+
+        # Incorporate the defaults into our original data.
+        Library._species_cache[key] = _merge_trees(data, defaults)
+
+    # Every organism gets its own copy, so nobody can change the cached version
+    # out from under everyone else.
+    return copy.deepcopy(Library._species_cache[key])
 
   """ Loads an organism from the library.
   name: The organism's scientific name.
   grid: The grid to place this organism on.
   position: Where on the grid to place this organism, in the form (x, y).
+  overrides: Optional attributes that take precedence over the ones in the
+  library.
   Returns: An organism object containing this organism. """
-  def load_organism(self, name, grid, position):
-    logger.debug("Loading '%s' from '%s'." % (name, self.__library))
-
-    name = name.lower()
-    # Add underscore
-    name = name.replace(" ", "_")
-
-    organism_file = open("%s/%s.yaml" % (self.__library, name))
-    data = yaml.load(organism_file, Loader=Loader)
-    organism_file.close()
-
-    # Read defaults and use them to populate anything not specified.
-    defaults_file = open("%s/defaults.yaml" % (self.__library))
-    defaults = yaml.load(defaults_file, Loader=Loader)
-    defaults_file.close()
-
-    # Incorporate the defaults into our original data.
-    merged = _merge_trees(data, defaults)
-
-    organism = Organism(grid, position)
-    organism.set_attributes(merged)
-
+  def load_organism(self, name, grid, position, overrides=None):
+    return self.load_organisms(name, grid, [position], overrides)[0]
+
+  """ Loads a batch of organisms of the same species from the library. They all
+  get created at once, which is a lot faster than loading them one at a time.
+  name: The species' scientific name.
+  grid: The grid to place the organisms on.
+  positions: Where on the grid to place each organism, in the form (x, y).
+  overrides: Optional attributes that take precedence over the ones in the
+  library.
+  Returns: A list of the new organisms. """
+  def load_organisms(self, name, grid, positions, overrides=None):
+    logger.debug("Loading %d of '%s' from '%s'." % (len(positions), name,
+                                                     self.__library))
+
+    merged = self.load_species(name)
+    if overrides:
+      merged = _merge_trees(copy.deepcopy(overrides), merged)
+
+    organisms = Organism.spawn(grid, positions, merged)
+    if not organisms:
+      return organisms
+
+    scale = organisms[0].Scale
     if grid.scale() < 0:
-      # This is the first organism we added.
-      logger.info("Setting grid scale to %f." % (organism.Scale))
-      grid.set_scale(organism.Scale)
-    elif organism.Scale != grid.scale():
+      # These are the first organisms we added.
+      logger.info("Setting grid scale to %f." % (scale))
+      grid.set_scale(scale)
+    elif scale != grid.scale():
       logger.log_and_raise(LibraryError,
           "Mismatch between object scale %f and grid scale %f." % \
-          (organism.Scale, grid.scale()))
+          (scale, grid.scale()))
 
-    return organism
+    return organisms
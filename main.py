@@ -6,7 +6,10 @@ Logger.set_path("simulation.log")
 
 import logging
 logger = logging.getLogger(__name__)
+import atexit
+import os
 import select
+import signal
 import sys
 
 import yaml
@@ -16,13 +19,14 @@ except ImportError:
   logger.warning("Falling back on Python yaml parser.")
   from yaml import Loader
 
-from library import Library
 from simulation import Simulation
 
 
 def main():
-  if len(sys.argv) != 2:
-    print("Usage: main.py conf_file")
+  if len(sys.argv) not in (2, 3):
+    print("Usage: main.py conf_file [control_socket]")
+    print("With a control socket, the simulation can be controlled with "
+          "control.py.")
     sys.exit()
 
   # Read configuration from file.
@@ -39,21 +43,52 @@ def main():
     logger.fatal("Invalid config, needs GridXSize and GridYSize")
   if "IterationTime" not in config:
     logger.fatal("Invalid config, needs IterationTime.")
+  # Lets us control the simulation while it runs, if we're doing that.
+  controller = None
+  if len(sys.argv) == 3:
+    # This pulls in asyncio, which is slow to import, so only do it when we
+    # actually need it.
+    from control import Controller
+    controller = Controller()
+
   simulation = Simulation(config["GridXSize"], config["GridYSize"],
-                          config["IterationTime"])
+                          config["IterationTime"], config.get("Statistics"),
+                          config.get("Environment"),
+                          config.get("AdaptiveTime"), control=controller,
+                          memory=config.get("Memory"),
+                          handlers=config.get("Handlers"))
 
   # Add them to the simulation.
   for organism in config["Organisms"]:
-    for i in range(0, organism["Quantity"]):
-      library = Library(organism["Library"])
-      simulation.add_organism(organism["Library"], organism["Name"])
+    simulation.add_organisms(organism["Library"], organism["Name"],
+                             organism["Quantity"], organism.get("Overrides"),
+                             organism.get("Placement"))
 
   # Start it running.
   logger.info("Delegating to simulation process.")
   simulation.start()
 
-  # Wait forever.
-  select.select([], [], [])
+  # The simulation process starts profiling when it gets SIGUSR1, but this is
+  # the one that people know the process ID of.
+  def forward_signal(signal_number, frame):
+    os.kill(simulation.simulation_process.pid, signal_number)
+  signal.signal(signal.SIGUSR1, forward_signal)
+
+  # When we go, take the simulation with us, and give it a chance to write out
+  # what it has recorded first.
+  def stop_simulation():
+    if simulation.simulation_process.is_alive():
+      simulation.simulation_process.terminate()
+      simulation.simulation_process.join()
+  atexit.register(stop_simulation)
+  signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit(0))
+
+  if controller:
+    # Take commands until we get killed.
+    controller.serve(sys.argv[2])
+  else:
+    # Wait forever.
+    select.select([], [], [])
 
   logger.critical("Exiting main.py.")
 
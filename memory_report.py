@@ -0,0 +1,191 @@
+""" Reports how much memory a simulation is using, and what it is using it for.
+Memory that C++ uses comes from the counters in MemoryStats, and memory that
+Python uses comes from tracemalloc, grouped by the module that allocated it.
+Tracing Python allocations slows everything down, so it only happens when a
+simulation is set up to report its memory. """
+
+import json
+import logging
+import os
+import tracemalloc
+
+from swig_modules.automata import MemoryStats
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryReportError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+# The C++ subsystems, and what MemoryStats calls them.
+NATIVE_SUBSYSTEMS = (("GridChunks", MemoryStats.kGridChunks),
+                     ("Organisms", MemoryStats.kOrganisms),
+                     ("MovementFactors", MemoryStats.kMovementFactors),
+                     ("Metabolisms", MemoryStats.kMetabolisms))
+
+# Which Python subsystem memory allocated by each of our modules goes to, keyed
+# by file name.
+_PYTHON_MODULES = {"grid.py": "Grid",
+                   "grid_object.py": "Organisms",
+                   "organism.py": "Organisms",
+                   "registry.py": "Organisms",
+                   "library.py": "Attributes",
+                   "update_handler.py": "Handlers",
+                   "statistics_collector.py": "Statistics",
+                   "visualization.py": "Visualization"}
+# The same thing for packages, keyed by the name of their directory. Attributes
+# mostly get allocated by YAML when species get loaded.
+_PYTHON_PACKAGES = {"yaml": "Attributes",
+                    "tkinter": "Visualization",
+                    "swig_modules": "Bindings"}
+
+
+""" Figures out which subsystem a Python file belongs to.
+filename: The path of the file.
+Returns: The name of the subsystem, or "Other" if we don't know. """
+def _get_python_subsystem(filename):
+  subsystem = _PYTHON_MODULES.get(os.path.basename(filename))
+  if subsystem:
+    return subsystem
+
+  for directory in os.path.dirname(filename).split(os.sep):
+    if directory in _PYTHON_PACKAGES:
+      return _PYTHON_PACKAGES[directory]
+  return "Other"
+
+""" Adds up the memory that Python has allocated since tracing started, by
+subsystem.
+Returns: A dictionary mapping each subsystem to a dictionary with the "Bytes"
+and "Count" of its allocations, or None if we aren't tracing. """
+def _get_python_usage():
+  if not tracemalloc.is_tracing():
+    return None
+
+  snapshot = tracemalloc.take_snapshot()
+  # Don't count what it took to take the snapshot.
+  snapshot = snapshot.filter_traces(
+      (tracemalloc.Filter(False, tracemalloc.__file__),))
+
+  usage = {}
+  for statistic in snapshot.statistics("filename"):
+    subsystem = _get_python_subsystem(statistic.traceback[0].filename)
+    totals = usage.setdefault(subsystem, {"Bytes": 0, "Count": 0})
+    totals["Bytes"] += statistic.size
+    totals["Count"] += statistic.count
+
+  return usage
+
+""" Takes a report of how much memory is being used right now. This works
+without tracing, but then it only has the C++ side. The C++ counters cover the
+whole process, so they include anything else running in it, like other runs of
+a sweep.
+population: How many objects are on the grid.
+canvas_items: How many items the visualization has on its canvas, if there is
+one. Tk's memory isn't visible to us, so this is the best we can do for it.
+Returns: The report, in a dictionary. """
+def take_report(population, canvas_items=None):
+  native = {name: {"Bytes": MemoryStats.GetBytes(subsystem),
+                   "Count": MemoryStats.GetCount(subsystem)} \
+            for name, subsystem in NATIVE_SUBSYSTEMS}
+  python = _get_python_usage()
+
+  report = {"Population": population, "Native": native, "Python": python}
+  total = sum([usage["Bytes"] for usage in native.values()])
+  if python is not None:
+    total += sum([usage["Bytes"] for usage in python.values()])
+  report["TotalBytes"] = total
+  if canvas_items is not None:
+    report["CanvasItems"] = canvas_items
+
+  if population:
+    report["BytesPerOrganism"] = total / population
+    # This is what keeps growing when predators and prey get crowded.
+    report["FactorsPerOrganism"] = \
+        native["MovementFactors"]["Count"] / population
+  return report
+
+
+""" Writes a memory report every so often while a simulation runs. Reports go
+in a file, one JSON object per line. Each one has how much memory every
+subsystem uses, and how much that comes to per organism, along with how much
+that changed since the last report, so that it is easy to see if anything is
+growing faster than the population. """
+class MemoryReporter:
+  """ Creates a reporter from a configuration.
+  config: The Memory section of the configuration.
+  Returns: The new reporter. """
+  @classmethod
+  def from_config(cls, config):
+    if "Output" not in config:
+      logger.log_and_raise(MemoryReportError,
+          "Invalid Memory config, needs 'Output'.")
+
+    return cls(config["Output"], interval=config.get("Interval", 100),
+               frames=config.get("Frames", 1))
+
+  """ path: The file to write the reports to.
+  interval: How many iterations to wait between reports.
+  frames: How many frames of the stack tracemalloc should keep for each
+  allocation. Allocations get grouped by the innermost one, so more than one
+  only helps when looking at the snapshots some other way. """
+  def __init__(self, path, interval=100, frames=1):
+    if interval < 1 or frames < 1:
+      logger.log_and_raise(MemoryReportError,
+          "Interval and frames must be positive.")
+
+    self.__path = path
+    self.__interval = interval
+    self.__frames = frames
+
+    # Whether we started tracemalloc, and so should stop it.
+    self.__started_tracing = False
+    # How many bytes per organism there were at the last report.
+    self.__last_bytes_per_organism = None
+
+  """ Starts tracing Python allocations, and clears out the output file. This
+  should happen before the simulation allocates anything, or it won't get
+  counted. """
+  def start(self):
+    if not tracemalloc.is_tracing():
+      tracemalloc.start(self.__frames)
+      self.__started_tracing = True
+
+    with open(self.__path, "w"):
+      pass
+    logger.info("Reporting memory usage to '%s'." % (self.__path))
+
+  """ iteration: The number of the iteration that just finished.
+  Returns: Whether we should report on this iteration. """
+  def is_due(self, iteration):
+    return iteration % self.__interval == 0
+
+  """ Takes a report, and writes it to the file.
+  iteration: The number of the iteration that just finished.
+  population: How many objects are on the grid.
+  canvas_items: How many items the visualization has on its canvas, if there is
+  one.
+  Returns: The report. """
+  def report(self, iteration, population, canvas_items=None):
+    report = take_report(population, canvas_items)
+    report["Iteration"] = iteration
+
+    bytes_per_organism = report.get("BytesPerOrganism")
+    if bytes_per_organism is not None and \
+       self.__last_bytes_per_organism is not None:
+      report["BytesPerOrganismChange"] = \
+          bytes_per_organism - self.__last_bytes_per_organism
+    self.__last_bytes_per_organism = bytes_per_organism
+
+    with open(self.__path, "a") as report_file:
+      report_file.write(json.dumps(report, sort_keys=True) + "\n")
+    return report
+
+  """ Stops tracing Python allocations, if we were the ones who started it. """
+  def close(self):
+    if self.__started_tracing:
+      tracemalloc.stop()
+      self.__started_tracing = False
@@ -6,6 +6,7 @@ class OrganismError(Exception):
 
 
 import logging
+import random
 
 from swig_modules.automata import Organism as C_Organism
 from update_handler import UpdateHandler
@@ -43,11 +44,11 @@ class AttributeHelper:
 
 """ The Python representation of an organism. """
 class Organism(grid_object.GridObject, AttributeHelper):
-  """ index: The index into the grid_objects array of the simulation this
-  organism is part of.
-  grid: The grid that this organism is part of.
-  position: The position of the object on the grid, in the form (x, y). """
-  def __init__(self, grid, position):
+  """ grid: The grid that this organism is part of.
+  position: The position of the object on the grid, in the form (x, y).
+  c_organism: An existing C++ organism that is already on the grid, for
+  instance one made by spawn(). If this is given, position is ignored. """
+  def __init__(self, grid, position, c_organism=None):
     # Data read from a configuration file that describes this organism.
     self._attributes = {}
 
@@ -55,20 +56,143 @@ class Organism(grid_object.GridObject, AttributeHelper):
     self.__handlers = []
     self.__grid = grid
 
+    # The organism that ate this one, if any.
+    self.__predator = None
+
+    # Organisms that were given movement factors referencing this one by
+    # add_factor_from_organism(). Factors between predators and prey get
+    # cleaned up through their species instead, so they aren't in here.
+    self.__referenced_by = set()
+    # Organisms that this one was given movement factors referencing by
+    # add_factor_from_organism().
+    self.__references = set()
+
     # Metabolism handler for this organism. A handler will initialize it,
     # because it is unique depending on the organism.
-    self.metabolism = None
+    self.__metabolism = None
 
     # Underlying C++ organism. This object is shared with the Python GridObject
     # superclass, which makes sense seeing that the C++ version of Organism
     # inherits from GridObject.
-    self._object = C_Organism(self.__grid,
-                              grid_object.GridObject.current_index)
-    if not self._object.Initialize(position[0], position[1]):
-      logger.log_and_raise(OrganismError, "Failed to initialize organism.")
+    if c_organism is not None:
+      self._object = c_organism
+    else:
+      self._object = C_Organism(self.__grid, 0)
+      if not self._object.Initialize(position[0], position[1]):
+        logger.log_and_raise(OrganismError, "Failed to initialize organism.")
+
+    # Add the organism to the grid's registry, which also sets our index.
+    self._registry = self.__grid.registry
+    self._registry.add(self)
+
+  """ Creates a whole batch of organisms of the same species at once. The C++
+  organisms and their movement factors are created in bulk, and the handlers
+  set up all of the organisms together, so the species' attributes only get
+  read once. Every organism still gets its Python wrapper right away, because
+  the registry and the handlers work with the wrappers from the first
+  iteration on.
+  grid: The grid that the organisms are part of.
+  positions: The positions of the organisms, in the form (x, y).
+  attributes: The attributes of the species. All the organisms share them.
+  Returns: A list of the new organisms. """
+  @classmethod
+  def spawn(cls, grid, positions, attributes):
+    xs = [position[0] for position in positions]
+    ys = [position[1] for position in positions]
+    c_organisms = C_Organism.Spawn(grid, xs, ys)
+    if len(c_organisms) != len(positions):
+      logger.log_and_raise(OrganismError, "Failed to initialize organisms.")
+
+    organisms = [cls(grid, None, c_organism) for c_organism in c_organisms]
+    if not organisms:
+      return organisms
+
+    logger.debug("Setting attributes of %d organisms to %s." % \
+        (len(organisms), str(attributes)))
+    for organism in organisms:
+      organism._attributes = attributes
+    UpdateHandler.set_handlers_static_filtering_batch(organisms)
+
+    cls.__add_factors(organisms)
+    return organisms
+
+  """ Creates the offspring for a set of reproduction requests. Offspring go in
+  random vacant cells around their parents, and they get the same attributes as
+  them. Offspring whose parents have the same attributes are all spawned
+  together. If a parent has a metabolism, it pays for each of its offspring with
+  the energy that they start out with.
+  requests: The requests, in the form (parent, count, levels). See reproduce().
+  Returns: A list of the new organisms. """
+  @classmethod
+  def spawn_offspring(cls, requests):
+    # Cells we've already picked for someone, so no two offspring end up in the
+    # same one.
+    taken = set()
+    # The offspring to spawn, grouped by their parents' attributes. Each batch
+    # holds the attributes, the positions of the offspring, and each parent with
+    # the number of offspring it gets.
+    batches = {}
+    for parent, count, levels in requests:
+      if not parent.is_alive():
+        # It died after asking.
+        continue
 
-    # Add the organism to the list of grid objects.
-    grid_object.GridObject._add_object(self)
+      vacant = parent.__grid.get_vacant_locations(parent.get_position(), levels)
+      vacant = [position for position in vacant if position not in taken]
+      if len(vacant) > count:
+        vacant = random.sample(vacant, count)
+      if not vacant:
+        logger.debug("No room for offspring of organism %d." % \
+                     (parent.get_index()))
+        continue
+      taken.update(vacant)
+
+      attributes = parent.get_all_attributes()
+      batch = batches.setdefault(id(attributes), (parent, attributes, [], []))
+      batch[2].extend(vacant)
+      batch[3].append((parent, len(vacant)))
+
+    born = []
+    for first, attributes, positions, parents in batches.values():
+      offspring = cls.spawn(first.__grid, positions, attributes)
+
+      start = 0
+      for parent, count in parents:
+        metabolism = getattr(parent, "metabolism", None)
+        if metabolism:
+          for child in offspring[start:start + count]:
+            metabolism.UseEnergy(child.metabolism.energy())
+        start += count
+
+      born.extend(offspring)
+
+    return born
+
+  """ Asks for offspring to be created around this organism. They don't
+  actually get created until process_births() is called on the registry, so
+  this is safe to call in the middle of an iteration.
+  count: The most offspring to create. There might be fewer if there isn't
+  enough room.
+  levels: How far away from us offspring can go, in cells. """
+  def reproduce(self, count, levels=1):
+    logger.debug("Organism %d wants %d offspring." % (self.get_index(), count))
+    self._registry.birth_later(self, count, levels)
+
+  """ The organism's metabolism simulator, or None if it doesn't have one. The
+  C++ organism gets told about it too, so that its state can be read in bulk.
+  (See Grid.get_object_columns().) """
+  @property
+  def metabolism(self):
+    return self.__metabolism
+
+  @metabolism.setter
+  def metabolism(self, metabolism):
+    self.__metabolism = metabolism
+    self._object.set_metabolism(metabolism)
+
+  """ Returns: The grid that the organism is on. """
+  def get_grid(self):
+    return self.__grid
 
   """ Updates the status of this organism. Should be run every iteration.
   iteration_time: Simulation time since the last iteration.
@@ -100,28 +224,174 @@ class Organism(grid_object.GridObject, AttributeHelper):
     # Figure out which handlers apply to us.
     UpdateHandler.set_handlers_static_filtering(self)
 
-    # As soon as an organism comes online, we need to create movement factors
-    # representing it and add them for every organism that will be affected by
-    # this one. It doesn't matter if we add movement factors to plants, because
-    # their positions never get updated anyway.
-    for organism in self.grid_objects:
-      if isinstance(organism, Organism):
-        if (hasattr(self, "Prey") and organism.scientific_name() in self.Prey):
-          # Add a movement factor that causes them to flee us.
-          organism.add_factor_from_organism(self, True)
-          # Add a movement factor that causes us to be attracted to them.
-          self.add_factor_from_organism(organism, False)
-        elif (hasattr(organism, "Prey") and \
-              self.scientific_name() in organism.Prey):
-          # Add a movement factor that causes them to be attracted to us.
-          organism.add_factor_from_organism(self, False)
-          # Add a movement factor that causes us to flee them.
-          self.add_factor_from_organism(organism, True)
+    Organism.__add_factors([self])
+
+  """ Creates movement factors between a batch of new organisms and everything
+  that will be affected by them, and the other way around. It doesn't matter if
+  we add movement factors to plants, because their positions never get updated
+  anyway.
+  organisms: The new organisms. They must all be of the same species. """
+  @classmethod
+  def __add_factors(cls, organisms):
+    first = organisms[0]
+    try:
+      species = first.scientific_name()
+    except AttributeError:
+      # It has no species, so it can't be predator or prey.
+      return
+
+    # Organisms are grouped by species, so we only have to look at the species
+    # that are related to this one.
+    registry = first.get_registry()
+    for organism in organisms:
+      registry.add_to_group(organism, species)
+
+    # Organisms that move using fields don't need any factors of their own.
+    uses_field = first.uses_field()
+    for organism in organisms:
+      organism._object.set_field_movement(uses_field)
+
+    grid = first.get_grid()
+    new = [organism._object for organism in organisms]
+    for group, other, prey in cls.__get_related_species(first):
+      others = [organism._object for organism in registry.get_group(group)]
+      if prey:
+        # Make them flee us.
+        cls.__add_influence(grid, other, group, others, species, new, False)
+        # Make us attracted to them.
+        cls.__add_influence(grid, first, species, new, group, others, True)
+      else:
+        # Make them attracted to us.
+        cls.__add_influence(grid, other, group, others, species, new, True)
+        # Make us flee them.
+        cls.__add_influence(grid, first, species, new, group, others, False)
+
+  """ Makes one species react to another. Species that move using fields get a
+  source added to the field for their species, and everything else gets a
+  movement factor for every organism of the other species.
+  grid: The grid that the organisms are on.
+  target: An organism of the species that is reacting.
+  target_group: The name of the species that is reacting.
+  targets: The C++ organisms of that species that need factors.
+  source_group: The name of the species that is being reacted to.
+  sources: The C++ organisms of that species to make factors for.
+  prey: True if the sources are prey of the targets, False if they are
+  predators. """
+  @staticmethod
+  def __add_influence(grid, target, target_group, targets, source_group,
+                      sources, prey):
+    animal = target.Metabolism.Animal
+    if prey:
+      strength = animal.PreyFactorStrength
+      visibility = animal.PreyFactorVisibility
+    else:
+      strength = animal.PredatorFactorStrength
+      visibility = animal.PredatorFactorVisibility
+
+    if not target.uses_field():
+      C_Organism.AddFactorsBetween(targets, sources, strength, visibility)
+      return
+
+    # The field is shared by the whole species, so it has to take their vision
+    # into account up front.
+    vision = getattr(target, "Vision", -1)
+    if vision > 0 and (visibility <= 0 or vision < visibility):
+      visibility = vision
+    if visibility <= 0:
+      # Every source would cover the whole grid, which is what the field is
+      # supposed to avoid.
+      logger.log_and_raise(OrganismError,
+          "'%s' moves using a field, so it needs a positive Vision or factor"
+          " visibility." % (target_group))
+
+    registry = grid.registry
+    grid.SetFieldSource(registry.get_group_id(target_group),
+                        registry.get_group_id(source_group), strength,
+                        visibility)
+
+  """ Finds the species on the grid that are predators or prey of an organism.
+  organism: The organism to find related species for.
+  Returns: A list of tuples containing the name of each related species, an
+  organism of that species, and whether that species is our prey. """
+  @staticmethod
+  def __get_related_species(organism):
+    species = organism.scientific_name()
+    our_prey = getattr(organism, "Prey", [])
+
+    related = []
+    registry = organism.get_registry()
+    for group in registry.get_groups():
+      other = registry.get_group(group)[0]
+      if not isinstance(other, Organism):
+        continue
+
+      if group in our_prey:
+        related.append((group, other, True))
+      elif species in getattr(other, "Prey", []):
+        related.append((group, other, False))
+
+    return related
+
+  """ Returns: Whether the organism moves using the potential field for its
+  species, instead of its own movement factors. This is a lot faster when there
+  are many predators or prey around, because the field only gets calculated
+  once per iteration for the whole species. """
+  def uses_field(self):
+    try:
+      mode = self.Metabolism.Animal.MovementMode
+    except AttributeError:
+      return False
+
+    if mode not in ("Factors", "Field"):
+      logger.log_and_raise(OrganismError,
+          "Invalid movement mode: '%s'" % (mode))
+    return mode == "Field"
 
   """ Returns whether or not the organism is alive. """
   def is_alive(self):
     return self._object.IsAlive()
 
+  """ Finds the organisms around this one, as of the last grid update. This is
+  meant for handlers, and answers get shared between them. (See Perception.)
+  species: Only find organisms of this species, or None to find everything.
+  radius: How far away to look, in cells. By default, it's as far as the
+  organism can see.
+  Returns: The handles of what it found, closest first. """
+  def find_neighbors(self, species=None, radius=None):
+    return self.__grid.perception.find_neighbors(
+        self.get_position(), self.__get_radius(radius), species)
+
+  """ Counts the other organisms of the same species around this one.
+  radius: How far away to look. See find_neighbors().
+  Returns: How many there are. """
+  def count_conspecifics(self, radius=None):
+    return self.__grid.perception.count_neighbors(
+        self.get_position(), self.__get_radius(radius),
+        self.scientific_name())
+
+  """ Finds the closest organism that this one eats.
+  radius: How far away to look. See find_neighbors().
+  Returns: The handle of the prey, or None if there isn't any. """
+  def find_nearest_prey(self, radius=None):
+    prey = getattr(self, "Prey", [])
+    if not prey:
+      return None
+    return self.__grid.perception.find_nearest(
+        self.get_position(), self.__get_radius(radius), list(prey))
+
+  """ Figures out how far to look for the perception queries.
+  radius: The radius that was asked for, or None to use our vision.
+  Returns: The radius to use. """
+  def __get_radius(self, radius):
+    if radius is None:
+      radius = self.get_vision()
+    if radius <= 0:
+      # Organisms that can see everything would have to look at the whole grid.
+      logger.log_and_raise(OrganismError,
+          "Organism %d has unlimited vision, so it needs a radius." % \
+          (self.get_index()))
+    return radius
+
   """ Adds a handler as one that will handle this organism when it is updated.
   handler: handler to add. """
   def add_handler(self, handler):
@@ -141,9 +411,14 @@ class Organism(grid_object.GridObject, AttributeHelper):
     conflicted = self._object.GetConflict()
     logger.debug("Got conflicted object with index %d." % \
                  (conflicted.get_index()))
+    if conflicted.get_index() < 0:
+      # It isn't registered here, like the copies of organisms in neighboring
+      # subdomains. (See domain.py.) All we can do is move somewhere else.
+      self.__default_conflict_handler()
+      return
 
     # Associate this object with a Python grid object.
-    conflicted = grid_object.GridObject.get_by_index(conflicted.get_index())
+    conflicted = self._registry.get(conflicted.get_index())
     if conflicted == self:
       logger.log_and_raise(ValueError, "Got conflict with myself?!")
 
@@ -187,7 +462,7 @@ class Organism(grid_object.GridObject, AttributeHelper):
                    (conflicted.get_index(), self.get_index()))
       conflicted.metabolism.Consume(self.metabolism)
       # Now we're dead.
-      self.die()
+      self.die(conflicted)
       return True
     elif conflicted.scientific_name() in our_prey:
       # We are going to eat them.
@@ -195,7 +470,7 @@ class Organism(grid_object.GridObject, AttributeHelper):
                   (self.get_index(), conflicted.get_index()))
       self.metabolism.Consume(conflicted.metabolism)
       # Now they're dead.
-      conflicted.die()
+      conflicted.die(self)
       return True
 
     return False
@@ -208,22 +483,74 @@ class Organism(grid_object.GridObject, AttributeHelper):
   def scientific_name(self):
     return "%s %s" % (self.Taxonomy.Genus, self.Taxonomy.Species)
 
-  """ Causes the organism to die. """
-  def die(self):
+  """ Causes the organism to die. It gets taken off the grid immediately, but
+  the rest of the cleanup waits until process_deletions() is called on the
+  registry. It is okay to call this more than once.
+  predator: The organism that ate this one, if any. """
+  def die(self, predator=None):
+    if not self.is_alive():
+      # We're already dead.
+      return
+
     logger.info("Organism %d is dying." % (self.get_index()))
     self._object.Die()
+    self.__predator = predator
+
+    self.delete_later()
+
+  """ Gets everything about the organism that changes as it runs, besides its
+  position and attributes, so that it can be recreated somewhere else.
+  Returns: A dictionary that set_state() can take. """
+  def get_state(self):
+    state = {}
+    if self.metabolism:
+      state["Mass"] = self.metabolism.mass()
+      state["Energy"] = self.metabolism.energy()
+    if hasattr(self, "reproduction_wait"):
+      state["ReproductionWait"] = self.reproduction_wait
+    return state
+
+  """ Restores the state of the organism. Handlers have already set it up by
+  the time its attributes are set, so this has to happen afterwards.
+  state: The state, as returned by get_state(). """
+  def set_state(self, state):
+    if self.metabolism and "Mass" in state:
+      self.metabolism.SetState(state["Mass"], state["Energy"])
+    if "ReproductionWait" in state:
+      self.reproduction_wait = state["ReproductionWait"]
+
+  """ Returns: The organism that ate this one, or None if it wasn't eaten. """
+  def get_predator(self):
+    return self.__predator
+
+  """ Deletes the organism, and removes any lingering references to it hanging
+  around in the C++ code. """
+  def delete(self):
+    super().delete()
+
+    for organism in self.__referenced_by:
+      organism.cleanup_organism(self)
+      organism.__references.discard(self)
+    for organism in self.__references:
+      organism.__referenced_by.discard(self)
+    self.__referenced_by.clear()
+    self.__references.clear()
 
-    # Delete ourselves from the grid_objects array and from the grid.
-    self.delete()
+    try:
+      related = Organism.__get_related_species(self)
+    except AttributeError:
+      # It has no species, so nothing can reference it.
+      return
 
-    # Remove any lingering references to ourselves hanging around in the C++
-    # code.
-    for organism in grid_object.GridObject.grid_objects:
-      if not isinstance(organism, Organism):
-        continue
-      organism.cleanup_organism(self)
+    # Anything that references us is a predator or prey.
+    for group, other, prey in related:
+      holders = [organism._object for organism in \
+                 self._registry.get_group(group)]
+      C_Organism.CleanupOrganismFrom(holders, self._object)
 
-  """ Adds a movement factor from a specific organism.
+  """ Adds a movement factor from a specific organism. Factors between
+  organisms are normally created automatically when their attributes are set.
+  Either way, they get cleaned up when that organism is deleted.
   organism: The organism to use for the factor.
   prey: True if we are the prey of that organism. Otherwise, we are the
   predator. """
@@ -242,6 +569,9 @@ class Organism(grid_object.GridObject, AttributeHelper):
     # Actually add the factor.
     self._object.AddFactorFromOrganism(organism._object, strength,
                                          visibility)
+    # Keep track of it so we know what to clean up when that organism dies.
+    self.__references.add(organism)
+    organism.__referenced_by.add(self)
 
   """ Removes all references to another organism from this organism.
   organism: The organism to remove references to. """
@@ -0,0 +1,240 @@
+import logging
+import math
+import random
+
+logger = logging.getLogger(__name__)
+
+
+class PlacementError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Reads a map of values from a file. Each line is a row of the map, with the
+values separated by commas or whitespace. Blank lines and lines starting with #
+are skipped.
+path: The file to read from.
+Returns: A list of rows of values. """
+def read_map(path):
+  map_file = open(path)
+  rows = []
+  for line in map_file:
+    line = line.replace(",", " ").strip()
+    if line and not line.startswith("#"):
+      rows.append([float(value) for value in line.split()])
+  map_file.close()
+
+  return rows
+
+
+""" A map of how densely organisms should be placed in different parts of the
+grid. The weights don't have to be the same size as the grid, they get
+stretched to cover all of it, so a coarse map works fine for a big grid. """
+class DensityMap:
+  """ Loads a density map from a file. (See read_map() for the format.)
+  path: The file to load from.
+  Returns: The loaded map. """
+  @classmethod
+  def load(cls, path):
+    return cls(read_map(path))
+
+  """ weights: A list of rows of weights. The first row is at y = 0, and the
+  first item in each row is at x = 0. Weights are relative to each other, and
+  a weight of zero means nothing gets placed there. """
+  def __init__(self, weights):
+    if not weights or not all(weights):
+      logger.log_and_raise(PlacementError, "Density map cannot be empty.")
+    if any(len(row) != len(weights[0]) for row in weights):
+      logger.log_and_raise(PlacementError,
+          "All the rows in a density map must be the same length.")
+    if any(weight < 0 for row in weights for weight in row):
+      logger.log_and_raise(PlacementError,
+          "Density map weights cannot be negative.")
+
+    self.__weights = weights
+    self.__max_weight = max(max(row) for row in weights)
+    if self.__max_weight <= 0:
+      logger.log_and_raise(PlacementError,
+          "Density map must have at least one positive weight.")
+
+  """ Gets the probability that an organism should be placed in a cell, relative
+  to the most dense part of the map.
+  x, y: The position of the cell.
+  x_size, y_size: The size of the grid.
+  Returns: A probability between 0 and 1. """
+  def get_probability(self, x, y, x_size, y_size):
+    row = self.__weights[y * len(self.__weights) // y_size]
+    return row[x * len(row) // x_size] / self.__max_weight
+
+
+""" Picks random, unique cells on the grid to place organisms in. It works like
+a partial Fisher-Yates shuffle over the linear indices of all the cells: free
+cells are kept at the front of a virtual array, and taking one swaps it to the
+back. Only the swaps get stored, so it takes memory proportional to the number
+of cells we've taken, not to the size of the grid. """
+class Placer:
+  # How many times in a row we can fail to find a place for an organism before
+  # we give up.
+  _MAX_ATTEMPTS = 10000
+  # How many times we try to find a free cell near a cluster before we give up
+  # and place an organism anywhere.
+  _MAX_CLUSTER_ATTEMPTS = 100
+
+  """ x_size: The horizontal size of the grid.
+  y_size: The vertical size of the grid.
+  generator: The random number generator to use. """
+  def __init__(self, x_size, y_size, generator=random):
+    self.__x_size = x_size
+    self.__y_size = y_size
+    self.__random = generator
+
+    # How many cells are still free. They are the ones in the first part of
+    # the virtual array.
+    self.__free = x_size * y_size
+    # The cell at every position in the virtual array that's been swapped.
+    # Positions that aren't in here hold the cell with the same index.
+    self.__cells = {}
+    # The inverse of __cells.
+    self.__positions = {}
+
+  """ Returns: How many cells are still free. """
+  def get_free_cells(self):
+    return self.__free
+
+  """ Checks whether a cell is still free.
+  position: The cell, in the form (x, y).
+  Returns: True if nothing has been placed there yet. """
+  def is_free(self, position):
+    x, y = position
+    if x < 0 or y < 0 or x >= self.__x_size or y >= self.__y_size:
+      return False
+
+    cell = y * self.__x_size + x
+    return self.__positions.get(cell, cell) < self.__free
+
+  """ Marks a cell as taken. It must be free.
+  position: The cell, in the form (x, y). """
+  def take(self, position):
+    cell = position[1] * self.__x_size + position[0]
+    index = self.__positions.get(cell, cell)
+
+    # Swap it with the last free cell.
+    last = self.__free - 1
+    last_cell = self.__cells.get(last, last)
+    self.__cells[index] = last_cell
+    self.__positions[last_cell] = index
+    self.__cells[last] = cell
+    self.__positions[cell] = last
+
+    self.__free -= 1
+
+  """ Picks a random cell out of the free ones, without taking it.
+  Returns: The cell, in the form (x, y). """
+  def sample(self):
+    if not self.__free:
+      logger.log_and_raise(PlacementError,
+          "Cannot place object, no space on grid.")
+
+    index = self.__random.randrange(self.__free)
+    cell = self.__cells.get(index, index)
+    return (cell % self.__x_size, cell // self.__x_size)
+
+  """ Places organisms according to a placement configuration.
+  count: How many organisms to place.
+  config: The Placement section for a species. If it is None, organisms are
+  placed uniformly.
+  Returns: A list of positions, in the form (x, y). """
+  def place(self, count, config=None):
+    if not config:
+      return self.place_uniform(count)
+
+    placement_type = config.get("Type", "Uniform")
+    if placement_type == "Uniform":
+      return self.place_uniform(count)
+    elif placement_type == "Density":
+      if "Map" not in config:
+        logger.log_and_raise(PlacementError,
+            "Density placement needs a 'Map'.")
+      density = config["Map"]
+      if type(density) is str:
+        density = DensityMap.load(density)
+      else:
+        density = DensityMap(density)
+      return self.place_density(count, density)
+    elif placement_type == "Clustered":
+      return self.place_clustered(count, config.get("Clusters", 1),
+                                  config.get("Spread", 1.0))
+
+    logger.log_and_raise(PlacementError,
+        "Unknown placement type '%s'." % (placement_type))
+
+  """ Places organisms uniformly across the grid.
+  count: How many organisms to place.
+  Returns: A list of positions, in the form (x, y). """
+  def place_uniform(self, count):
+    positions = []
+    for i in range(0, count):
+      position = self.sample()
+      self.take(position)
+      positions.append(position)
+
+    return positions
+
+  """ Places organisms according to a density map. It samples free cells
+  uniformly, and then rejects them based on the density there.
+  count: How many organisms to place.
+  density: The DensityMap to use.
+  Returns: A list of positions, in the form (x, y). """
+  def place_density(self, count, density):
+    positions = []
+    while len(positions) < count:
+      for i in range(0, self._MAX_ATTEMPTS):
+        position = self.sample()
+        probability = density.get_probability(position[0], position[1],
+                                              self.__x_size, self.__y_size)
+        if self.__random.random() < probability:
+          break
+      else:
+        logger.log_and_raise(PlacementError,
+            "Could not find space for an organism in the density map.")
+
+      self.take(position)
+      positions.append(position)
+
+    return positions
+
+  """ Places organisms in clusters. The centers of the clusters are picked
+  uniformly, and then organisms are scattered around them with a normal
+  distribution.
+  count: How many organisms to place.
+  clusters: How many clusters to make.
+  spread: The standard deviation of the distance of an organism from the center
+  of its cluster, in cells.
+  Returns: A list of positions, in the form (x, y). """
+  def place_clustered(self, count, clusters, spread):
+    if clusters < 1 or spread < 0:
+      logger.log_and_raise(PlacementError,
+          "Need at least one cluster and a non-negative spread.")
+
+    centers = [self.sample() for i in range(0, clusters)]
+
+    positions = []
+    while len(positions) < count:
+      for i in range(0, self._MAX_CLUSTER_ATTEMPTS):
+        center_x, center_y = self.__random.choice(centers)
+        position = \
+            (int(math.floor(self.__random.gauss(center_x + 0.5, spread))),
+             int(math.floor(self.__random.gauss(center_y + 0.5, spread))))
+        if self.is_free(position):
+          break
+      else:
+        # The clusters are full, so just put it anywhere.
+        logger.warning("Clusters are full, placing organism uniformly.")
+        position = self.sample()
+
+      self.take(position)
+      positions.append(position)
+
+    return positions
@@ -0,0 +1,215 @@
+""" Profiles a running simulation for a little while, without having to restart
+it. It periodically samples the Python stack, and records the C++ code that has
+timers in it, and it writes both of them to a file in Chrome's trace format.
+That can be opened in chrome://tracing, Perfetto, or speedscope. """
+
+import array
+import json
+import logging
+import os
+import signal
+import time
+
+from swig_modules.automata import Trace
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Samples the Python stack of the process that it runs in, on a timer. The
+samples are taken by a signal handler, so nothing is running when we aren't
+profiling, and this only works in the main thread. Signal handlers can interrupt
+anything, including code that holds a lock, so ours only take samples and set
+flags. Everything else happens in poll(), which has to be called regularly. """
+class SamplingProfiler:
+  # The signal that we sample on. This timer counts wall time, so we can see
+  # where we are waiting as well as where we are busy.
+  _TIMER = signal.ITIMER_REAL
+  _SIGNAL = signal.SIGALRM
+
+  """ interval: How often to sample, in seconds.
+  max_events: The most C++ events to record. """
+  def __init__(self, interval=0.001, max_events=1000000):
+    self.__interval = interval
+    self.__max_events = max_events
+
+    # Each sample, in the form (time, stack), where the stack is a tuple of code
+    # objects, starting at the outermost one.
+    self.__samples = []
+    # When the current profile should end, on the trace clock.
+    self.__end_time = None
+    # Where to write the current profile.
+    self.__path = None
+    # The signal handler that was there before we started.
+    self.__old_handler = None
+
+    # Set once we have all the samples that we need, so that poll() stops the
+    # profile and writes it out.
+    self.__finished = False
+    # A profile that a signal asked for, in the form (duration, path), so that
+    # poll() can start it.
+    self.__requested = None
+
+  """ Returns: Whether we are profiling right now. """
+  def is_running(self):
+    return self.__end_time is not None
+
+  """ Starts profiling. It stops sampling by itself after a while, and then the
+  next poll() writes out the results.
+  duration: How long to profile for, in seconds.
+  path: Where to write the results. """
+  def start(self, duration, path):
+    if self.is_running():
+      logger.log_and_raise(ProfilerError, "Already profiling.")
+
+    logger.info("Profiling for %f seconds, writing to '%s'." % (duration, path))
+    self.__samples = []
+    self.__path = path
+    self.__end_time = Trace.Now() + duration * 1000000
+
+    self.__finished = False
+    Trace.Start(self.__max_events)
+    self.__old_handler = signal.signal(self._SIGNAL, self.__sample)
+    signal.setitimer(self._TIMER, self.__interval, self.__interval)
+
+  """ Stops profiling right away, and writes out what we have so far. """
+  def stop(self):
+    if not self.is_running():
+      return
+
+    signal.setitimer(self._TIMER, 0)
+    signal.signal(self._SIGNAL, self.__old_handler)
+    Trace.Stop()
+    self.__end_time = None
+    self.__finished = False
+
+    write_trace(self.__path, self.__samples, get_native_events())
+    logger.info("Wrote profile with %d samples to '%s'." % \
+                (len(self.__samples), self.__path))
+    self.__samples = []
+
+  """ Does whatever the signal handlers left for us: starting a profile that
+  someone asked for, and writing out one that is done. This should be called
+  regularly from the main loop. """
+  def poll(self):
+    if self.__finished:
+      self.stop()
+
+    if self.__requested:
+      duration, path = self.__requested
+      self.__requested = None
+      if self.is_running():
+        logger.warning("Ignoring signal, already profiling.")
+      else:
+        self.start(duration, path)
+
+  """ Records the stack of whatever got interrupted.
+  signal_number: The signal that we got.
+  frame: The frame that was running. """
+  def __sample(self, signal_number, frame):
+    now = Trace.Now()
+
+    stack = []
+    while frame is not None:
+      stack.append(frame.f_code)
+      frame = frame.f_back
+    stack.reverse()
+    self.__samples.append((now, tuple(stack)))
+
+    if now >= self.__end_time and not self.__finished:
+      # We have everything that we need. Writing it out takes a while, so
+      # leave that for poll().
+      signal.setitimer(self._TIMER, 0)
+      self.__finished = True
+
+  """ Makes it so that a signal starts profiling, on the next poll(). The
+  results go in the current directory, with the process ID and time in the
+  name.
+  signal_number: The signal to use.
+  duration: How long to profile for each time, in seconds. """
+  def install(self, signal_number=signal.SIGUSR1, duration=10):
+    def request_profile(signal_number, frame):
+      path = "profile-%d-%d.json" % (os.getpid(), time.time())
+      self.__requested = (duration, path)
+
+    signal.signal(signal_number, request_profile)
+
+
+""" Gets everything that the C++ timers recorded during the last trace.
+Returns: A list of the events, in the form (name, start, duration), with times
+in microseconds. """
+def get_native_events():
+  count = Trace.GetEventCount()
+  if Trace.GetDroppedCount():
+    logger.warning("Dropped %d C++ events, the buffer was full." % \
+                   (Trace.GetDroppedCount()))
+
+  values = array.array("d", bytes(count * 2 * 8))
+  if not Trace.GetEvents(values):
+    logger.log_and_raise(ProfilerError, "Failed to get C++ events.")
+
+  return [(Trace.GetEventName(i), values[i * 2], values[i * 2 + 1]) \
+          for i in range(0, count)]
+
+""" Turns a series of stack samples into spans. A function is assumed to have
+been running from the first sample it was on the stack in, until the first one
+that it wasn't, so consecutive calls of the same function run together.
+samples: The samples, in the form (time, stack).
+Returns: A list of the spans, in the form (code, start, end). """
+def _samples_to_spans(samples):
+  spans = []
+  # The frames that are still running, with when each one started.
+  open_frames = []
+  for now, stack in samples:
+    # Find out how much of the stack is the same as last time.
+    common = 0
+    while common < min(len(open_frames), len(stack)) and \
+          open_frames[common][0] is stack[common]:
+      common += 1
+
+    # Everything past that has returned.
+    while len(open_frames) > common:
+      code, start = open_frames.pop()
+      spans.append((code, start, now))
+    for code in stack[common:]:
+      open_frames.append((code, now))
+
+  if samples:
+    end = samples[-1][0]
+    for code, start in open_frames:
+      spans.append((code, start, end))
+
+  return spans
+
+""" Writes a profile in Chrome's trace format. Python and C++ each get their
+own track, since the samples can't tell exactly where Python calls into C++.
+path: Where to write it.
+samples: The Python stack samples, in the form (time, stack).
+native_events: The C++ events, in the form (name, start, duration). """
+def write_trace(path, samples, native_events):
+  pid = os.getpid()
+  events = [{"ph": "M", "name": "thread_name", "pid": pid, "tid": 1,
+             "args": {"name": "Python"}},
+            {"ph": "M", "name": "thread_name", "pid": pid, "tid": 2,
+             "args": {"name": "C++"}}]
+
+  for code, start, end in _samples_to_spans(samples):
+    if end <= start:
+      # It only showed up in the last sample.
+      continue
+    events.append({"ph": "X", "name": code.co_name, "cat": "python",
+                   "pid": pid, "tid": 1, "ts": start, "dur": end - start,
+                   "args": {"file": code.co_filename,
+                            "line": code.co_firstlineno}})
+  for name, start, duration in native_events:
+    events.append({"ph": "X", "name": name, "cat": "native", "pid": pid,
+                   "tid": 2, "ts": start, "dur": duration})
+
+  with open(path, "w") as trace_file:
+    json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
@@ -0,0 +1,210 @@
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class RegistryError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Keeps track of all the objects on a single grid. Objects live in an array of
+slots, and slots get reused once the object in them is deleted. Each object is
+identified by a handle, which packs together its slot number and a generation
+counter for that slot. The handle is stored as the index of the underlying C++
+object, so whatever C++ hands back to us can be resolved in constant time, and a
+handle to a deleted object won't resolve to whatever took over its slot. """
+class Registry:
+  # How many of the low bits of a handle hold the slot number. The rest hold the
+  # generation. Handles have to fit in a (signed) C++ int.
+  SLOT_BITS = 22
+  SLOT_MASK = (1 << SLOT_BITS) - 1
+  GENERATION_MASK = (1 << (31 - SLOT_BITS)) - 1
+
+  def __init__(self):
+    # The object in each slot, or None if the slot is free.
+    self.__slots = []
+    # The current generation of each slot.
+    self.__generations = []
+    # The group that the object in each slot belongs to, if any.
+    self.__slot_groups = []
+    # The objects in each group, keyed by the name of the group. The objects are
+    # stored as the keys of a dictionary, so they stay in order.
+    self.__groups = {}
+    # Every group gets a number, so that C++ can tell them apart. These map
+    # between the names and the numbers.
+    self.__group_ids = {}
+    self.__group_names = []
+    # Slots that are free to be reused.
+    self.__free = []
+    # How many objects are currently registered.
+    self.__size = 0
+    # Objects that have been taken off the grid, but are still waiting to be
+    # deleted.
+    self.__pending_deletion = []
+    # Requests for new objects that are waiting to be created, in the form
+    # (parent, count, levels).
+    self.__pending_births = []
+
+  """ Registers a new object, and sets its index to the handle it gets.
+  grid_object: The object to add.
+  Returns: The object's handle. """
+  def add(self, grid_object):
+    if self.__free:
+      slot = self.__free.pop()
+    else:
+      slot = len(self.__slots)
+      if slot > self.SLOT_MASK:
+        logger.log_and_raise(RegistryError,
+            "Cannot register more than %d objects." % (self.SLOT_MASK + 1))
+      self.__slots.append(None)
+      self.__generations.append(0)
+      self.__slot_groups.append(None)
+
+    self.__slots[slot] = grid_object
+    self.__size += 1
+
+    handle = (self.__generations[slot] << self.SLOT_BITS) | slot
+    logger.debug("Adding grid object with handle %d." % (handle))
+    grid_object.set_index(handle)
+    return handle
+
+  """ Unregisters an object, and frees its slot for reuse.
+  grid_object: The object to remove. """
+  def remove(self, grid_object):
+    slot = self.__resolve(grid_object.get_index())
+
+    self.__slots[slot] = None
+    group = self.__slot_groups[slot]
+    if group is not None:
+      del self.__groups[group][grid_object]
+      self.__slot_groups[slot] = None
+      grid_object.set_group(-1)
+    # Anyone still holding the old handle will find out that it's stale.
+    self.__generations[slot] = \
+        (self.__generations[slot] + 1) & self.GENERATION_MASK
+    self.__free.append(slot)
+    self.__size -= 1
+
+  """ Gets a registered object by its handle.
+  handle: The handle of the object we are looking for.
+  Returns: The object with that handle. """
+  def get(self, handle):
+    return self.__slots[self.__resolve(handle)]
+
+  """ Puts a registered object in a named group, so that everything in that
+  group can be found without looking through every object. Objects can only be
+  in one group at a time. The object's group ID gets set too.
+  grid_object: The object to add.
+  group: The name of the group. """
+  def add_to_group(self, grid_object, group):
+    slot = self.__resolve(grid_object.get_index())
+
+    old_group = self.__slot_groups[slot]
+    if old_group is not None:
+      del self.__groups[old_group][grid_object]
+    self.__slot_groups[slot] = group
+    self.__groups.setdefault(group, {})[grid_object] = None
+
+    grid_object.set_group(self.get_group_id(group))
+
+  """ Gets the number for a group. Numbers are never reused, even if everything
+  in the group goes away.
+  group: The name of the group.
+  Returns: The group's number. """
+  def get_group_id(self, group):
+    group_id = self.__group_ids.get(group)
+    if group_id is None:
+      group_id = len(self.__group_names)
+      self.__group_ids[group] = group_id
+      self.__group_names.append(group)
+
+    return group_id
+
+  """ group_id: The number of a group.
+  Returns: The name of the group, or None if group_id is -1. """
+  def get_group_name(self, group_id):
+    if group_id < 0:
+      return None
+    return self.__group_names[group_id]
+
+  """ group: The name of the group.
+  Returns: A list of all the objects in the group. """
+  def get_group(self, group):
+    return list(self.__groups.get(group, {}))
+
+  """ Returns: The names of all the groups that currently have objects in them.
+  """
+  def get_groups(self):
+    return [group for group, members in self.__groups.items() if members]
+
+  """ Takes note of an object that should be deleted the next time
+  process_deletions() is called.
+  grid_object: The object to delete. """
+  def delete_later(self, grid_object):
+    self.__pending_deletion.append(grid_object)
+
+  """ Deletes all the objects that delete_later() was called on.
+  Returns: A list of the objects that were deleted. """
+  def process_deletions(self):
+    deleted = self.__pending_deletion
+    self.__pending_deletion = []
+
+    for grid_object in deleted:
+      grid_object.delete()
+
+    return deleted
+
+  """ Takes note of an object that wants to create new objects around it the
+  next time process_births() is called.
+  parent: The object that wants to create new ones. Its class needs to have a
+  spawn_offspring() class method that can take a list of these requests.
+  count: How many new objects it wants.
+  levels: How far away from the parent they can go, in cells. """
+  def birth_later(self, parent, count, levels=1):
+    self.__pending_births.append((parent, count, levels))
+
+  """ Creates new objects for all the requests made with birth_later(). Requests
+  from parents of the same class are handled together, so the objects get
+  created in as few batches as possible.
+  Returns: A list of the objects that were created. """
+  def process_births(self):
+    requests = self.__pending_births
+    self.__pending_births = []
+
+    by_class = {}
+    for request in requests:
+      by_class.setdefault(type(request[0]), []).append(request)
+
+    born = []
+    for parent_class, class_requests in by_class.items():
+      born.extend(parent_class.spawn_offspring(class_requests))
+
+    return born
+
+  """ Figures out which slot a handle refers to, and makes sure that it is
+  still valid.
+  handle: The handle to resolve.
+  Returns: The slot number. """
+  def __resolve(self, handle):
+    slot = handle & self.SLOT_MASK
+    if (slot >= len(self.__slots) or self.__slots[slot] is None or \
+        self.__generations[slot] != handle >> self.SLOT_BITS):
+      logger.log_and_raise(RegistryError,
+          "Handle %d does not refer to a registered object." % (handle))
+
+    return slot
+
+  def __iter__(self):
+    return (grid_object for grid_object in self.__slots \
+            if grid_object is not None)
+
+  def __len__(self):
+    return self.__size
+
+  def __contains__(self, grid_object):
+    slot = grid_object.get_index() & self.SLOT_MASK
+    return slot < len(self.__slots) and self.__slots[slot] is grid_object
@@ -0,0 +1,229 @@
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Something that a Scheduler runs at a fixed rate. Every run has a deadline,
+and the next deadline is always one period after the last one, not after when
+the phase actually ran, so phases don't drift. """
+class Phase:
+  # What to do when a phase falls more than a whole period behind. Catching up
+  # runs it back to back until it is caught up, which is what we want for
+  # anything that has to happen a certain number of times. Skipping forgets
+  # about the runs that it missed, which is what we want for anything that only
+  # needs to show the latest state.
+  CATCH_UP = "CatchUp"
+  SKIP = "Skip"
+
+  """ name: The name of the phase.
+  rate: How many times per second to run it.
+  callback: Gets called with no arguments to run it.
+  priority: Phases with higher priorities run first, and get deferred last.
+  policy: What to do when the phase falls behind, either CATCH_UP or SKIP.
+  budget: How long the phase should take to run, in seconds, or None if it
+  doesn't matter. When a phase goes over its budget, phases with lower
+  priorities get put off until the next cycle.
+  max_backlog: When catching up, the most runs to try and make up. Any more than
+  that get skipped anyway, so that a long stall can't lock everything else out.
+  """
+  def __init__(self, name, rate, callback, priority=0, policy=SKIP,
+               budget=None, max_backlog=10):
+    if policy not in (Phase.CATCH_UP, Phase.SKIP):
+      logger.log_and_raise(SchedulerError,
+          "Invalid overrun policy '%s'." % (policy))
+
+    self.__name = name
+    self.__callback = callback
+    self.__priority = priority
+    self.__policy = policy
+    self.__budget = budget
+    self.__max_backlog = max_backlog
+    self.__period = None
+    self.set_rate(rate)
+
+    # When the phase should run next. It runs as soon as it's scheduled.
+    self.__deadline = None
+
+    # How many times the phase has run.
+    self.__runs = 0
+    # How many times it finished after its next run was already due.
+    self.__overruns = 0
+    # How many runs got skipped because we were behind.
+    self.__skipped = 0
+    # How many times it got put off because something more important went over
+    # its budget.
+    self.__deferred = 0
+    # How many times it went over its own budget.
+    self.__over_budget = 0
+    # How long the last run took, in seconds.
+    self.__last_duration = 0.0
+
+  """ Returns: The name of the phase. """
+  def get_name(self):
+    return self.__name
+
+  """ Returns: The priority of the phase. """
+  def get_priority(self):
+    return self.__priority
+
+  """ Changes how often the phase runs. If the next run is farther away than the
+  new period, it gets moved up.
+  rate: How many times per second to run it. """
+  def set_rate(self, rate):
+    if rate <= 0:
+      logger.log_and_raise(SchedulerError, "Rate must be positive.")
+
+    period = 1.0 / rate
+    if self.__period is not None and self.__deadline is not None:
+      self.__deadline -= max(self.__period - period, 0)
+    self.__period = period
+
+  """ Returns: How many times per second the phase runs. """
+  def get_rate(self):
+    return 1.0 / self.__period
+
+  """ Sets when the phase should run for the first time.
+  now: The current time. """
+  def schedule(self, now):
+    self.__deadline = now
+
+  """ Returns: When the phase should run next. """
+  def get_deadline(self):
+    return self.__deadline
+
+  """ now: The current time.
+  Returns: Whether the phase should run. """
+  def is_due(self, now):
+    return now >= self.__deadline
+
+  """ Notes that the phase was due, but didn't get to run this cycle. It stays
+  due, so it will run next cycle unless it gets deferred again. """
+  def defer(self):
+    self.__deferred += 1
+
+  """ Runs the phase, and figures out when it should run next.
+  clock: The clock to time it with.
+  Returns: Whether it went over its budget. """
+  def run(self, clock):
+    start = clock()
+    self.__callback()
+    end = clock()
+
+    self.__runs += 1
+    self.__last_duration = end - start
+    self.__deadline += self.__period
+
+    # Check whether we missed any whole periods.
+    behind = end - self.__deadline
+    if behind >= 0:
+      self.__overruns += 1
+      missed = int(math.floor(behind / self.__period)) + 1
+      if self.__policy == Phase.CATCH_UP:
+        # We're going to run it again right away, but there's a limit to how
+        # many we will make up.
+        missed = max(missed - self.__max_backlog, 0)
+      self.__skipped += missed
+      self.__deadline += missed * self.__period
+
+    over_budget = self.__budget is not None and \
+                  self.__last_duration > self.__budget
+    if over_budget:
+      self.__over_budget += 1
+    return over_budget
+
+  """ Returns: Counters for how the phase has been running, in a dictionary. """
+  def get_stats(self):
+    return {"Rate": self.get_rate(), "Runs": self.__runs,
+            "Overruns": self.__overruns, "Skipped": self.__skipped,
+            "Deferred": self.__deferred, "OverBudget": self.__over_budget,
+            "LastDuration": self.__last_duration}
+
+
+""" Runs a set of phases at their own rates, in one thread. Each cycle runs
+every phase that is due, in order of priority, and then sleeps until the next
+deadline. It uses a monotonic clock, so changes to the system time don't throw
+it off. """
+class Scheduler:
+  """ clock: Returns the current time, in seconds.
+  sleep: Waits for a number of seconds. """
+  def __init__(self, clock=time.monotonic, sleep=time.sleep):
+    self.__clock = clock
+    self.__sleep = sleep
+    # The phases, highest priority first.
+    self.__phases = []
+    # The most phases that can be deferred in a row before they run anyway, so
+    # that a phase that is always over budget can't starve everything else.
+    self.__max_deferrals = 10
+    # How many cycles in a row each phase has been deferred, keyed by name.
+    self.__deferrals = {}
+
+  """ Adds a phase. It runs for the first time on the next cycle. The
+  arguments are the same as for Phase.
+  Returns: The new phase. """
+  def add_phase(self, name, rate, callback, priority=0, policy=Phase.SKIP,
+                budget=None, max_backlog=10):
+    if self.get_phase(name):
+      logger.log_and_raise(SchedulerError,
+          "Already have a phase called '%s'." % (name))
+
+    phase = Phase(name, rate, callback, priority, policy, budget, max_backlog)
+    phase.schedule(self.__clock())
+    self.__phases.append(phase)
+    self.__phases.sort(key=Phase.get_priority, reverse=True)
+    self.__deferrals[name] = 0
+    return phase
+
+  """ name: The name of a phase.
+  Returns: The phase, or None if there isn't one by that name. """
+  def get_phase(self, name):
+    for phase in self.__phases:
+      if phase.get_name() == name:
+        return phase
+    return None
+
+  """ Runs every phase that is due once.
+  Returns: How long until the next phase is due, in seconds. """
+  def run_once(self):
+    # The highest priority of anything that went over its budget.
+    over_budget = None
+    for phase in self.__phases:
+      name = phase.get_name()
+      if not phase.is_due(self.__clock()):
+        continue
+
+      if over_budget is not None and phase.get_priority() < over_budget and \
+         self.__deferrals[name] < self.__max_deferrals:
+        phase.defer()
+        self.__deferrals[name] += 1
+        continue
+
+      self.__deferrals[name] = 0
+      if phase.run(self.__clock) and over_budget is None:
+        logger.debug("Phase '%s' went over its budget." % (name))
+        over_budget = phase.get_priority()
+
+    next_deadline = min([phase.get_deadline() for phase in self.__phases])
+    return max(next_deadline - self.__clock(), 0)
+
+  """ Runs the phases forever. """
+  def run_forever(self):
+    if not self.__phases:
+      logger.log_and_raise(SchedulerError, "No phases to run.")
+
+    while True:
+      wait = self.run_once()
+      if wait:
+        self.__sleep(wait)
+
+  """ Returns: The counters for every phase, keyed by name. """
+  def get_stats(self):
+    return {phase.get_name(): phase.get_stats() for phase in self.__phases}
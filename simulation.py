@@ -9,111 +9,487 @@ from multiprocessing import Process, Value
 
 import logging
 import random
+import signal
+import sys
+import time
 
+import yaml
+try:
+  from yaml import CDumper as Dumper
+except ImportError:
+  from yaml import Dumper
+
+from environment import Environment
+from grid import Grid
 from library import Library
-from phased_loop import PhasedLoop
-from swig_modules import automata
-import visualization
+from memory_report import MemoryReporter, take_report
+from placement import Placer
+from profiler import SamplingProfiler
+from scheduler import Phase, Scheduler
+from statistics_collector import StatisticsCollector
+from swig_modules.automata import Grid as C_Grid
+from swig_modules.automata import RandomStream
+from timestep import AdaptiveTimestep
+from update_handler import DispatchTable, UpdateHandler
 
 
 logger = logging.getLogger(__name__)
 
 
+""" Signal handler that exits cleanly, so that anything that needs to be closed
+on the way out gets closed. """
+def _exit_on_signal(signal_number, frame):
+  logger.info("Exiting on signal %d." % (signal_number))
+  sys.exit(0)
+
+
 """ Controls a simulation. """
 class Simulation:
   """ x_size: The horizontal size of this simulation's grid.
   y_size: The vertical size of this simulation's grid.
-  iteration_time: How much time each iteration encompasses. """
-  def __init__(self, x_size, y_size, iteration_time):
+  iteration_time: How much time each iteration encompasses. If the iteration
+  time is adaptive, this is what it starts out as.
+  statistics: The Statistics section of the configuration, if we should be
+  collecting statistics.
+  environment: The Environment section of the configuration, if the grid has
+  one.
+  adaptive_time: The AdaptiveTime section of the configuration, if the
+  iteration time should change based on how much is going on.
+  domain: The Subdomain that this simulation runs, if the grid is split between
+  a number of workers. (See domain.py.) The sizes are still those of the whole
+  grid.
+  control: The Controller to take commands from, if the simulation can be
+  controlled while it is running. (See control.py.)
+  memory: The Memory section of the configuration, if we should report how much
+  memory we are using. (See memory_report.py.)
+  handlers: The Handlers section of the configuration, if some handlers should
+  run less often than they would by themselves. (See
+  UpdateHandler.configure_periods().) """
+  def __init__(self, x_size, y_size, iteration_time, statistics=None,
+               environment=None, adaptive_time=None, domain=None,
+               control=None, memory=None, handlers=None):
     self.__x_size = x_size
     self.__y_size = y_size
     self.__iteration_time = iteration_time
+    self.__statistics_config = statistics
+    self.__memory_config = memory
+    self.__handlers_config = handlers
 
-    # A list of organisms to get loaded as soon as we fork.
+    # The part of the grid that we are running, if we aren't running all of it.
+    self.__domain = domain
+    if domain and (environment or adaptive_time):
+      logger.log_and_raise(SimulationError,
+          "Environments and adaptive time can't be used with a domain.")
+
+    # Changes the iteration time as we go, if we are doing that.
+    self.__timestep = None
+    if adaptive_time:
+      self.__timestep = AdaptiveTimestep.from_config(adaptive_time,
+                                                     iteration_time)
+      self.__iteration_time = self.__timestep.get_iteration_time()
+    # How much simulation time has passed.
+    self.__time = 0
+
+    # A list of batches of organisms to get loaded as soon as we fork.
     self.__to_load = []
 
-    # Generate random sets of non-repeating numbers that we will use for placing
-    # grid objects.
-    self.__random_x = list(range(0, x_size))
-    self.__random_y = list(range(0, y_size))
-    random.shuffle(self.__random_x)
-    random.shuffle(self.__random_y)
+    # Picks where on the grid to put organisms.
+    self.__placer = Placer(x_size, y_size)
+
+    # The environment that the grid is in, if it has one.
+    self.__environment = None
+    if environment:
+      self.__environment = Environment.from_config(environment, x_size, y_size)
+      # Nothing can be placed in a blocked cell.
+      for position in self.__environment.get_blocked_cells():
+        self.__placer.take(position)
 
     # The separate process that will be used to run the simulation.
     self.simulation_process = Process(target = self.__run_simulation_process)
     # The current iteration of the simulation.
     self.__iteration = Value("i", 0)
+    # The visualization of the grid, if we have one.
+    self.__grid_vis = None
+    # Where commands come from while the simulation is running, if anywhere.
+    self.__control = control
+    # Whether the simulation has been paused.
+    self.__paused = False
+    # The iteration and the time when statistics were last asked for.
+    self.__last_stats = (0, time.time())
+    # Profiles the simulation process when someone asks for it.
+    self.__profiler = None
+    # Runs the simulation, the visualization, and the controller at their own
+    # rates.
+    self.__scheduler = None
+    # Collects statistics about the simulation, if we are doing that.
+    self.__statistics = None
+    # Reports how much memory we are using, if we are doing that.
+    self.__memory = None
 
-  """ Do necessary initialization, then run forever. """
-  def __run_simulation_process(self):
-    # The grid for this simulation.
-    self.__grid = automata.Grid(self.__x_size, self.__y_size)
-    # The visualization of the grid for this simulation.
-    self.__grid_vis = visualization.GridVisualization(
-        self.__x_size, self.__y_size)
+  """ Creates the grid and loads all the organisms that we need to load onto
+  it. """
+  def __populate(self):
+    x_size, y_size = self.__x_size, self.__y_size
+    if self.__domain:
+      x_size, y_size = self.__domain.get_grid_size()
+      # Everything has been placed the same way by every worker, but from here
+      # on, they should all do different things.
+      self.__domain.split_random()
+
+    # Seed the random numbers that C++ uses from ours, so that seeding the
+    # random module is enough to make a run reproducible.
+    RandomStream.SetSeed(random.getrandbits(64))
 
-    # The list of objects on the grid.
-    self.__grid_objects = []
+    if self.__memory_config:
+      # This has to start before we allocate anything that it should count.
+      self.__memory = MemoryReporter.from_config(self.__memory_config)
+      self.__memory.start()
 
-    # The frequency for updating the graphics.
-    graphics_limiter = PhasedLoop(30)
-    # The frequency for updating the simulation.
-    # TODO(danielp): Make this rate user-settable.
-    simulation_limiter = PhasedLoop(1)
+    # The grid for this simulation.
+    self.__grid = Grid(x_size, y_size)
+    if self.__environment:
+      self.__environment.SetTime(0)
+      self.__grid.set_environment(self.__environment)
+    # Keeps track of which handlers need to be run on which objects.
+    self.__dispatch_table = DispatchTable()
 
-    # Load all the organisms that we needed to load.
-    for organism in self.__to_load:
-      library_name = organism[0]
-      name = organism[1]
-      x_pos = organism[2]
-      y_pos = organism[3]
+    # Species overrides can change the attributes that the static filters look
+    # at, so we can't trust anything cached by a previous simulation.
+    UpdateHandler.handlers_by_species.clear()
+    # The same goes for how often each handler runs.
+    UpdateHandler.configure_periods(self.__handlers_config)
 
-      library = Library(library_name)
-      organism = library.load_organism(name, self.__grid, (x_pos, y_pos))
-      logger.info("Adding new grid object at (%d, %d)." % (x_pos, y_pos))
+    for library_name, name, positions, overrides in self.__to_load:
+      if self.__domain:
+        # We only get the ones that are in our part of the grid.
+        positions = self.__domain.claim(positions)
 
-      self.__grid_objects.append(organism)
+      library = Library(library_name)
+      organisms = library.load_organisms(name, self.__grid, positions,
+                                         overrides)
+      logger.info("Added %d of '%s' to the grid." % (len(organisms), name))
 
-      # Add a visualization for the organism.
-      visualization.GridObjectVisualization(self.__grid_vis, organism)
+      for organism in organisms:
+        self.__dispatch_table.add_organism(organism)
 
     # Update the grid to bake everything in its initial position.
     if not self.__grid.Update():
       logger.log_and_raise(SimulationError, "Initial grid update failed.")
 
+    if self.__statistics_config:
+      self.__statistics = \
+          StatisticsCollector.from_config(self.__statistics_config)
+      # Record the initial state too.
+      self.__statistics.sample(self.__grid.registry, 0, 0)
+    if self.__memory:
+      self.__memory.report(0, len(self.__grid.registry))
+
+  """ Do necessary initialization, then run forever. """
+  def __run_simulation_process(self):
+    # This pulls in tkinter, which is slow to import, so only do it when we
+    # actually have something to draw.
+    import visualization
+
+    self.__populate()
+
+    # Lets someone profile us without restarting, by sending us a signal.
+    self.__profiler = SamplingProfiler()
+    self.__profiler.install()
+
+    # The visualization of the grid for this simulation.
+    self.__grid_vis = visualization.GridVisualization(
+        self.__x_size, self.__y_size)
+    for grid_object in self.__grid.registry:
+      visualization.GridObjectVisualization(self.__grid_vis, grid_object)
+
     # Now that the visualization is populated, draw a key for it.
     self.__key = visualization.Key(self.__grid_vis)
 
+    # Iterations have to happen at the right rate, so they get made up if we
+    # fall behind. If one takes longer than a frame, drawing can wait until the
+    # next cycle. The rate can be changed through the controller.
+    self.__scheduler = Scheduler()
+    self.__scheduler.add_phase("Simulation", 1, self.__run_scheduled_iteration,
+                               priority=2, policy=Phase.CATCH_UP,
+                               budget=1.0 / 30)
+    if self.__control:
+      self.__scheduler.add_phase("Control", 30,
+          lambda: self.__control.poll(self.__handle_command), priority=1)
+    # There's no point in drawing anything but the latest state.
+    self.__scheduler.add_phase("Render", 30, self.__render, priority=0,
+                               policy=Phase.SKIP)
+    # The profiler can't do much from its signal handlers, so it finishes up
+    # here.
+    self.__scheduler.add_phase("Profiler", 10, self.__profiler.poll,
+                               priority=-1)
+    if self.__statistics:
+      # We never stop by ourselves, so the buffers would only get written out
+      # when they fill up.
+      self.__scheduler.add_phase("Statistics",
+                                 1.0 / self.__statistics.get_flush_interval(),
+                                 self.__statistics.flush, priority=-1)
+
+    # Getting killed shouldn't lose what's still buffered or leave half-written
+    # files.
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+
     # Now run the simulation.
-    while True:
-      PhasedLoop.limit_fastest()
+    try:
+      self.__scheduler.run_forever()
+    finally:
+      self.__close_outputs()
+
+  """ Writes out and closes everything that we've been recording. """
+  def __close_outputs(self):
+    if self.__statistics:
+      self.__statistics.close()
+    if self.__memory:
+      self.__memory.close()
+
+  """ Runs an iteration, unless we are paused. """
+  def __run_scheduled_iteration(self):
+    if not self.__paused:
+      self.__run_iteration()
+
+  """ Updates the visualization. """
+  def __render(self):
+    self.__grid_vis.update()
+    self.__key.update()
 
-      if simulation_limiter.should_run():
-        # Run the simulation.
+  """ Carries out a command from the controller.
+  command: The name of the command.
+  arguments: A list of the command's arguments.
+  Returns: The result of the command. """
+  def __handle_command(self, command, arguments):
+    # This pulls in asyncio, which is slow to import, and we only need it if
+    # there is a controller.
+    from control import ControlError
+
+    logger.info("Got command '%s' with arguments %s." % (command,
+                                                         str(arguments)))
+
+    if command == "pause":
+      self.__paused = True
+    elif command == "resume":
+      self.__paused = False
+    elif command == "step":
+      if not self.__paused:
+        raise ControlError("Simulation must be paused to step.")
+      try:
+        count = int(arguments[0]) if arguments else 1
+      except (ValueError, TypeError):
+        raise ControlError("Step count must be a number.")
+      for i in range(0, count):
         self.__run_iteration()
-      if graphics_limiter.should_run():
-        self.__grid_vis.update()
-        self.__key.update()
+    elif command == "rate":
+      if len(arguments) != 1 or not isinstance(arguments[0], (int, float)) or \
+         arguments[0] <= 0:
+        raise ControlError("Rate must be a positive number.")
+      if not self.__scheduler:
+        raise ControlError("Simulation is not running on a schedule.")
+      self.__scheduler.get_phase("Simulation").set_rate(arguments[0])
+    elif command == "checkpoint":
+      if len(arguments) != 1:
+        raise ControlError("Checkpoint needs a file to write to.")
+      try:
+        self.__checkpoint(arguments[0])
+      except OSError as error:
+        raise ControlError("Could not write checkpoint: %s" % (str(error)))
+    elif command == "stats":
+      return self.__get_stats()
+    elif command == "memory":
+      return take_report(len(self.__grid.registry),
+                         self.__count_canvas_items())
+    elif command == "profile":
+      if len(arguments) != 2 or not isinstance(arguments[0], (int, float)):
+        raise ControlError("Profile needs a duration and a file to write to.")
+      if self.__profiler.is_running():
+        raise ControlError("Already profiling.")
+      self.__profiler.start(arguments[0], arguments[1])
+    else:
+      raise ControlError("Unknown command '%s'." % (command))
+
+    return {"Iteration": self.__iteration.value, "Paused": self.__paused}
 
-  """ Completely update the grid a single time. """
+  """ Gets statistics about how the simulation is running.
+  Returns: The statistics, in a dictionary. The iteration rate and phase times
+  are averages since the last time this was called. """
+  def __get_stats(self):
+    iteration = self.__iteration.value
+    now = time.time()
+    last_iteration, last_time = self.__last_stats
+    self.__last_stats = (iteration, now)
+
+    registry = self.__grid.registry
+    population = {group: len(registry.get_group(group)) \
+                  for group in registry.get_groups()}
+    phase_times = {}
+    timer = self.__control.get_timer()
+    if timer:
+      phase_times = timer.take()
+
+    stats = {"Iteration": iteration, "SimulationTime": self.__time,
+             "Paused": self.__paused,
+             "IterationsPerSecond": (iteration - last_iteration) / \
+                                    max(now - last_time, 1e-9),
+             "Population": population, "PhaseTimes": phase_times}
+    if self.__scheduler:
+      # How well we're keeping up.
+      stats["Scheduler"] = self.__scheduler.get_stats()
+    return stats
+
+  """ Returns: How many items are on the visualization's canvas, or None if
+  there isn't a visualization. """
+  def __count_canvas_items(self):
+    if not self.__grid_vis:
+      return None
+    return len(self.__grid_vis.get_canvas().find_all())
+
+  """ Writes everything on the grid to a file, so that it can be looked at or
+  set up again later.
+  path: The file to write to.
+  Raises OSError if the file can't be written. """
+  def __checkpoint(self, path):
+    organisms = []
+    for organism in self.__grid.registry:
+      organisms.append({"Position": list(organism.get_position()),
+                        "Attributes": organism.get_all_attributes(),
+                        "State": organism.get_state()})
+    checkpoint = {"GridXSize": self.__x_size, "GridYSize": self.__y_size,
+                  "Iteration": self.__iteration.value,
+                  "SimulationTime": self.__time,
+                  "IterationTime": self.__iteration_time,
+                  "Organisms": organisms}
+
+    with open(path, "w") as checkpoint_file:
+      yaml.dump(checkpoint, checkpoint_file, Dumper=Dumper)
+    logger.info("Wrote checkpoint to '%s'." % (path))
+
+  """ Completely update the grid a single time.
+  Returns: A list of the organisms that were born during the iteration, and a
+  list of the ones that died. If we have a domain, organisms that came from
+  other workers count as being born, and ones that went to them count as dying.
+  """
   def __run_iteration(self):
-    # Update the status of all objects.
-    to_delete = []
-    for grid_object in self.__grid_objects:
-      if not grid_object.update(self.__iteration_time):
-        # Organism died. Remove it. (Already logged.)
-        to_delete.append(grid_object)
+    # Only time things if someone is going to look at the results.
+    timer = None
+    if self.__control:
+      timer = self.__control.get_timer()
+      if timer:
+        timer.start()
+
+    if self.__environment:
+      # Move the sun to where it is at the end of this iteration.
+      self.__environment.SetTime(self.__time + self.__iteration_time)
 
-    for organism in to_delete:
-      self.__grid_objects.remove(organism)
+    # Run all the handlers.
+    self.__dispatch_table.run(self.__iteration_time)
+    if timer:
+      timer.mark("Handlers")
+
+    # Clean up everything that died during this iteration in one go.
+    dead = self.__grid.registry.process_deletions()
+    if dead:
+      self.__dispatch_table.remove_organisms(dead)
+      if self.__grid_vis:
+        for grid_object in dead:
+          self.__grid_vis.remove_grid_object(grid_object)
+      if self.__statistics:
+        self.__statistics.record_deaths(dead)
+    if timer:
+      timer.mark("Deaths")
+
+    # Everything that was born goes in the cells that are free now.
+    born = self.__grid.registry.process_births()
+    for organism in born:
+      self.__dispatch_table.add_organism(organism)
+      if self.__grid_vis:
+        import visualization
+        visualization.GridObjectVisualization(self.__grid_vis, organism)
+      if self.__statistics:
+        self.__statistics.record_birth(organism)
+    if timer:
+      timer.mark("Births")
+
+    if self.__domain:
+      # Trade everything that crossed an edge with the workers next to us.
+      departed, arrived = self.__domain.exchange(self.__grid)
+      self.__dispatch_table.remove_organisms(departed)
+      for organism in arrived:
+        self.__dispatch_table.add_organism(organism)
+      dead = dead + departed
+      born = born + arrived
+      if timer:
+        timer.mark("Exchange")
 
     # Update the grid.
     if not self.__grid.Update():
       logger.log_and_raise(SimulationError, "Grid Update() failed unexpectedly.")
+    if timer:
+      timer.mark("Update")
 
     self.__iteration.value += 1
+    self.__time += self.__iteration_time
     logger.debug("Running iteration %d." % (self.__iteration.value))
 
+    iteration = self.__iteration.value
+    if self.__statistics and self.__statistics.is_due(iteration):
+      self.__statistics.sample(self.__grid.registry, iteration, self.__time)
+    if self.__memory and self.__memory.is_due(iteration):
+      self.__memory.report(iteration, len(self.__grid.registry),
+                           self.__count_canvas_items())
+
+    if self.__timestep:
+      self.__iteration_time = self.__timestep.update(
+          len(self.__grid.registry), self.__grid.moved_objects(),
+          self.__grid.SumObjects(C_Grid.kObjectEnergy))
+
+    return born, dead
+
+  """ Runs the simulation in the current process as fast as possible, without
+  any visualization. This is what parameter sweeps use, and it means that more
+  than one simulation can be run in the same process.
+  iterations: How many iterations to run for.
+  Returns: A dictionary of summary statistics for the run. """
+  def run(self, iterations):
+    start_time = time.time()
+    self.__populate()
+
+    # How many of each species there are.
+    population = {}
+    for organism in self.__grid.registry:
+      species = organism.scientific_name()
+      population[species] = population.get(species, 0) + 1
+    initial = dict(population)
+    # The iteration on which each species went extinct.
+    extinctions = {}
+
+    for i in range(0, iterations):
+      born, dead = self.__run_iteration()
+      for organism in born:
+        species = organism.scientific_name()
+        population[species] = population.get(species, 0) + 1
+      for organism in dead:
+        species = organism.scientific_name()
+        population[species] -= 1
+        if not population[species]:
+          extinctions[species] = self.__iteration.value
+
+      if not len(self.__grid.registry) and not self.__domain:
+        # With a domain, other workers might still have things going on, and
+        # they need us to keep exchanging with them.
+        logger.info("Everything is dead, stopping early.")
+        break
+
+    self.__close_outputs()
+
+    return {"Iterations": self.__iteration.value,
+            "SimulationTime": self.__time,
+            "WallTime": time.time() - start_time,
+            "InitialPopulation": initial,
+            "FinalPopulation": population,
+            "Extinctions": extinctions}
+
   """ Start the simulation. """
   def start(self):
     # The simulation gets run in a separate process.
@@ -126,14 +502,21 @@ class Simulation:
 
   """ Adds a new organism to the simulation.
   library: The object to add.
-  name: The name of the species. """
-  def add_organism(self, library, name):
-    # Pick a random position for the organism.
-    if not len(self.__random_x):
-      # We're out of space.
-      logger.log_and_raise(SimulationError,
-          "Cannot place object, no space on grid.")
-    x_pos = self.__random_x.pop()
-    y_pos = self.__random_y.pop()
+  name: The name of the species.
+  overrides: Optional attributes that take precedence over the ones in the
+  species library. """
+  def add_organism(self, library, name, overrides=None):
+    self.add_organisms(library, name, 1, overrides)
 
-    self.__to_load.append((library, name, x_pos, y_pos))
+  """ Adds a number of organisms of the same species to the simulation.
+  library: The library that the species is in.
+  name: The name of the species.
+  quantity: How many organisms to add.
+  overrides: Optional attributes that take precedence over the ones in the
+  species library.
+  placement: Optional Placement section for the species, which controls where
+  on the grid the organisms go. By default, they are spread uniformly. """
+  def add_organisms(self, library, name, quantity, overrides=None,
+                    placement=None):
+    positions = self.__placer.place(quantity, placement)
+    self.__to_load.append((library, name, positions, overrides))
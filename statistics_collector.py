@@ -0,0 +1,271 @@
+from array import array
+import csv
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+try:
+  import pyarrow
+  import pyarrow.parquet
+except ImportError:
+  # We can still write CSV files.
+  pyarrow = None
+
+
+class StatisticsError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Periodically samples per-species statistics from a running simulation, and
+writes them out to a file. Samples are buffered in preallocated arrays, one for
+each column, and get written in bulk whenever the buffers fill up. There is one
+row for every species in every sample. """
+class StatisticsCollector:
+  # The columns that we record, and the array typecode for each one. Species
+  # are stored as an index into the list of species names.
+  COLUMNS = [("Iteration", "q"), ("Time", "d"), ("Species", "q"),
+             ("Count", "q"), ("Biomass", "d"), ("MeanMass", "d"),
+             ("MassVariance", "d"), ("MeanEnergy", "d"),
+             ("EnergyVariance", "d"), ("Births", "q"), ("Deaths", "q"),
+             ("Eaten", "q"), ("Kills", "q")]
+  # Formats that we know how to write.
+  FORMATS = ("csv", "parquet")
+
+  """ Creates a new collector from the Statistics section of a simulation
+  configuration.
+  config: The configuration section.
+  Returns: The new collector. """
+  @classmethod
+  def from_config(cls, config):
+    if "Output" not in config:
+      logger.log_and_raise(StatisticsError,
+          "Invalid Statistics config, needs 'Output'.")
+
+    return cls(config["Output"], interval=config.get("Interval", 1),
+               output_format=config.get("Format"),
+               buffer_size=config.get("BufferSize", 4096),
+               flush_interval=config.get("FlushInterval", 10))
+
+  """ path: The file to write the statistics to.
+  interval: How many iterations to wait between samples.
+  output_format: Either "csv" or "parquet". By default, it is guessed from the
+  extension of the path.
+  buffer_size: How many rows to buffer before writing them out.
+  flush_interval: How many seconds to wait between writing out whatever is
+  buffered, when the simulation is running interactively. Runs that end by
+  themselves write everything out at the end anyway. """
+  def __init__(self, path, interval=1, output_format=None, buffer_size=4096,
+               flush_interval=10):
+    if output_format is None:
+      output_format = os.path.splitext(path)[1][1:].lower()
+      if output_format not in self.FORMATS:
+        output_format = "csv"
+    if output_format not in self.FORMATS:
+      logger.log_and_raise(StatisticsError,
+          "Unknown statistics format '%s'." % (output_format))
+    if output_format == "parquet" and pyarrow is None:
+      logger.log_and_raise(StatisticsError,
+          "Writing parquet files requires pyarrow.")
+    if interval < 1 or buffer_size < 1:
+      logger.log_and_raise(StatisticsError,
+          "Interval and buffer size must be positive.")
+    if flush_interval <= 0:
+      logger.log_and_raise(StatisticsError,
+          "Flush interval must be positive, not %s." % (flush_interval))
+
+    self.__path = path
+    self.__interval = interval
+    self.__format = output_format
+    self.__buffer_size = buffer_size
+    self.__flush_interval = flush_interval
+
+    # The buffers for each column.
+    self.__columns = [array(typecode, [0]) * buffer_size \
+                      for name, typecode in self.COLUMNS]
+    # How many rows are currently in the buffers.
+    self.__rows = 0
+
+    # The names of all the species we've seen, and their indices in that list.
+    self.__species = []
+    self.__species_indices = {}
+
+    # Events that have happened since the last sample, for each species.
+    self.__births = {}
+    self.__deaths = {}
+    self.__eaten = {}
+    self.__kills = {}
+
+    # What we are writing to. This gets opened on the first flush.
+    self.__file = None
+    self.__writer = None
+
+  """ iteration: The current iteration.
+  Returns: Whether a sample should be taken on this iteration. """
+  def is_due(self, iteration):
+    return iteration % self.__interval == 0
+
+  """ Returns: How many seconds to wait between flushes when running
+  interactively. """
+  def get_flush_interval(self):
+    return self.__flush_interval
+
+  """ Records that a new organism was born.
+  organism: The organism. """
+  def record_birth(self, organism):
+    self.__count_event(self.__births, organism.scientific_name())
+
+  """ Records that a batch of organisms died.
+  organisms: The organisms that died. """
+  def record_deaths(self, organisms):
+    for organism in organisms:
+      species = organism.scientific_name()
+      self.__count_event(self.__deaths, species)
+
+      predator = organism.get_predator()
+      if predator:
+        self.__count_event(self.__eaten, species)
+        self.__count_event(self.__kills, predator.scientific_name())
+
+  """ Takes a sample of the current state of the simulation.
+  organisms: All the organisms currently in the simulation.
+  iteration: The current iteration.
+  time: The current simulation time. """
+  def sample(self, organisms, iteration, time):
+    # Count, total mass, sum of squared mass, total energy, sum of squared
+    # energy, and number of organisms with a metabolism, for each species.
+    totals = {}
+    for organism in organisms:
+      species = organism.scientific_name()
+      if species not in totals:
+        totals[species] = [0, 0.0, 0.0, 0.0, 0.0, 0]
+      species_totals = totals[species]
+      species_totals[0] += 1
+
+      metabolism = organism.metabolism
+      if metabolism is None:
+        continue
+      mass = metabolism.mass()
+      energy = metabolism.energy()
+      species_totals[1] += mass
+      species_totals[2] += mass * mass
+      species_totals[3] += energy
+      species_totals[4] += energy * energy
+      species_totals[5] += 1
+
+    for species in totals:
+      self.__get_species_index(species)
+    if self.__rows + len(self.__species) > self.__buffer_size:
+      self.flush()
+
+    # Every species we've ever seen gets a row, so extinctions show up as zeros
+    # instead of as missing data.
+    for index, species in enumerate(self.__species):
+      count, mass, mass_squared, energy, energy_squared, with_metabolism = \
+          totals.get(species, [0, 0.0, 0.0, 0.0, 0.0, 0])
+
+      mean_mass = mean_energy = mass_variance = energy_variance = 0.0
+      if with_metabolism:
+        mean_mass = mass / with_metabolism
+        mean_energy = energy / with_metabolism
+        mass_variance = max(mass_squared / with_metabolism - mean_mass ** 2,
+                            0.0)
+        energy_variance = max(
+            energy_squared / with_metabolism - mean_energy ** 2, 0.0)
+
+      row = (iteration, time, index, count, mass, mean_mass, mass_variance,
+             mean_energy, energy_variance, self.__births.get(species, 0),
+             self.__deaths.get(species, 0), self.__eaten.get(species, 0),
+             self.__kills.get(species, 0))
+      for column, value in zip(self.__columns, row):
+        column[self.__rows] = value
+      self.__rows += 1
+
+    self.__births.clear()
+    self.__deaths.clear()
+    self.__eaten.clear()
+    self.__kills.clear()
+
+  """ Writes everything that's buffered out to the file. """
+  def flush(self):
+    if not self.__rows:
+      return
+    logger.debug("Writing %d rows of statistics to '%s'." % \
+                 (self.__rows, self.__path))
+
+    if self.__format == "csv":
+      self.__flush_csv()
+    else:
+      self.__flush_parquet()
+
+    self.__rows = 0
+
+  """ Writes out anything that's left, and closes the file. """
+  def close(self):
+    self.flush()
+
+    if self.__format == "csv" and self.__file:
+      self.__file.close()
+    elif self.__writer:
+      self.__writer.close()
+    self.__file = None
+    self.__writer = None
+
+  """ Returns: The names of all the species we've seen, in the order that their
+  indices in the Species column refer to. """
+  def get_species(self):
+    return self.__species
+
+  """ Gets the index of a species, adding it if we haven't seen it before.
+  species: The name of the species.
+  Returns: The species' index. """
+  def __get_species_index(self, species):
+    if species not in self.__species_indices:
+      self.__species_indices[species] = len(self.__species)
+      self.__species.append(species)
+    return self.__species_indices[species]
+
+  """ Counts an event for a species.
+  events: The dictionary of event counts to add to.
+  species: The species that the event happened to. """
+  def __count_event(self, events, species):
+    self.__get_species_index(species)
+    events[species] = events.get(species, 0) + 1
+
+  """ Writes the buffered rows to a CSV file. """
+  def __flush_csv(self):
+    if not self.__file:
+      self.__file = open(self.__path, "w", newline="")
+      self.__writer = csv.writer(self.__file)
+      self.__writer.writerow([name for name, typecode in self.COLUMNS])
+
+    species_column = [name for name, typecode in self.COLUMNS].index("Species")
+    columns = [column[:self.__rows] for column in self.__columns]
+    columns[species_column] = [self.__species[index] \
+                               for index in columns[species_column]]
+    self.__writer.writerows(zip(*columns))
+    self.__file.flush()
+
+  """ Writes the buffered rows to a parquet file, as a new row group. """
+  def __flush_parquet(self):
+    arrays = []
+    for (name, typecode), column in zip(self.COLUMNS, self.__columns):
+      # Convert straight from the buffer instead of going through Python
+      # objects.
+      arrow_type = pyarrow.float64() if typecode == "d" else pyarrow.int64()
+      data = pyarrow.py_buffer(column)
+      values = pyarrow.Array.from_buffers(arrow_type, self.__rows,
+                                          [None, data])
+      if name == "Species":
+        values = pyarrow.DictionaryArray.from_arrays(
+            values, pyarrow.array(self.__species, pyarrow.string()))
+      arrays.append(values)
+
+    table = pyarrow.Table.from_arrays(
+        arrays, names=[name for name, typecode in self.COLUMNS])
+    if not self.__writer:
+      self.__writer = pyarrow.parquet.ParquetWriter(self.__path, table.schema)
+    self.__writer.write_table(table)
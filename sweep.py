@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+
+from modified_logger import Logger
+if __name__ == "__main__":
+  # This has to happen before anything uses a Logger.
+  Logger.set_path("sweep.log")
+
+import copy
+import itertools
+import logging
+import multiprocessing
+import random
+import sys
+
+logger = logging.getLogger(__name__)
+
+import yaml
+try:
+  from yaml import CLoader as Loader, CDumper as Dumper
+except ImportError:
+  logger.warning("Falling back on Python yaml parser.")
+  from yaml import Loader, Dumper
+
+from library import Library
+from simulation import Simulation
+
+
+class SweepError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Sets a single parameter in a simulation configuration.
+config: The configuration to modify.
+path: The parameter to set, as a dotted path, for instance
+"Organisms.sciurus carolinensis.Quantity". Anything that comes after a list in
+the path selects the item in that list with that name.
+value: The value to set the parameter to. """
+def _set_parameter(config, path, value):
+  keys = path.split(".")
+
+  node = config
+  for key in keys[:-1]:
+    if type(node) is list:
+      # Find the item with the right name.
+      matches = [item for item in node \
+                 if str(item.get("Name", "")).lower() == key.lower()]
+      if not matches:
+        logger.log_and_raise(SweepError,
+            "Nothing named '%s' in parameter '%s'." % (key, path))
+      node = matches[0]
+    else:
+      node = node.setdefault(key, {})
+
+  if type(node) is not dict:
+    logger.log_and_raise(SweepError, "Cannot set parameter '%s'." % (path))
+  node[keys[-1]] = value
+
+""" Loads all the species in a configuration into the library cache, so that
+runs in this worker don't have to.
+config: The configuration to load species for. """
+def _warm_up(config):
+  for organism in config["Organisms"]:
+    Library(organism["Library"]).load_species(organism["Name"])
+
+""" Runs a single simulation from a sweep.
+run: The run to do, as produced by Sweep.get_runs().
+Returns: A dictionary describing the run, including the summary statistics from
+the simulation. """
+def _run_simulation(run):
+  number, parameters, seed, config, iterations = run
+  result = {"Run": number, "Parameters": dict(parameters), "Seed": seed}
+
+  logger.info("Starting run %d with parameters %s." % (number, parameters))
+  random.seed(seed)
+  try:
+    statistics = config.get("Statistics")
+    if statistics:
+      # Every run needs its own output file.
+      statistics = dict(statistics)
+      statistics["Output"] = statistics["Output"].format(run=number)
+    memory = config.get("Memory")
+    if memory:
+      memory = dict(memory)
+      memory["Output"] = memory["Output"].format(run=number)
+
+    simulation = Simulation(config["GridXSize"], config["GridYSize"],
+                            config["IterationTime"], statistics,
+                            config.get("Environment"),
+                            config.get("AdaptiveTime"), memory=memory,
+                            handlers=config.get("Handlers"))
+    for organism in config["Organisms"]:
+      simulation.add_organisms(organism["Library"], organism["Name"],
+                               organism["Quantity"], organism.get("Overrides"),
+                               organism.get("Placement"))
+
+    result.update(simulation.run(iterations))
+  except Exception as error:
+    # One bad run shouldn't ruin the whole sweep.
+    logger.exception("Run %d failed." % (number))
+    result["Error"] = str(error)
+
+  return result
+
+
+""" Runs many independent, headless simulations, one for every combination of
+a set of parameters, and collects summary statistics from each one. """
+class Sweep:
+  """ base_config: The configuration that all the simulations start from, in
+  the same format that main.py takes.
+  parameters: A dictionary mapping parameter paths in the configuration to a
+  list of values to try for each one. (See _set_parameter().)
+  iterations: How many iterations to run each simulation for.
+  repetitions: How many times to run each combination, with different seeds.
+  seed: The seed that the per-run seeds are derived from. """
+  def __init__(self, base_config, parameters, iterations, repetitions=1,
+               seed=0):
+    for key in ("GridXSize", "GridYSize", "IterationTime", "Organisms"):
+      if key not in base_config:
+        logger.log_and_raise(SweepError,
+            "Invalid base config, needs '%s'." % (key))
+
+    self.__base_config = base_config
+    self.__parameters = parameters
+    self.__iterations = iterations
+    self.__repetitions = repetitions
+    self.__seed = seed
+
+  """ Returns: A list of all the runs in this sweep. Each one is a tuple of the
+  run number, the parameters that were set, the seed, the full configuration,
+  and the number of iterations. """
+  def get_runs(self):
+    paths = sorted(self.__parameters.keys())
+    combinations = itertools.product(
+        *[self.__parameters[path] for path in paths])
+
+    runs = []
+    for values in combinations:
+      parameters = dict(zip(paths, values))
+      config = copy.deepcopy(self.__base_config)
+      for path, value in parameters.items():
+        _set_parameter(config, path, value)
+
+      for i in range(0, self.__repetitions):
+        number = len(runs)
+        runs.append((number, parameters, self.__seed + number, config,
+                     self.__iterations))
+
+    return runs
+
+  """ Runs the whole sweep.
+  processes: How many worker processes to use. Defaults to one for every CPU.
+  If it is 1, everything is run in this process.
+  Returns: A list of results, one for each run, in run order. """
+  def run(self, processes=None):
+    runs = self.get_runs()
+    logger.info("Running sweep of %d simulations." % (len(runs)))
+
+    if processes == 1:
+      _warm_up(self.__base_config)
+      return [_run_simulation(run) for run in runs]
+
+    # Load the species before forking, so that the workers all share the same
+    # copy of any compiled library, instead of each mapping their own.
+    _warm_up(self.__base_config)
+    # Workers stick around for the whole sweep, so they only have to import
+    # everything and load the species library once.
+    pool = multiprocessing.Pool(processes, initializer=_warm_up,
+                                initargs=(self.__base_config,))
+    try:
+      results = list(pool.imap_unordered(_run_simulation, runs))
+    finally:
+      pool.close()
+      pool.join()
+
+    results.sort(key=lambda result: result["Run"])
+    return results
+
+
+def main():
+  if len(sys.argv) not in (2, 3):
+    print("Usage: sweep.py sweep_file [output_file]")
+    sys.exit()
+
+  sweep_file = open(sys.argv[1])
+  sweep_config = yaml.load(sweep_file, Loader=Loader)
+  sweep_file.close()
+
+  for key in ("Base", "Iterations"):
+    if key not in sweep_config:
+      logger.fatal("Invalid sweep config, needs '%s'." % (key))
+
+  base_file = open(sweep_config["Base"])
+  base_config = yaml.load(base_file, Loader=Loader)
+  base_file.close()
+
+  sweep = Sweep(base_config, sweep_config.get("Parameters", {}),
+                sweep_config["Iterations"],
+                repetitions=sweep_config.get("Repetitions", 1),
+                seed=sweep_config.get("Seed", 0))
+  results = sweep.run(sweep_config.get("Processes"))
+
+  if len(sys.argv) == 3:
+    output = open(sys.argv[2], "w")
+    yaml.dump(results, output, Dumper=Dumper)
+    output.close()
+  else:
+    yaml.dump(results, sys.stdout, Dumper=Dumper)
+
+
+if __name__ == "__main__":
+  main()
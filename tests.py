@@ -1,28 +1,130 @@
 #!/usr/bin/python3
 
 import copy
+import csv
+import json
+import math
+import multiprocessing
 import os
+import random
 import shutil
+import tempfile
+import threading
+import time
 import unittest
 
 from modified_logger import Logger
 # This has to happen before anything we import tries to create a logger.
 Logger.set_path("test_log.log")
 
-from swig_modules.automata import Grid as C_Grid, AnimalMetabolism
+from environment import Environment, EnvironmentConfigError
+from grid import Grid, GridError
+from simulation import Simulation
+from swig_modules.automata import AnimalMetabolism, MemoryStats
+import control
+import domain
 import grid_object
 import library
+import memory_report
 import organism
+import placement
+import profiler
+import registry
+import scheduler
+import statistics_collector
+import sweep
+import timestep
 import update_handler
 import visualization
 
 
+""" Tests the grid class. """
+class TestGrid(unittest.TestCase):
+  def setUp(self):
+    self.__grid = Grid(5, 5)
+
+  """ Can we see the state of the whole grid at once? """
+  def test_views(self):
+    plant = organism.Organism(self.__grid, (1, 2))
+    plant.set_attributes({"Taxonomy": {"Genus": "Plant", "Species": "Species"}})
+    animal = organism.Organism(self.__grid, (3, 0))
+    animal.set_attributes({"Taxonomy": {"Genus": "Animal",
+                                        "Species": "Species"}})
+    animal.metabolism = AnimalMetabolism(0.5, 0.1, 310.15, 0.5, 0.37)
+
+    # Nothing shows up until the grid gets updated.
+    self.assertEqual(-1, self.__grid.get_occupants()[2, 1])
+    self.assertEqual(0, len(self.__grid.get_object_columns()["Index"]))
+    self.assertTrue(self.__grid.Update())
+
+    occupants = self.__grid.get_occupants()
+    self.assertEqual(plant.get_index(), occupants[2, 1])
+    self.assertEqual(animal.get_index(), occupants[0, 3])
+    self.assertEqual(-1, occupants[0, 0])
+    with self.assertRaises((TypeError, ValueError)):
+      occupants[0, 0] = 1
+
+    groups = self.__grid.get_groups()
+    self.assertEqual("Plant Species",
+                     self.__grid.registry.get_group_name(groups[2, 1]))
+    self.assertEqual(-1, groups[0, 0])
+
+    # Objects come out in the order of their cells.
+    columns = self.__grid.get_object_columns()
+    self.assertEqual([animal.get_index(), plant.get_index()],
+                     list(columns["Index"]))
+    self.assertEqual([3, 1], list(columns["X"]))
+    self.assertEqual([0, 2], list(columns["Y"]))
+    self.assertEqual(animal.metabolism.energy(), columns["Energy"][0])
+    self.assertTrue(math.isnan(columns["Energy"][1]))
+
+  """ Can handlers find out what is around an organism? """
+  def test_perception(self):
+    # Everything needs to know how to react to predators and prey.
+    factors = {"Animal": {"PreyFactorStrength": 1, "PreyFactorVisibility": -1,
+                          "PredatorFactorStrength": -1,
+                          "PredatorFactorVisibility": -1}}
+    def make(position, genus, prey=[]):
+      made = organism.Organism(self.__grid, position)
+      made.set_attributes({"Taxonomy": {"Genus": genus, "Species": "Species"},
+                           "Prey": prey, "Metabolism": factors})
+      made.set_vision(2)
+      return made
+
+    animal = make((2, 2), "Animal", ["Plant Species"])
+    neighbor = make((4, 4), "Animal")
+    near_plant = make((2, 0), "Plant")
+    far_plant = make((0, 4), "Plant")
+    self.assertTrue(self.__grid.Update())
+
+    self.assertEqual([neighbor.get_index(), near_plant.get_index(),
+                      far_plant.get_index()],
+                     sorted(animal.find_neighbors()))
+    self.assertEqual([near_plant.get_index(), far_plant.get_index()],
+                     list(animal.find_neighbors("Plant Species")))
+    self.assertEqual(1, animal.count_conspecifics())
+    self.assertEqual(0, animal.count_conspecifics(radius=1))
+    self.assertEqual(near_plant.get_index(), animal.find_nearest_prey())
+    self.assertIsNone(neighbor.find_nearest_prey())
+
+    # Asking again doesn't have to go to C++.
+    perception = self.__grid.perception
+    misses = perception.get_stats()["Misses"]
+    animal.find_neighbors("Plant Species")
+    self.assertEqual(near_plant.get_index(), animal.find_nearest_prey())
+    self.assertEqual(misses, perception.get_stats()["Misses"])
+
+    # Until the grid changes.
+    near_plant.die()
+    self.assertTrue(self.__grid.Update())
+    self.assertEqual(0, perception.get_stats()["Remembered"])
+    self.assertEqual(far_plant.get_index(), animal.find_nearest_prey())
+
+
 """ Tests the grid_object class. """
 class TestGridObject(unittest.TestCase):
   def setUp(self):
-    grid_object.GridObject.clear_objects()
-
-    self.__grid = C_Grid(10, 10)
+    self.__grid = Grid(10, 10)
 
   """ Does the indexing system work properly? """
   def test_indexing(self):
@@ -35,7 +137,7 @@ class TestGridObject(unittest.TestCase):
     self.assertEqual(2, object3.get_index())
 
     self.assertEqual(set([object1, object2, object3]),
-                     grid_object.GridObject.grid_objects)
+                     set(self.__grid.registry))
 
     # Delete one. Everything else should remain untouched.
     object2.delete()
@@ -43,15 +145,41 @@ class TestGridObject(unittest.TestCase):
     self.assertEqual(0, object1.get_index())
     self.assertEqual(2, object3.get_index())
 
-    self.assertEqual(set([object1, object3]), grid_object.GridObject.grid_objects)
+    self.assertEqual(set([object1, object3]), set(self.__grid.registry))
+
+  """ Do deleted objects' slots get reused without old handles resolving to the
+  new objects? """
+  def test_handle_reuse(self):
+    objects = self.__grid.registry
+    object1 = grid_object.GridObject(self.__grid, (0, 0))
+    object2 = grid_object.GridObject(self.__grid, (1, 1))
+
+    old_handle = object1.get_index()
+    self.assertIs(object1, objects.get(old_handle))
+    object1.delete()
+    self.assertNotIn(object1, objects)
+
+    # The new object should take over the slot with a different handle.
+    object3 = grid_object.GridObject(self.__grid, (2, 2))
+    self.assertNotEqual(old_handle, object3.get_index())
+    self.assertEqual(old_handle & objects.SLOT_MASK,
+                     object3.get_index() & objects.SLOT_MASK)
+    self.assertIs(object3, objects.get(object3.get_index()))
+    with self.assertRaises(registry.RegistryError):
+      objects.get(old_handle)
+
+    self.assertEqual(2, len(objects))
+
+    # Separate grids should have separate registries.
+    other = grid_object.GridObject(Grid(10, 10), (0, 0))
+    self.assertEqual(0, other.get_index())
+    self.assertNotIn(other, objects)
 
 
 """ Tests the organism class. """
 class TestOrganism(unittest.TestCase):
   def setUp(self):
-    grid_object.GridObject.clear_objects()
-
-    self.__grid = C_Grid(10, 10)
+    self.__grid = Grid(10, 10)
     self.__organism = organism.Organism(self.__grid, (0, 0))
 
   """ Does loading and setting attributes work as expected? """
@@ -117,6 +245,150 @@ class TestOrganism(unittest.TestCase):
     # grid.
     self.assertTrue(self.__grid.Update())
 
+  """ Do dead organisms get cleaned up properly? """
+  def test_death(self):
+    predator = organism.Organism(self.__grid, (1, 1))
+    self.assertTrue(self.__grid.Update())
+
+    prey_attributes = {"Taxonomy": {"Genus": "Prey", "Species": "Species"},
+        "Metabolism": {"Animal": {"PredatorFactorStrength": -1,
+        "PredatorFactorVisibility": -1}}}
+    predator_attributes = {"Prey": "Prey Species",
+        "Taxonomy": {"Genus": "Predator", "Species": "Species"}, "Metabolism":
+        {"Animal": {"PreyFactorStrength": 1,
+        "PreyFactorVisibility": -1}}}
+    self.__organism.set_attributes(prey_attributes)
+    predator.set_attributes(predator_attributes)
+
+    self.__organism.die()
+    # Dying twice should be harmless.
+    self.__organism.die()
+
+    # It should be off the grid immediately.
+    self.assertFalse(self.__organism.is_alive())
+    self.assertIn(self.__organism, self.__grid.registry)
+
+    # Everything else should happen once we process the deletions.
+    deleted = self.__grid.registry.process_deletions()
+    self.assertEqual([self.__organism], deleted)
+    self.assertNotIn(self.__organism, self.__grid.registry)
+    self.assertEqual([], self.__grid.registry.process_deletions())
+
+  """ Do factors that were added by hand get cleaned up, even between organisms
+  that aren't predator and prey? """
+  def test_manual_factor_cleanup(self):
+    other = organism.Organism(self.__grid, (5, 5))
+    self.assertTrue(self.__grid.Update())
+
+    self.__organism.set_attributes(
+        {"Taxonomy": {"Genus": "Hunter", "Species": "Species"},
+         "Metabolism": {"Animal": {"PreyFactorStrength": 1,
+                                   "PreyFactorVisibility": -1}}})
+    other.set_attributes({"Taxonomy": {"Genus": "Bystander",
+                                       "Species": "Species"}})
+
+    factors = MemoryStats.GetCount(MemoryStats.kMovementFactors)
+    self.__organism.add_factor_from_organism(other, False)
+    self.assertEqual(factors + 1,
+                     MemoryStats.GetCount(MemoryStats.kMovementFactors))
+
+    other.die()
+    self.__grid.registry.process_deletions()
+    self.assertEqual(factors,
+                     MemoryStats.GetCount(MemoryStats.kMovementFactors))
+
+    # It should still be able to move without the factor.
+    self.__organism.update_position()
+    self.assertTrue(self.__grid.Update())
+
+    # Deleting the holder afterwards shouldn't try to touch the other one.
+    self.__organism.die()
+    self.assertEqual([self.__organism],
+                     self.__grid.registry.process_deletions())
+
+  """ Do organisms that move using fields get a field instead of factors? """
+  def test_field_movement(self):
+    predator = organism.Organism(self.__grid, (2, 0))
+    self.assertTrue(self.__grid.Update())
+
+    prey_attributes = {"Taxonomy": {"Genus": "Prey", "Species": "Species"},
+        "Metabolism": {"Animal": {"PredatorFactorStrength": -1,
+        "PredatorFactorVisibility": -1}}}
+    predator_attributes = {"Prey": "Prey Species", "Vision": 3,
+        "Taxonomy": {"Genus": "Predator", "Species": "Species"}, "Metabolism":
+        {"Animal": {"PreyFactorStrength": 100, "PreyFactorVisibility": -1,
+        "MovementMode": "Field"}}}
+    self.__organism.set_attributes(prey_attributes)
+    predator.set_attributes(predator_attributes)
+
+    self.assertTrue(predator.uses_field())
+    self.assertFalse(self.__organism.uses_field())
+
+    # The predator's field should have the prey in it, out to its vision.
+    registry = self.__grid.registry
+    predator_group = registry.get_group_id("Predator Species")
+    self.assertEqual(1000, self.__grid.GetFieldValue(predator_group, 0, 0))
+    self.assertEqual(100 / 2 ** 5,
+                     self.__grid.GetFieldValue(predator_group, 2, 0))
+    self.assertEqual(0, self.__grid.GetFieldValue(predator_group, 4, 0))
+    # The prey still uses factors, so it shouldn't have a field.
+    prey_group = registry.get_group_id("Prey Species")
+    self.assertEqual(0, self.__grid.GetFieldValue(prey_group, 2, 0))
+
+    # It should still be able to move.
+    predator.update_position()
+    self.assertTrue(self.__grid.Update())
+    x, y = predator.get_position()
+    self.assertLessEqual(abs(x - 2), 1)
+    self.assertLessEqual(y, 1)
+
+    # A field for a species that can see forever would be too slow.
+    blind = organism.Organism(self.__grid, (6, 6))
+    blind_attributes = copy.deepcopy(predator_attributes)
+    blind_attributes["Taxonomy"]["Genus"] = "Farsighted"
+    blind_attributes["Vision"] = -1
+    with self.assertRaises(organism.OrganismError):
+      blind.set_attributes(blind_attributes)
+
+    # Made up movement modes shouldn't work.
+    confused = organism.Organism(self.__grid, (5, 5))
+    with self.assertRaises(organism.OrganismError):
+      confused.set_attributes({"Taxonomy": {"Genus": "Confused",
+                                            "Species": "Species"},
+          "Metabolism": {"Animal": {"MovementMode": "Teleport"}}})
+
+  """ Do offspring get created in vacant cells around their parents? """
+  def test_reproduction(self):
+    attributes = {"Taxonomy": {"Genus": "Test", "Species": "Species"}}
+    self.__organism.set_attributes(attributes)
+    blocker = organism.Organism(self.__grid, (1, 0))
+    self.assertTrue(self.__grid.Update())
+
+    # Nothing should happen until we process the births.
+    self.__organism.reproduce(5)
+    self.assertEqual(2, len(self.__grid.registry))
+
+    # There are only two free cells around a corner with something next to it.
+    offspring = self.__grid.registry.process_births()
+    self.assertEqual(2, len(offspring))
+    self.assertEqual(set([(0, 1), (1, 1)]),
+                     set([child.get_position() for child in offspring]))
+    for child in offspring:
+      self.assertIn(child, self.__grid.registry)
+      self.assertEqual(attributes, child.get_all_attributes())
+    self.assertEqual([], self.__grid.registry.process_births())
+
+    # Now there's no room at all.
+    self.__organism.reproduce(1)
+    self.assertEqual([], self.__grid.registry.process_births())
+
+    # Dead organisms can't reproduce.
+    blocker.die()
+    self.__grid.registry.process_deletions()
+    self.__organism.reproduce(1)
+    self.__organism.die()
+    self.assertEqual([], self.__grid.registry.process_births())
+
 
 """ Tests the library class. """
 class TestLibrary(unittest.TestCase):
@@ -125,10 +397,11 @@ class TestLibrary(unittest.TestCase):
                 "key6": 6}
 
   def setUp(self):
-    grid_object.GridObject.clear_objects()
+    # Make sure we don't get species from a previous test.
+    library.Library._species_cache.clear()
 
     self.__library = library.Library("test_library")
-    self.__grid = C_Grid(10, 10)
+    self.__grid = Grid(10, 10)
 
     self.__make_test_library()
 
@@ -173,6 +446,84 @@ class TestLibrary(unittest.TestCase):
     self.assertEqual(organism.CommonName, "Test Species")
     self.assertEqual(organism.Taxonomy.Domain, "TestDomain")
 
+  """ Can we load a whole batch of organisms at once? """
+  def test_load_batch(self):
+    positions = [(0, 0), (1, 1), (2, 2)]
+    organisms = \
+        self.__library.load_organisms("test species", self.__grid, positions)
+
+    self.assertEqual(3, len(organisms))
+    for loaded, position in zip(organisms, positions):
+      self.assertEqual(position, loaded.get_position())
+      self.assertEqual("Test Species", loaded.CommonName)
+      self.assertIn(loaded, self.__grid.registry)
+    self.assertEqual(organisms,
+                     self.__grid.registry.get_group("TestGenus TestSpecies"))
+
+    # If one of them can't go on the grid, none of them should.
+    with self.assertRaises(organism.OrganismError):
+      self.__library.load_organisms("test species", self.__grid,
+                                    [(3, 3), (0, 0)])
+    self.assertEqual(3, len(self.__grid.registry))
+
+  """ Do overrides take precedence over what's in the library, without changing
+  it for anyone else? """
+  def test_overrides(self):
+    overrides = {"CommonName": "Overridden", "Taxonomy": {"Genus": "NewGenus"}}
+    overridden = self.__library.load_organism("test species", self.__grid,
+                                              (0, 0), overrides)
+    self.assertEqual("Overridden", overridden.CommonName)
+    self.assertEqual("NewGenus", overridden.Taxonomy.Genus)
+    self.assertEqual("TestSpecies", overridden.Taxonomy.Species)
+
+    normal = self.__library.load_organism("test species", self.__grid, (1, 1))
+    self.assertEqual("Test Species", normal.CommonName)
+    self.assertEqual("TestGenus", normal.Taxonomy.Genus)
+
+  """ Can we compile the library into a bundle, and load species from it? """
+  def test_bundle(self):
+    bundle_path = library.compile_library("test_library")
+    self.assertEqual(os.path.join("test_library", library.BUNDLE_NAME),
+                     bundle_path)
+
+    from_yaml = self.__library.load_species("test species")
+    library.Library._species_cache.clear()
+
+    # It should get used without parsing the yaml, so breaking the yaml
+    # shouldn't matter.
+    species_path = "test_library/test_species.yaml"
+    species_time = os.path.getmtime(species_path)
+    test_file = open(species_path, "w")
+    test_file.write("CommonName: [")
+    test_file.close()
+    os.utime(species_path, (species_time, species_time))
+
+    from_bundle = library.Library("test_library").load_species("Test Species")
+    self.assertEqual(from_yaml, from_bundle)
+    # We should also be able to use it directly.
+    library.Library._species_cache.clear()
+    self.assertEqual(from_yaml,
+                     library.Library(bundle_path).load_species("test species"))
+    with self.assertRaises(library.LibraryError):
+      library.Library(bundle_path).load_species("missing species")
+
+    # Once the yaml is newer, the bundle shouldn't get used anymore.
+    library.Library._species_cache.clear()
+    os.utime(species_path, (species_time + 10, species_time + 10))
+    with self.assertRaises(Exception):
+      library.Library("test_library").load_species("test species")
+
+    # Species that are missing things shouldn't compile.
+    test_file = open(species_path, "w")
+    test_file.write("CommonName: Test Species\n")
+    test_file.close()
+    with self.assertRaises(library.LibraryError):
+      library.compile_library("test_library")
+
+    # Things that aren't bundles should be rejected.
+    with self.assertRaises(library.BundleError):
+      library.Library(species_path).load_species("test species")
+
   """ Do the flatten_tree and expand_tree functions work properly? """
   def test_flatten_tree(self):
     expected_paths = [["key1", 1], ["key2", "key3", 3],
@@ -203,7 +554,7 @@ class TestVisualizations(unittest.TestCase):
   def setUp(self):
     test_attributes = {"Visualization": {"Color": "#00FF00"}}
 
-    self.__grid = C_Grid(100, 100)
+    self.__grid = Grid(100, 100)
     self.__grid_object = organism.Organism(self.__grid, (5, 5))
     self.__grid_object.set_attributes(test_attributes)
 
@@ -289,11 +640,27 @@ class TestUpdateHandler(unittest.TestCase):
       # Kind of a dumb way to detect if the handler ran, but it works.
       raise RuntimeError("Ran handler.")
 
-  def setUp(self):
-    # Reset the list of saved grid objects so that we end up with the right
-    # indices.
-    grid_object.GridObject.clear_objects()
+  """ An UpdateHandler subclass that runs on a schedule. """
+  class ScheduledHandler(update_handler.UpdateHandler):
+    def __init__(self):
+      super().__init__()
+
+      self.filter_attribute("CommonName", "Scheduled Species")
+      self.set_period(iterations=3, phase=1)
+
+      # The iteration times that the handler was run with.
+      self.times = []
+      # The number of iterations those times were made up of.
+      self.iterations = []
 
+    def run(self, organism, iteration_time):
+      self.times.append(iteration_time)
+
+    def run_batch(self, organisms, iteration_time, iterations=1):
+      self.iterations.append(iterations)
+      super().run_batch(organisms, iteration_time, iterations)
+
+  def setUp(self):
     test_attributes1 = {"CommonName": "Test Species",
         "Taxonomy": {"Domain": "TestDomain"}}
     test_attributes2 = copy.deepcopy(test_attributes1)
@@ -301,7 +668,7 @@ class TestUpdateHandler(unittest.TestCase):
     test_attributes3 = copy.deepcopy(test_attributes1)
     test_attributes3["Taxonomy"]["Domain"] = "TestDomain3"
 
-    grid = C_Grid(10, 10)
+    grid = Grid(10, 10)
 
     # Simply instantiating our handler should register it.
     self.__test_handler = TestUpdateHandler.TestingHandler()
@@ -336,5 +703,912 @@ class TestUpdateHandler(unittest.TestCase):
     with self.assertRaises(RuntimeError):
       self.__organism2.update(0)
 
+  """ Does running a handler on a batch of organisms apply the filters? """
+  def test_run_batch(self):
+    # The dynamic filter should block this one.
+    self.__test_handler.run_batch([self.__organism1], 0)
+
+    with self.assertRaises(RuntimeError):
+      self.__test_handler.run_batch([self.__organism1, self.__organism2], 0)
+
+  """ Does the dispatch table group organisms by handler correctly? """
+  def test_dispatch_table(self):
+    table = update_handler.DispatchTable()
+    table.add_organism(self.__organism1)
+    table.add_organism(self.__organism2)
+    table.add_organism(self.__organism3)
+
+    # Organism 3 doesn't pass the static filters.
+    self.assertEqual([self.__organism1, self.__organism2],
+                     table.get_organisms(self.__test_handler))
+
+    table.remove_organisms([self.__organism1])
+    self.assertEqual([self.__organism2],
+                     table.get_organisms(self.__test_handler))
+
+  """ Does every organism go through one handler before the next handler runs?
+  """
+  def test_dispatch_order(self):
+    ran = []
+
+    class OrderedHandler(update_handler.UpdateHandler):
+      def __init__(self, name):
+        super().__init__()
+        self.filter_attribute("CommonName", "Ordered Species")
+        self.__name = name
+
+      def run(self, organism, iteration_time):
+        ran.append((self.__name, organism))
+
+    OrderedHandler("First")
+    OrderedHandler("Second")
+
+    grid = Grid(10, 10)
+    table = update_handler.DispatchTable()
+    organisms = []
+    for i in range(0, 3):
+      ordered = organism.Organism(grid, (i, 0))
+      ordered.set_attributes({"CommonName": "Ordered Species"})
+      table.add_organism(ordered)
+      organisms.append(ordered)
+
+    table.run(10)
+    self.assertEqual([("First", ordered) for ordered in organisms] +
+                     [("Second", ordered) for ordered in organisms], ran)
+
+    # Removing one moves the last one into its place.
+    ran.clear()
+    table.remove_organisms([organisms[0]])
+    table.run(10)
+    self.assertEqual([("First", organisms[2]), ("First", organisms[1]),
+                      ("Second", organisms[2]), ("Second", organisms[1])], ran)
+
+  """ Do handlers only run when they are scheduled to? """
+  def test_scheduling(self):
+    handler = TestUpdateHandler.ScheduledHandler()
+
+    scheduled = organism.Organism(Grid(10, 10), (5, 5))
+    scheduled.set_attributes({"CommonName": "Scheduled Species"})
+    table = update_handler.DispatchTable()
+    table.add_organism(scheduled)
+
+    # It should run on iterations 1, 4, and 7, and get all the time since it
+    # last ran each time.
+    for i in range(0, 8):
+      table.run(10)
+    self.assertEqual([20, 30, 30], handler.times)
+    self.assertEqual([2, 3, 3], handler.iterations)
+
+    # Try scheduling it in simulation time instead.
+    handler.set_period(seconds=25)
+    self.assertFalse(handler.is_due(0, 0, 10))
+    self.assertFalse(handler.is_due(1, 10, 20))
+    self.assertTrue(handler.is_due(2, 20, 30))
+    self.assertFalse(handler.is_due(3, 30, 40))
+    self.assertTrue(handler.is_due(4, 40, 50))
+
+    # Invalid periods should be rejected.
+    with self.assertRaises(update_handler.HandlerError):
+      handler.set_period(iterations=2, seconds=10)
+    with self.assertRaises(update_handler.HandlerError):
+      handler.set_period(iterations=0)
+
+  """ Do registered handler classes only get instantiated when they are
+  needed? """
+  def test_register(self):
+    instances = []
+
+    @update_handler.register_handler
+    class LazyHandler(update_handler.UpdateHandler):
+      def __init__(self):
+        super().__init__()
+        self.filter_attribute("CommonName", "Lazy Species")
+        instances.append(self)
+
+      def run(self, organism, iteration_time):
+        pass
+
+    self.assertEqual([], instances)
+    self.assertIn(LazyHandler, update_handler.UpdateHandler.pending_handlers)
+
+    # Creating an organism should load it.
+    organism.Organism(Grid(10, 10), (0, 0)).set_attributes({})
+    self.assertEqual(1, len(instances))
+    self.assertIn(instances[0], update_handler.UpdateHandler.handlers)
+
+    # It should only ever be loaded once.
+    update_handler.UpdateHandler.load_handlers()
+    self.assertEqual(1, len(instances))
+
+  """ Do we only check the static filters once for each species? """
+  def test_species_caching(self):
+    attributes = {"CommonName": "Test Species",
+        "Taxonomy": {"Domain": "TestDomain", "Genus": "Test",
+                     "Species": "Species"}}
+    grid = Grid(10, 10)
+    organism1 = organism.Organism(grid, (5, 5))
+    organism2 = organism.Organism(grid, (6, 6))
+    organism1.set_attributes(attributes)
+    organism2.set_attributes(copy.deepcopy(attributes))
+
+    cached = update_handler.UpdateHandler.handlers_by_species["Test Species"]
+    self.assertIn(self.__test_handler, cached)
+    self.assertEqual(organism1.get_handlers(), organism2.get_handlers())
+
+  """ Do organisms that get spawned together get set up together? """
+  def test_setup_batch(self):
+    batches = []
+
+    class BatchHandler(update_handler.UpdateHandler):
+      def __init__(self):
+        super().__init__()
+        self.filter_attribute("CommonName", "Batch Species")
+
+      def setup_batch(self, organisms):
+        batches.append(len(organisms))
+
+      def run(self, organism, iteration_time):
+        pass
+
+    handler = BatchHandler()
+    grid = Grid(10, 10)
+    spawned = organism.Organism.spawn(grid, [(0, 0), (1, 1), (2, 2)],
+                                      {"CommonName": "Batch Species"})
+    self.assertEqual([3], batches)
+    for batch_organism in spawned:
+      self.assertIn(handler, batch_organism.get_handlers())
+
+    # Plants should still each get their own metabolism.
+    plants = library.Library("species_library").load_organisms(
+        "agrostis stolonifera", grid, [(5, 5), (6, 6)])
+    self.assertIsNot(plants[0].metabolism, plants[1].metabolism)
+    self.assertEqual(plants[0].metabolism.energy(),
+                     plants[1].metabolism.energy())
+
+  """ Can the configuration make PlantHandler run less often in a whole
+  simulation? """
+  def test_configured_period(self):
+    update_handler.UpdateHandler.load_handlers()
+    plant_handler = None
+    for handler in update_handler.UpdateHandler.handlers:
+      if type(handler) == update_handler.PlantHandler:
+        plant_handler = handler
+
+    # Keep track of when it runs.
+    batches = []
+    run_batch = plant_handler.run_batch
+    def record_batch(organisms, iteration_time, iterations=1):
+      batches.append(iterations)
+      run_batch(organisms, iteration_time, iterations)
+    plant_handler.run_batch = record_batch
+
+    try:
+      simulation = Simulation(4, 4, 10,
+                              handlers={"PlantHandler": {"Iterations": 3}})
+      simulation.add_organisms("species_library", "agrostis stolonifera", 4)
+      simulation.run(7)
+      # It should run on iterations 0, 3, and 6.
+      self.assertEqual([1, 3, 3], batches)
+
+      # The next simulation should go back to running it every iteration.
+      del batches[:]
+      simulation = Simulation(4, 4, 10)
+      simulation.add_organisms("species_library", "agrostis stolonifera", 4)
+      simulation.run(3)
+      self.assertEqual([1, 1, 1], batches)
+
+      # Handlers that don't exist should be rejected.
+      with self.assertRaises(update_handler.HandlerError):
+        update_handler.UpdateHandler.configure_periods(
+            {"NonexistentHandler": {"Iterations": 2}})
+    finally:
+      del plant_handler.run_batch
+
+
+""" Runs the base configuration from TestSweep once, in this process, the same
+way that a sweep would. This is for testing features that need a whole
+simulation.
+iterations: How many iterations to run it for.
+sections: Sections of the configuration to add or replace.
+Returns: The results of the run. """
+def _run_simulation(iterations, **sections):
+  config = copy.deepcopy(TestSweep._BASE_CONFIG)
+  config.update(sections)
+  return sweep.Sweep(config, {}, iterations).run(processes=1)[0]
+
+
+""" Tests for parameter sweeps. """
+class TestSweep(unittest.TestCase):
+  _BASE_CONFIG = {"GridXSize": 10, "GridYSize": 10, "IterationTime": 10,
+                  "Organisms": [{"Name": "agrostis stolonifera",
+                                 "Library": "species_library",
+                                 "Quantity": 3}]}
+
+  """ Do we get a run with the right configuration for every combination of
+  parameters? """
+  def test_runs(self):
+    parameters = {"IterationTime": [10, 20],
+                  "Organisms.Agrostis Stolonifera.Quantity": [1, 2, 3],
+                  "Organisms.agrostis stolonifera.Overrides.Vision": [5]}
+    runs = sweep.Sweep(self._BASE_CONFIG, parameters, 5,
+                       repetitions=2).get_runs()
+    self.assertEqual(12, len(runs))
+
+    # Every run should have its own seed.
+    self.assertEqual(list(range(0, 12)), [run[2] for run in runs])
+
+    combinations = set()
+    for number, parameters, seed, config, iterations in runs:
+      plant = config["Organisms"][0]
+      self.assertEqual(parameters["IterationTime"], config["IterationTime"])
+      self.assertEqual(parameters["Organisms.Agrostis Stolonifera.Quantity"],
+                       plant["Quantity"])
+      self.assertEqual({"Vision": 5}, plant["Overrides"])
+      combinations.add((config["IterationTime"], plant["Quantity"]))
+    self.assertEqual(6, len(combinations))
+
+    # The base config should be untouched.
+    self.assertNotIn("Overrides", self._BASE_CONFIG["Organisms"][0])
+
+    with self.assertRaises(sweep.SweepError):
+      sweep.Sweep(self._BASE_CONFIG, {"Organisms.nothing.Quantity": [1]},
+                  5).get_runs()
+
+  """ Can we actually run a sweep and get statistics back? """
+  def test_run(self):
+    parameters = {"Organisms.agrostis stolonifera.Quantity": [2, 4]}
+    results = sweep.Sweep(self._BASE_CONFIG, parameters, 3).run(processes=2)
+
+    self.assertEqual([0, 1], [result["Run"] for result in results])
+    for result, quantity in zip(results, [2, 4]):
+      self.assertNotIn("Error", result)
+      self.assertEqual(3, result["Iterations"])
+      self.assertEqual(30, result["SimulationTime"])
+      self.assertEqual({"Agrostis Stolonifera": quantity},
+                       result["InitialPopulation"])
+
+  """ Do organisms that are ready to reproduce actually do it? """
+  def test_births(self):
+    parameters = {"Organisms.agrostis stolonifera.Overrides.Reproduction":
+                  [{"EnergyThreshold": 0, "LitterSize": 1, "Interval": 0}]}
+    results = sweep.Sweep(self._BASE_CONFIG, parameters, 2).run(processes=1)
+
+    self.assertNotIn("Error", results[0])
+    # Each plant should have had one offspring every iteration.
+    self.assertEqual({"Agrostis Stolonifera": 12},
+                     results[0]["FinalPopulation"])
+
+
+""" Tests for the statistics collector. """
+class TestStatisticsCollector(unittest.TestCase):
+  def setUp(self):
+    self.__grid = Grid(10, 10)
+
+    prey_attributes = {"Taxonomy": {"Genus": "Prey", "Species": "Species"},
+        "Metabolism": {"Animal": {"PredatorFactorStrength": -1,
+        "PredatorFactorVisibility": -1}}}
+    predator_attributes = {"Prey": "Prey Species",
+        "Taxonomy": {"Genus": "Predator", "Species": "Species"}, "Metabolism":
+        {"Animal": {"PreyFactorStrength": 1,
+        "PreyFactorVisibility": -1}}}
+
+    self.__prey = []
+    for i in range(0, 3):
+      prey = organism.Organism(self.__grid, (i, 0))
+      prey.set_attributes(copy.deepcopy(prey_attributes))
+      prey.metabolism = AnimalMetabolism(0.5 * (i + 1), 0.1, 310.15, 0.5, 0.37)
+      self.__prey.append(prey)
+    self.__predator = organism.Organism(self.__grid, (5, 5))
+    self.__predator.set_attributes(predator_attributes)
+
+  def tearDown(self):
+    if os.path.exists("test_statistics.csv"):
+      os.remove("test_statistics.csv")
+
+  """ Do we record the right statistics for each species? """
+  def test_sample(self):
+    collector = statistics_collector.StatisticsCollector(
+        "test_statistics.csv", interval=2, buffer_size=3)
+    self.assertTrue(collector.is_due(4))
+    self.assertFalse(collector.is_due(5))
+
+    collector.sample(self.__grid.registry, 0, 0)
+
+    # One of the prey gets eaten.
+    self.__prey[0].die(self.__predator)
+    collector.record_deaths(self.__grid.registry.process_deletions())
+    # This should overflow the buffer and cause a flush.
+    collector.sample(self.__grid.registry, 2, 20)
+    collector.close()
+
+    output = open("test_statistics.csv")
+    rows = list(csv.DictReader(output))
+    output.close()
+
+    self.assertEqual(4, len(rows))
+    first_prey, first_predator, prey, predator = rows
+    self.assertEqual("Prey Species", first_prey["Species"])
+    self.assertEqual("3", first_prey["Count"])
+    self.assertAlmostEqual(3.0, float(first_prey["Biomass"]))
+    self.assertAlmostEqual(1.0, float(first_prey["MeanMass"]))
+    self.assertAlmostEqual(1.0 / 6.0, float(first_prey["MassVariance"]))
+    self.assertEqual("0", first_prey["Deaths"])
+
+    self.assertEqual("2", prey["Iteration"])
+    self.assertEqual("20.0", prey["Time"])
+    self.assertEqual("2", prey["Count"])
+    self.assertAlmostEqual(2.5, float(prey["Biomass"]))
+    self.assertEqual("1", prey["Deaths"])
+    self.assertEqual("1", prey["Eaten"])
+
+    # The predator doesn't have a metabolism, but it still gets counted.
+    self.assertEqual("Predator Species", predator["Species"])
+    self.assertEqual("1", predator["Count"])
+    self.assertEqual("0.0", predator["MeanEnergy"])
+    self.assertEqual("1", predator["Kills"])
+    self.assertEqual("0", predator["Deaths"])
+
+  """ Do we reject configurations that make no sense? """
+  def test_config(self):
+    with self.assertRaises(statistics_collector.StatisticsError):
+      statistics_collector.StatisticsCollector.from_config({"Interval": 2})
+    with self.assertRaises(statistics_collector.StatisticsError):
+      statistics_collector.StatisticsCollector("test_statistics.csv",
+                                               output_format="xml")
+    with self.assertRaises(statistics_collector.StatisticsError):
+      statistics_collector.StatisticsCollector.from_config(
+          {"Output": "test_statistics.csv", "FlushInterval": 0})
+
+
+""" Tests for placing organisms on the grid. """
+class TestPlacement(unittest.TestCase):
+  def setUp(self):
+    self.__placer = placement.Placer(20, 10, random.Random(1))
+
+  """ Can we fill up the entire grid without repeating any cells? """
+  def test_uniform(self):
+    positions = self.__placer.place(200)
+    self.assertEqual(200, len(set(positions)))
+    for x, y in positions:
+      self.assertTrue(0 <= x < 20 and 0 <= y < 10)
+    self.assertEqual(0, self.__placer.get_free_cells())
+
+    with self.assertRaises(placement.PlacementError):
+      self.__placer.place(1)
+
+  """ Do we only place organisms where the density map allows it? """
+  def test_density(self):
+    # Only the right half of the grid is allowed.
+    positions = self.__placer.place(100, {"Type": "Density",
+                                          "Map": [[0, 1], [0, 1]]})
+    self.assertEqual(100, len(set(positions)))
+    for x, y in positions:
+      self.assertGreaterEqual(x, 10)
+
+    # Now it's full.
+    with self.assertRaises(placement.PlacementError):
+      self.__placer.place(1, {"Type": "Density", "Map": [[0, 1]]})
+
+  """ Do clustered organisms end up near the clusters? """
+  def test_clustered(self):
+    self.__placer.place(10)
+    positions = self.__placer.place_clustered(20, 1, 1.0)
+    self.assertEqual(20, len(positions))
+    self.assertEqual(170, self.__placer.get_free_cells())
+    self.assertEqual(30, len(set(positions + self.__placer.place(10))))
+
+    # They should be clumped together.
+    xs = [x for x, y in positions]
+    self.assertLess(max(xs) - min(xs), 10)
+
+
+""" Tests for the environment. """
+class TestEnvironment(unittest.TestCase):
+  def setUp(self):
+    # The left half is dark, and the right half gets twice the normal sunlight.
+    # The bottom left corner is blocked.
+    self.__config = {"Sunlight": [[0, 2]], "Blocked": [[0, 0], [1, 0]],
+                     "DayLength": 100}
+    self.__environment = Environment.from_config(self.__config, 4, 4)
+
+  """ Do the rasters get stretched to cover the grid? """
+  def test_config(self):
+    self.assertEqual(0, self.__environment.GetBaseSunlight(1, 3))
+    self.assertEqual(2, self.__environment.GetBaseSunlight(2, 0))
+    self.assertEqual(1, self.__environment.GetMovementCost(0, 0))
+    self.assertEqual([(0, 2), (1, 2), (0, 3), (1, 3)],
+                     self.__environment.get_blocked_cells())
+
+    # It starts at midnight.
+    self.assertEqual(0, self.__environment.GetSunlight(2, 0))
+    self.__environment.SetTime(50)
+    self.assertEqual(2, self.__environment.GetSunlight(2, 0))
+
+    with self.assertRaises(EnvironmentConfigError):
+      Environment.from_config({"MovementCost": [[1, 0]]}, 4, 4)
+    with self.assertRaises(EnvironmentConfigError):
+      Environment.from_config({"Sunlight": [[1, 1], [1]]}, 4, 4)
+
+  """ Does the grid keep things out of blocked cells? """
+  def test_blocked(self):
+    grid = Grid(4, 4)
+    grid.set_environment(self.__environment)
+    with self.assertRaises(organism.OrganismError):
+      organism.Organism(grid, (1, 2))
+
+    self.assertTrue(grid.Update())
+    self.assertEqual(6, len(grid.get_vacant_locations((1, 1))))
+
+    with self.assertRaises(GridError):
+      Grid(5, 5).set_environment(self.__environment)
+
+  """ Do plants get their sunlight from the environment? """
+  def test_plants(self):
+    self.__environment.SetTime(50)
+    grid = Grid(4, 4)
+    grid.set_environment(self.__environment)
+    dark, bright = library.Library("species_library").load_organisms(
+        "agrostis stolonifera", grid, [(0, 0), (3, 0)])
+
+    start_energy = dark.metabolism.energy()
+    dark.metabolism.Update(10)
+    self.assertEqual(start_energy, dark.metabolism.energy())
+    bright.metabolism.Update(10)
+    self.assertGreater(bright.metabolism.energy(), start_energy)
+
+  """ Does a whole simulation stay out of blocked cells? """
+  def test_simulation(self):
+    result = _run_simulation(1, GridXSize=4, GridYSize=4,
+                             Environment=self.__config,
+                             Organisms=[{"Name": "agrostis stolonifera",
+                                         "Library": "species_library",
+                                         "Quantity": 12}])
+
+    # There's only room for the plants outside of the blocked corner.
+    self.assertNotIn("Error", result)
+    self.assertEqual({"Agrostis Stolonifera": 12}, result["InitialPopulation"])
+
+
+""" Tests for the adaptive timestep controller. """
+class TestAdaptiveTimestep(unittest.TestCase):
+  def setUp(self):
+    self.__timestep = timestep.AdaptiveTimestep(10, 5, 40,
+                                                target_activity=0.1,
+                                                target_energy_change=0.01)
+
+  """ Does the iteration time go up and down with activity, within bounds? """
+  def test_update(self):
+    self.assertEqual(10, self.__timestep.get_iteration_time())
+
+    # Nothing is happening, so it should grow as fast as it can, up to the max.
+    self.assertEqual(20, self.__timestep.update(10, 0, 100))
+    self.assertEqual(40, self.__timestep.update(10, 0, 100))
+    self.assertEqual(40, self.__timestep.update(10, 0, 100))
+
+    # Half of everything moved, which is way more than we want.
+    self.assertEqual(20, self.__timestep.update(10, 5, 100))
+    # So did the energy.
+    self.assertEqual(10, self.__timestep.update(10, 0, 50))
+    self.assertEqual(5, self.__timestep.update(10, 0, 100))
+    self.assertEqual(5, self.__timestep.update(10, 0, 200))
+
+    # Half of the target should make it grow, but not as fast as it can.
+    self.assertEqual(9, self.__timestep.update(10, 0, 201))
+
+    with self.assertRaises(timestep.TimestepError):
+      timestep.AdaptiveTimestep(10, 0, 40)
+    with self.assertRaises(timestep.TimestepError):
+      timestep.AdaptiveTimestep.from_config({"MinIterationTime": 1}, 10)
+
+  """ Does a quiet simulation speed up? """
+  def test_simulation(self):
+    result = _run_simulation(5, AdaptiveTime={"MinIterationTime": 10,
+                                              "MaxIterationTime": 1000,
+                                              "TargetEnergyChange": 1})
+
+    self.assertNotIn("Error", result)
+    self.assertEqual(5, result["Iterations"])
+    self.assertGreater(result["SimulationTime"], 50)
+    self.assertLessEqual(result["SimulationTime"], 5000)
+
+
+""" Tests for the domain module. """
+class TestDomain(unittest.TestCase):
+  _CONFIG = {"GridXSize": 8, "GridYSize": 4, "IterationTime": 10,
+             "Organisms": [{"Name": "agrostis stolonifera",
+                            "Library": "species_library",
+                            "Quantity": 8},
+                           {"Name": "sciurus carolinensis",
+                            "Library": "species_library",
+                            "Quantity": 4}]}
+
+  """ Do columns get split evenly? """
+  def test_split(self):
+    self.assertEqual([(0, 3), (3, 6), (6, 8)], domain.split_columns(8, 3))
+    self.assertEqual([(0, 5)], domain.split_columns(5, 1))
+
+    with self.assertRaises(domain.DomainError):
+      domain.split_columns(2, 3)
+
+  """ Does each worker get the right part of the grid? """
+  def test_subdomain(self):
+    transports = domain.PipeTransport.create(3)
+
+    first = domain.Subdomain(9, 4, transports[0])
+    self.assertEqual((4, 4), first.get_grid_size())
+    middle = domain.Subdomain(9, 4, transports[1])
+    self.assertEqual((5, 4), middle.get_grid_size())
+    self.assertEqual((0, 2), middle.to_local((2, 2)))
+    self.assertEqual((2, 2), middle.to_global((0, 2)))
+    self.assertEqual(1, middle.get_owner(5))
+    self.assertEqual(2, middle.get_owner(8))
+
+    # Only positions in the middle strip belong to it.
+    positions = [(0, 0), (3, 1), (5, 2), (6, 3)]
+    self.assertEqual([(1, 1), (3, 2)], middle.claim(positions))
+
+    with self.assertRaises(domain.DomainError):
+      domain.Subdomain(9, 4, transports[0], halo=4)
+
+  """ Do organisms along the edge of a strip show up in the neighbor's halo? """
+  def test_halo(self):
+    transports = domain.PipeTransport.create(2)
+    first = domain.Subdomain(4, 4, transports[0])
+    second = domain.Subdomain(4, 4, transports[1])
+    first_grid = Grid(*first.get_grid_size())
+    second_grid = Grid(*second.get_grid_size())
+
+    # This is in the last column of the first strip.
+    attributes = {"Taxonomy": {"Genus": "Edge", "Species": "Species"}}
+    organism.Organism.spawn(first_grid, [first.to_local((1, 2))], attributes)
+
+    # Both of them have to exchange at the same time.
+    thread = threading.Thread(target=second.exchange, args=(second_grid,))
+    thread.start()
+    self.assertEqual(([], []), first.exchange(first_grid))
+    thread.join()
+    self.assertTrue(first_grid.Update())
+    self.assertTrue(second_grid.Update())
+
+    # The neighbor should have a copy of it that isn't registered anywhere.
+    x, y = second.to_local((1, 2))
+    group = second_grid.registry.get_group_id("Edge Species")
+    self.assertEqual(group, second_grid.get_groups()[y, x])
+    self.assertEqual(0, len(second_grid.registry))
+    self.assertEqual(0, first.get_migrations())
+
+  """ Can we run a simulation split between workers? """
+  def test_run(self):
+    results = domain.run_local(self._CONFIG, 2, 5)
+
+    self.assertEqual(5, results["Iterations"])
+    self.assertEqual({"Agrostis Stolonifera": 8, "Sciurus Carolinensis": 4},
+                     results["InitialPopulation"])
+
+    # Animals on narrow strips with nothing to eat them should move between
+    # them a lot, without any getting lost along the way.
+    config = {"GridXSize": 9, "GridYSize": 10, "IterationTime": 10,
+              "Organisms": [{"Name": "sciurus carolinensis",
+                             "Library": "species_library",
+                             "Quantity": 30}]}
+    results = domain.run_local(config, 3, 40)
+    self.assertGreater(results["Migrations"], 0)
+    self.assertEqual({"Sciurus Carolinensis": 30},
+                     results["FinalPopulation"])
+
+    with self.assertRaises(domain.DomainError):
+      config = copy.deepcopy(self._CONFIG)
+      config["AdaptiveTime"] = {"MinIterationTime": 10,
+                                "MaxIterationTime": 100}
+      domain.run_local(config, 1, 5)
+
+
+""" Tests for the control module. """
+class TestControl(unittest.TestCase):
+  def setUp(self):
+    self.__directory = tempfile.mkdtemp()
+    self.__path = os.path.join(self.__directory, "control.sock")
+
+  def tearDown(self):
+    shutil.rmtree(self.__directory)
+
+  """ Does the timer average each phase? """
+  def test_phase_timer(self):
+    timer = control.PhaseTimer()
+    for i in range(0, 2):
+      timer.start()
+      timer.mark("First")
+      time.sleep(0.01)
+      timer.mark("Second")
+
+    times = timer.take()
+    self.assertEqual(["First", "Second"], sorted(times.keys()))
+    self.assertGreater(times["Second"], times["First"])
+    self.assertGreaterEqual(times["Second"], 0.01)
+    # It should start over.
+    self.assertEqual({}, timer.take())
+
+  """ Do commands make it to the simulation and back? """
+  def test_commands(self):
+    controller = control.Controller()
+    server = multiprocessing.Process(target=controller.serve,
+                                     args=(self.__path,))
+    server.start()
+
+    # Stands in for the simulation loop.
+    commands = []
+    def handler(command, arguments):
+      if command == "bad":
+        raise control.ControlError("Bad command.")
+      if command == "broken":
+        raise OSError("Broken command.")
+      commands.append((command, arguments))
+      return len(commands)
+    done = threading.Event()
+    def simulate():
+      while not done.is_set():
+        controller.poll(handler)
+        time.sleep(0.001)
+    simulation = threading.Thread(target=simulate)
+    simulation.start()
+
+    try:
+      for i in range(0, 100):
+        if os.path.exists(self.__path):
+          break
+        time.sleep(0.01)
+      self.assertFalse(controller.is_active())
+      self.assertIsNone(controller.get_timer())
+
+      # The socket file shows up before the server is listening on it.
+      for i in range(0, 100):
+        try:
+          replies = control.send_command(self.__path, "rate", [5])
+          break
+        except ConnectionRefusedError:
+          time.sleep(0.01)
+      self.assertEqual({"ok": True, "result": 1}, json.loads(replies.readline()))
+      replies.close()
+      self.assertEqual([("rate", [5])], commands)
+
+      replies = control.send_command(self.__path, "bad")
+      self.assertEqual({"ok": False, "error": "Bad command."},
+                       json.loads(replies.readline()))
+      replies.close()
+
+      # Other errors should get sent back too, without stopping anything.
+      replies = control.send_command(self.__path, "broken")
+      self.assertEqual({"ok": False, "error": "OSError: Broken command."},
+                       json.loads(replies.readline()))
+      replies.close()
+      self.assertTrue(simulation.is_alive())
+
+      # Watching should keep asking for statistics.
+      replies = control.send_command(self.__path, "watch", [0.01])
+      for i in range(0, 3):
+        self.assertTrue(json.loads(replies.readline())["ok"])
+      replies.close()
+      self.assertGreaterEqual(commands.count(("stats", [])), 3)
+
+    finally:
+      done.set()
+      simulation.join()
+      server.terminate()
+      server.join()
+
+
+""" Tests for the profiler module. """
+class TestProfiler(unittest.TestCase):
+  def setUp(self):
+    self.__directory = tempfile.mkdtemp()
+    self.__path = os.path.join(self.__directory, "profile.json")
+
+  def tearDown(self):
+    shutil.rmtree(self.__directory)
+
+  """ Does a profile have both Python and C++ in it? """
+  def test_profile(self):
+    grid = Grid(10, 10)
+    sampler = profiler.SamplingProfiler(interval=0.001)
+
+    def update_grid():
+      grid.Update()
+
+    sampler.start(0.05, self.__path)
+    with self.assertRaises(profiler.ProfilerError):
+      sampler.start(0.05, self.__path)
+    # It should stop sampling by itself, but nothing should get written until
+    # we poll.
+    for i in range(0, 100):
+      update_grid()
+      time.sleep(0.001)
+    self.assertTrue(sampler.is_running())
+    self.assertFalse(os.path.exists(self.__path))
+    sampler.poll()
+    self.assertFalse(sampler.is_running())
+
+    with open(self.__path) as trace_file:
+      events = json.load(trace_file)["traceEvents"]
+    python = [event for event in events if event.get("cat") == "python"]
+    native = [event for event in events if event.get("cat") == "native"]
+
+    self.assertIn("test_profile", [event["name"] for event in python])
+    self.assertTrue(native)
+    for event in native:
+      self.assertEqual("Grid::Update", event["name"])
+      self.assertGreaterEqual(event["dur"], 0)
+
+    # Nothing should get recorded once it's stopped.
+    update_grid()
+    self.assertEqual(len(native), len(profiler.get_native_events()))
+
+
+""" Tests for the scheduler module. """
+class TestScheduler(unittest.TestCase):
+  """ A clock that only moves when we say so. """
+  class FakeClock:
+    def __init__(self):
+      self.now = 0.0
+
+    def __call__(self):
+      return self.now
+
+    def sleep(self, seconds):
+      self.now += seconds
+
+  def setUp(self):
+    self.__clock = self.FakeClock()
+    self.__scheduler = scheduler.Scheduler(self.__clock, self.__clock.sleep)
+    # The names of the phases, in the order they ran.
+    self.__ran = []
+
+  """ Makes a callback for a phase that takes a certain amount of time.
+  name: The name of the phase.
+  duration: How long it takes.
+  Returns: The callback. """
+  def __make_callback(self, name, duration=0.0):
+    def callback():
+      self.__ran.append(name)
+      self.__clock.now += duration
+    return callback
+
+  """ Do phases run on their deadlines, without drifting? """
+  def test_deadlines(self):
+    self.__scheduler.add_phase("Fast", 10, self.__make_callback("Fast", 0.01))
+    self.__scheduler.add_phase("Slow", 2, self.__make_callback("Slow"),
+                               priority=1)
+
+    # Everything runs right away, in order of priority.
+    self.assertAlmostEqual(0.09, self.__scheduler.run_once())
+    self.assertEqual(["Slow", "Fast"], self.__ran)
+
+    for i in range(0, 10):
+      self.__clock.sleep(self.__scheduler.run_once())
+    # Time spent running doesn't push the next deadline back.
+    self.assertAlmostEqual(1.0, self.__clock.now)
+    self.assertEqual(10, self.__ran.count("Fast"))
+    self.assertEqual(2, self.__ran.count("Slow"))
+
+    stats = self.__scheduler.get_stats()
+    self.assertEqual(0, stats["Fast"]["Overruns"])
+    self.assertEqual(2.0, stats["Slow"]["Rate"])
+
+    with self.assertRaises(scheduler.SchedulerError):
+      self.__scheduler.add_phase("Fast", 1, self.__make_callback("Fast"))
+
+  """ Do overruns get caught up or skipped, depending on the policy? """
+  def test_overruns(self):
+    stall = {"Length": 0.35}
+    def stalling():
+      self.__ran.append("Stall")
+      self.__clock.now += stall["Length"]
+      stall["Length"] = 0.0
+    self.__scheduler.add_phase("Stall", 10, stalling,
+                               policy=scheduler.Phase.CATCH_UP)
+    self.__scheduler.add_phase("Skip", 10, self.__make_callback("Skip"),
+                               priority=1)
+
+    self.assertEqual(0.0, self.__scheduler.run_once())
+    # The catching up phase is three runs behind, and should run every cycle
+    # until it catches up.
+    self.assertEqual(0.0, self.__scheduler.run_once())
+    self.assertEqual(0.0, self.__scheduler.run_once())
+    self.assertAlmostEqual(0.05, self.__scheduler.run_once())
+    self.assertEqual(4, self.__ran.count("Stall"))
+    # The skipping one runs once when it's late, and skips the rest.
+    self.assertEqual(2, self.__ran.count("Skip"))
+
+    stats = self.__scheduler.get_stats()
+    self.assertEqual(3, stats["Stall"]["Overruns"])
+    self.assertEqual(0, stats["Stall"]["Skipped"])
+    self.assertEqual(1, stats["Skip"]["Overruns"])
+    self.assertEqual(2, stats["Skip"]["Skipped"])
+
+  """ Does going over budget put off less important phases? """
+  def test_budget(self):
+    self.__scheduler.add_phase("Simulation", 10,
+                               self.__make_callback("Simulation", 0.05),
+                               priority=1, budget=0.01)
+    self.__scheduler.add_phase("Render", 30, self.__make_callback("Render"))
+
+    self.__scheduler.run_once()
+    self.assertEqual(["Simulation"], self.__ran)
+    # Now it gets its turn, but it's late, so it skips ahead.
+    self.assertAlmostEqual(1.0 / 60, self.__scheduler.run_once())
+    self.assertEqual(["Simulation", "Render"], self.__ran)
+
+    stats = self.__scheduler.get_stats()
+    self.assertEqual(1, stats["Simulation"]["OverBudget"])
+    self.assertEqual(1, stats["Render"]["Deferred"])
+
+    # Slowing down should move the next deadline up.
+    phase = self.__scheduler.get_phase("Simulation")
+    phase.set_rate(20)
+    self.assertAlmostEqual(0.05, phase.get_deadline())
+
+
+""" Tests for the memory_report module. """
+class TestMemoryReport(unittest.TestCase):
+  def setUp(self):
+    self.__directory = tempfile.mkdtemp()
+    self.__path = os.path.join(self.__directory, "memory.jsonl")
+
+  def tearDown(self):
+    shutil.rmtree(self.__directory)
+
+  """ Does a report account for the C++ and Python sides? """
+  def test_report(self):
+    reporter = memory_report.MemoryReporter(self.__path, interval=5)
+    self.assertTrue(reporter.is_due(10))
+    self.assertFalse(reporter.is_due(11))
+    reporter.start()
+
+    try:
+      grid = Grid(10, 10)
+      attributes = {"Taxonomy": {"Genus": "Plant", "Species": "Species"}}
+      plants = [organism.Organism(grid, (i, 0)) for i in range(0, 4)]
+      for plant in plants:
+        plant.set_attributes(copy.deepcopy(attributes))
+      self.assertTrue(grid.Update())
+
+      first = reporter.report(0, len(grid.registry))
+      self.assertEqual(4, first["Population"])
+      self.assertGreaterEqual(first["Native"]["Organisms"]["Count"], 4)
+      self.assertGreaterEqual(first["Native"]["GridChunks"]["Count"], 1)
+      self.assertIn("Organisms", first["Python"])
+      self.assertGreater(first["BytesPerOrganism"], 0)
+      self.assertNotIn("BytesPerOrganismChange", first)
+
+      plants[0].die()
+      self.assertTrue(grid.Update())
+      second = reporter.report(5, 3)
+      self.assertIn("BytesPerOrganismChange", second)
+    finally:
+      reporter.close()
+
+    with open(self.__path) as report_file:
+      reports = [json.loads(line) for line in report_file]
+    self.assertEqual([0, 5], [report["Iteration"] for report in reports])
+
+    # Without tracing, we only get the C++ side.
+    report = memory_report.take_report(3)
+    self.assertIsNone(report["Python"])
+    self.assertIn("MovementFactors", report["Native"])
+
+    with self.assertRaises(memory_report.MemoryReportError):
+      memory_report.MemoryReporter.from_config({"Interval": 5})
+
+  """ Does a simulation write reports as it goes? """
+  def test_simulation(self):
+    output = os.path.join(self.__directory, "memory_{run}.jsonl")
+    result = _run_simulation(4, Memory={"Output": output, "Interval": 2})
+    self.assertNotIn("Error", result)
+
+    with open(os.path.join(self.__directory, "memory_0.jsonl")) as report_file:
+      reports = [json.loads(line) for line in report_file]
+    self.assertEqual([0, 2, 4], [report["Iteration"] for report in reports])
+    self.assertIn("FactorsPerOrganism", reports[-1])
+
+
 if __name__ == "__main__":
   unittest.main()
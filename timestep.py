@@ -0,0 +1,98 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TimestepError(Exception):
+  def __init__(self, value):
+    self.value = value
+  def __str__(self):
+    return repr(self.value)
+
+
+""" Changes how much time each iteration of a simulation covers, based on how
+much is going on. When not much is moving and energy is changing slowly, it
+takes bigger steps, and when there is a lot going on, like when predators are
+hunting, it takes smaller ones. It works the same way as step size control in
+an ODE solver: each measurement gets compared to a target, and the step gets
+scaled by how far off the worst one was. """
+class AdaptiveTimestep:
+  # The most that the iteration time can grow or shrink by in one iteration.
+  _MAX_GROWTH = 2.0
+  _MAX_SHRINK = 0.5
+  # We aim a little below the targets, so we don't keep overshooting them.
+  _SAFETY = 0.9
+
+  """ Creates a controller from the AdaptiveTime section of a configuration.
+  config: The AdaptiveTime section.
+  iteration_time: The iteration time to start with.
+  Returns: The new controller. """
+  @classmethod
+  def from_config(cls, config, iteration_time):
+    if "MinIterationTime" not in config or "MaxIterationTime" not in config:
+      logger.log_and_raise(TimestepError,
+          "AdaptiveTime needs MinIterationTime and MaxIterationTime.")
+
+    return cls(iteration_time, config["MinIterationTime"],
+               config["MaxIterationTime"],
+               config.get("TargetActivity", 0.05),
+               config.get("TargetEnergyChange", 0.01))
+
+  """ iteration_time: The iteration time to start with.
+  min_time: The shortest that an iteration can be.
+  max_time: The longest that an iteration can be.
+  target_activity: The fraction of organisms that we want to be moving around
+  in each iteration.
+  target_energy_change: How much we want the total energy of everything on the
+  grid to change in each iteration, as a fraction of the total. """
+  def __init__(self, iteration_time, min_time, max_time, target_activity=0.05,
+               target_energy_change=0.01):
+    if min_time < 1 or min_time > max_time:
+      logger.log_and_raise(TimestepError,
+          "Iteration time bounds must be at least 1, with min <= max.")
+    if target_activity <= 0 or target_energy_change <= 0:
+      logger.log_and_raise(TimestepError, "Targets must be positive.")
+
+    self.__min_time = min_time
+    self.__max_time = max_time
+    self.__target_activity = target_activity
+    self.__target_energy_change = target_energy_change
+
+    # The iteration time isn't rounded until someone asks for it, so that it
+    # can grow a little at a time.
+    self.__time = min(max(iteration_time, min_time), max_time)
+    # The total energy after the last iteration.
+    self.__last_energy = None
+
+  """ Returns: How much time the next iteration should cover. Metabolisms only
+  take whole seconds, so it is always an integer. """
+  def get_iteration_time(self):
+    return int(round(self.__time))
+
+  """ Changes the iteration time based on what happened in the last iteration.
+  population: How many organisms there are.
+  moved: How many organisms moved to a different cell.
+  energy: The total energy of all the organisms.
+  Returns: How much time the next iteration should cover. """
+  def update(self, population, moved, energy):
+    # How far over our targets we are. Anything over one means we are going
+    # too fast.
+    error = 0.0
+    if population:
+      error = moved / population / self.__target_activity
+    if self.__last_energy:
+      energy_change = abs(energy - self.__last_energy) / \
+                      abs(self.__last_energy)
+      error = max(error, energy_change / self.__target_energy_change)
+    self.__last_energy = energy
+
+    factor = self._MAX_GROWTH
+    if error:
+      factor = min(max(self._SAFETY / error, self._MAX_SHRINK),
+                   self._MAX_GROWTH)
+    self.__time = min(max(self.__time * factor, self.__min_time),
+                      self.__max_time)
+
+    logger.debug("Activity error is %f, iteration time is now %f." % \
+                 (error, self.__time))
+    return self.get_iteration_time()
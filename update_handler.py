@@ -6,13 +6,12 @@ class HandlerError(Exception):
     return repr(self.__value)
 
 
-import inspect
+import importlib
 import logging
-import sys
+import math
 
 from organism import OrganismError
 from swig_modules.automata import AnimalMetabolism, PlantMetabolism
-import user_handlers
 
 
 logger = logging.getLogger(__name__)
@@ -25,28 +24,129 @@ can easily implement custom handlers. """
 class UpdateHandler:
   """ A list of all the handlers currently known to this simulation. """
   handlers = []
+  """ The handlers that pass the static filters for each species, keyed by
+  scientific name. """
+  handlers_by_species = {}
+  """ Handler classes that have been registered with register_handler(), but
+  haven't been instantiated yet. """
+  pending_handlers = []
+  # Whether we've imported the user's handlers yet.
+  _user_handlers_loaded = False
+
+  """ Instantiates all the handler classes that have been registered, which adds
+  them to the list of handlers. The first time this is called, it also imports
+  the user_handlers module, so that the handlers in it can register
+  themselves. This gets called automatically the first time an organism needs
+  its handlers, so it only has to be called directly to get at the handlers
+  before then. """
+  @classmethod
+  def load_handlers(cls):
+    if not cls._user_handlers_loaded:
+      cls._user_handlers_loaded = True
+      importlib.import_module("user_handlers")
+
+    while cls.pending_handlers:
+      handler_class = cls.pending_handlers.pop(0)
+      # Instantiating a handler registers it.
+      handler_class()
 
   """ Checks if an organism matches the static filtering criteria for all the
   registered handlers, and add the handler to the organism's list of handlers.
   """
   @classmethod
   def set_handlers_static_filtering(cls, organism):
-    for handler in cls.handlers:
-      if handler.check_static_filters(organism):
-        # It meets the criteria.
+    cls.set_handlers_static_filtering_batch([organism])
+
+  """ Does the same thing as set_handlers_static_filtering() for a whole batch
+  of organisms that share the same attributes. They all get the same handlers,
+  so each handler can set them all up at once.
+  organisms: The organisms to set handlers for. """
+  @classmethod
+  def set_handlers_static_filtering_batch(cls, organisms):
+    for handler in cls.get_static_handlers(organisms[0]):
+      # They all meet the criteria.
+      for organism in organisms:
         organism.add_handler(handler)
 
-        # Run the handler setup function on the organism.
-        handler.setup(organism)
+      # Run the handler setup function on the organisms.
+      handler.setup_batch(organisms)
+
+  """ Figures out which registered handlers an organism passes the static
+  filters for. The static filters only look at attributes that come from the
+  species library, so this only actually checks the filters once per species.
+  organism: The organism to get handlers for.
+  Returns: A list of the handlers that apply to the organism. """
+  @classmethod
+  def get_static_handlers(cls, organism):
+    cls.load_handlers()
+
+    try:
+      species = organism.scientific_name()
+    except AttributeError:
+      # We have no way of grouping this organism with others, so just check it
+      # by itself.
+      return [handler for handler in cls.handlers \
+              if handler.check_static_filters(organism)]
+
+    if species not in cls.handlers_by_species:
+      logger.debug("Computing static handlers for species '%s'." % (species))
+      cls.handlers_by_species[species] = \
+          [handler for handler in cls.handlers \
+           if handler.check_static_filters(organism)]
+
+    return cls.handlers_by_species[species]
 
   """ All subclasses should call this constructor. """
   def __init__(self):
-    # A dictionary storing what attribute values we are filtering for.
+    # A dictionary storing what attribute values we are filtering for. It is
+    # keyed by the attribute path, already split into its components.
     self.__static_filters = {}
 
+    # How often the handler runs. Only one of these is ever set. By default, it
+    # runs every iteration.
+    self.__period_iterations = 1
+    self.__period_seconds = None
+    # How far the schedule is offset, in the same units as the period.
+    self.__phase = 0
+    # The schedule that the handler declared for itself, in the form
+    # (iterations, seconds, phase), if a configuration has overridden it.
+    self.__declared_period = None
+
     # Register handler.
     logger.info("Registering handler '%s'." % (self.__class__.__name__))
     UpdateHandler.handlers.append(self)
+    # Anything we cached is now out of date.
+    UpdateHandler.handlers_by_species.clear()
+
+  """ Changes how often handlers run, from the Handlers section of a
+  configuration. Handlers that aren't in the configuration go back to the
+  schedule that they declared for themselves, so a configuration from one
+  simulation doesn't leak into the next one.
+  config: A dictionary mapping the class names of handlers to their schedules,
+  or None to use the declared schedules for everything. Each schedule has either
+  "Iterations" or "Seconds", and optionally a "Phase". (See set_period().) """
+  @classmethod
+  def configure_periods(cls, config):
+    cls.load_handlers()
+    config = config or {}
+
+    names = set([type(handler).__name__ for handler in cls.handlers])
+    for name in config:
+      if name not in names:
+        logger.log_and_raise(HandlerError,
+            "Can't schedule unknown handler '%s'." % (name))
+
+    for handler in cls.handlers:
+      if handler.__declared_period is None:
+        handler.__declared_period = (handler.__period_iterations,
+                                     handler.__period_seconds, handler.__phase)
+
+      schedule = config.get(type(handler).__name__)
+      if schedule:
+        handler.set_period(schedule.get("Iterations"), schedule.get("Seconds"),
+                           schedule.get("Phase", 0))
+      else:
+        handler.set_period(*handler.__declared_period)
 
   """ Specifies that only organisms that have a particular attribute set in a
   particular way will be handled by this handler. These handlers will be run
@@ -55,6 +155,10 @@ class UpdateHandler:
   values: What that attribute needs to equal. Can be a list if there are
   multiple things. """
   def filter_attribute(self, attribute, value):
+    # Split the attribute name here so that we don't have to do it every time
+    # we check the filters.
+    attribute = tuple(attribute.split("."))
+
     collection = (type(value) == list or type(value) == tuple)
     if not collection:
       if attribute in self.__static_filters.keys():
@@ -71,6 +175,61 @@ class UpdateHandler:
         # A collection for an attribute we haven't yet added.
         self.__static_filters[attribute] = list(value)
 
+    # The cached handlers for each species might not be valid anymore.
+    UpdateHandler.handlers_by_species.clear()
+
+  """ Specifies how often this handler should run. By default, handlers run
+  every iteration, but ones that deal with things that change slowly can run
+  less often. Whenever the handler does run, it gets passed all the simulation
+  time that has elapsed since the last time it ran.
+  iterations: Run the handler once every this many iterations.
+  seconds: Run the handler once every this many seconds of simulation time.
+  Only one of iterations or seconds can be specified.
+  phase: How much to offset the schedule by, in the same units as the period.
+  """
+  def set_period(self, iterations=None, seconds=None, phase=0):
+    if (iterations is None) == (seconds is None):
+      logger.log_and_raise(HandlerError,
+          "Exactly one of iterations or seconds must be specified.")
+    period = iterations if iterations is not None else seconds
+    if period <= 0:
+      logger.log_and_raise(HandlerError,
+          "Handler period must be positive, not %s." % (period))
+    if phase < 0:
+      logger.log_and_raise(HandlerError,
+          "Handler phase must not be negative, not %s." % (phase))
+
+    self.__period_iterations = iterations
+    self.__period_seconds = seconds
+    self.__phase = phase
+
+  """ Determines whether the handler is scheduled to run on a particular
+  iteration.
+  iteration: The number of the iteration, starting from zero.
+  start_time: The simulation time at the start of the iteration.
+  end_time: The simulation time at the end of the iteration.
+  Returns: True if the handler should run, False otherwise. """
+  def is_due(self, iteration, start_time, end_time):
+    if self.__period_iterations is not None:
+      if iteration < self.__phase:
+        return False
+      return (iteration - self.__phase) % self.__period_iterations == 0
+
+    # We're due if one of our scheduled times falls within this iteration,
+    # which means that more of them have passed by the end of it than had
+    # passed by the start.
+    return self.__times_passed(end_time) > self.__times_passed(start_time)
+
+  """ Counts how many of the handler's scheduled times have passed.
+  time: The current simulation time.
+  Returns: The number of scheduled times at or before time. """
+  def __times_passed(self, time):
+    # The small fudge factor keeps floating point error from making us late.
+    periods = (time - self.__phase) / self.__period_seconds + 1e-9
+    if periods < 0:
+      return 0
+    return math.floor(periods) + 1
+
   """ Specifies a custom dynamic filter that every organism that meets the
   criteria of the static filters gets put through every time it is being
   updated.
@@ -85,6 +244,14 @@ class UpdateHandler:
   def setup(self, organism):
     pass
 
+  """ Sets up a whole batch of organisms that share the same attributes. By
+  default, it just calls setup() for each one, but subclasses can override it
+  if they only need to look at the attributes once.
+  organisms: The organisms to set up. """
+  def setup_batch(self, organisms):
+    for organism in organisms:
+      self.setup(organism)
+
   """ Runs the actual body of the handler. This is designed to be implemented by
   the user in superclasses.
   organism: The organism to run the handler on.
@@ -98,13 +265,16 @@ class UpdateHandler:
   organism: The organism to check.
   Returns: True if it does, false if it doesn't."""
   def check_static_filters(self, organism):
+    attributes = organism.get_all_attributes()
     for attribute in self.__static_filters.keys():
-      # Handle nested attributes intelligently.
-      lowest_attribute = organism
-      for subcategory in attribute.split("."):
+      # Handle nested attributes intelligently. We go through the raw
+      # attribute dictionaries so we don't build a new AttributeHelper for
+      # every level.
+      lowest_attribute = attributes
+      for subcategory in attribute:
         try:
-          lowest_attribute = getattr(lowest_attribute, subcategory)
-        except AttributeError:
+          lowest_attribute = lowest_attribute[subcategory]
+        except (KeyError, TypeError):
           # This attribute doesn't exist.
           return False
 
@@ -122,8 +292,131 @@ class UpdateHandler:
     if self.dynamic_filter(organism):
       self.run(organism, iteration_time)
 
+  """ Runs the handler on a whole group of organisms at once. By default, it
+  checks the dynamic filter and calls run() for each organism, but subclasses
+  can override it if they can do something smarter for a whole batch.
+  organisms: The organisms to run the handler on. They should all have passed
+  the static filters for this handler.
+  iteration_time: Simulation time since when we last ran this.
+  iterations: How many iterations that time is made up of, which can be more
+  than one if the handler doesn't run every iteration. """
+  def run_batch(self, organisms, iteration_time, iterations=1):
+    run = self.run
+    dynamic_filter = None
+    if type(self).dynamic_filter is not UpdateHandler.dynamic_filter:
+      # Only bother with the dynamic filter if someone actually defined one.
+      dynamic_filter = self.dynamic_filter
+
+    for organism in organisms:
+      if not organism.is_alive():
+        # It died earlier in this iteration.
+        continue
+      if dynamic_filter and not dynamic_filter(organism):
+        continue
+
+      run(organism, iteration_time)
+
+
+""" Registers a handler class, so that it gets used in every simulation. It is
+meant to be used as a decorator on handler classes, both in this module and in
+user_handlers. Nothing gets instantiated until the handlers are actually needed,
+so importing a module full of handlers is cheap.
+handler_class: The UpdateHandler subclass to register.
+Returns: The same class. """
+def register_handler(handler_class):
+  logger.debug("Registering handler class '%s'." % (handler_class.__name__))
+  UpdateHandler.pending_handlers.append(handler_class)
+  return handler_class
+
+
+""" Keeps track of which organisms each handler applies to, so that every
+handler can be run on all of its organisms in one go each iteration, instead of
+going through the handlers for each organism individually. """
+class DispatchTable:
+  def __init__(self):
+    # The organisms that each handler applies to, keyed by handler.
+    self.__organisms = {}
+    # Where each organism is in those lists, keyed by handler and then by
+    # organism, so that we can remove them quickly.
+    self.__positions = {}
+    # The simulation time and number of iterations that have passed since each
+    # handler last ran, keyed by handler.
+    self.__elapsed = {}
+
+    # The number of the next iteration to run.
+    self.__iteration = 0
+    # The total simulation time that has passed.
+    self.__time = 0
+
+  """ Adds an organism to the table. It should already have its attributes set.
+  organism: The organism to add. """
+  def add_organism(self, organism):
+    for handler in organism.get_handlers():
+      handled = self.__organisms.setdefault(handler, [])
+      self.__positions.setdefault(handler, {})[organism] = len(handled)
+      handled.append(organism)
+
+  """ Removes organisms from the table. This takes constant time for each
+  organism, but it doesn't preserve the order of the remaining ones.
+  organisms: The organisms to remove. """
+  def remove_organisms(self, organisms):
+    for organism in organisms:
+      for handler in organism.get_handlers():
+        handled = self.__organisms.get(handler)
+        position = self.__positions.get(handler, {}).pop(organism, None)
+        if position is None:
+          # It was never in the table.
+          continue
+
+        # Move the last organism into the gap.
+        last = handled.pop()
+        if last is not organism:
+          handled[position] = last
+          self.__positions[handler][last] = position
+
+  """ Gets the organisms that a particular handler applies to.
+  handler: The handler to get organisms for.
+  Returns: A list of organisms. """
+  def get_organisms(self, handler):
+    return self.__organisms.get(handler, [])
+
+  """ Runs every handler that is due this iteration on all of its organisms.
+  Handlers are run in the order that they were registered in. Each one gets
+  passed all the simulation time that has elapsed since it last ran.
+
+  Every organism goes through one handler before any of them go through the
+  next. That isn't the same as running all the handlers for one organism before
+  moving on to the next organism: a later handler sees what earlier handlers did
+  to every organism, like which ones got eaten or which cells got taken, and
+  conflicts get resolved in that order too. Within a handler, organisms go in
+  the order that they were added to the table, except that removing organisms
+  moves the last one into the gap.
+  iteration_time: Simulation time since the last iteration. """
+  def run(self, iteration_time):
+    start_time = self.__time
+    self.__time += iteration_time
+
+    for handler in UpdateHandler.handlers:
+      organisms = self.__organisms.get(handler)
+      if not organisms:
+        continue
+
+      elapsed_time, elapsed_iterations = self.__elapsed.get(handler, (0, 0))
+      elapsed_time += iteration_time
+      elapsed_iterations += 1
+      if not handler.is_due(self.__iteration, start_time, self.__time):
+        # Save it for later.
+        self.__elapsed[handler] = (elapsed_time, elapsed_iterations)
+        continue
+
+      self.__elapsed[handler] = (0, 0)
+      handler.run_batch(organisms, elapsed_time, elapsed_iterations)
+
+    self.__iteration += 1
+
 
 """ Handler for animals. """
+@register_handler
 class AnimalHandler(UpdateHandler):
   def __init__(self):
     super().__init__()
@@ -131,26 +424,50 @@ class AnimalHandler(UpdateHandler):
     self.filter_attribute("Taxonomy.Kingdom", ["Opisthokonta", "Animalia"])
 
   def setup(self, organism):
+    self.setup_batch([organism])
+
+  """ The attributes are the same for every organism in the batch, so we only
+  have to read them once. """
+  def setup_batch(self, organisms):
     # Setup the metabolism simulator.
-    logger.debug("Initializing metabolism simulation for organism %d." % \
-                  (organism.get_index()))
+    logger.debug("Initializing metabolism simulation for %d organisms." % \
+                  (len(organisms)))
 
-    mass = organism.Metabolism.Animal.InitialMass
-    fat_mass = organism.Metabolism.Animal.InitialFatMass
-    body_temp = organism.Metabolism.Animal.BodyTemperature
-    scale = organism.Scale
-    drag_coefficient = organism.Metabolism.Animal.DragCoefficient
+    first = organisms[0]
+    mass = first.Metabolism.Animal.InitialMass
+    fat_mass = first.Metabolism.Animal.InitialFatMass
+    body_temp = first.Metabolism.Animal.BodyTemperature
+    scale = first.Scale
+    drag_coefficient = first.Metabolism.Animal.DragCoefficient
+    vision = first.Vision
 
     args = [mass, fat_mass, body_temp, scale, drag_coefficient]
     logger.debug("Constructing AnimalMetabolism with args: %s" % (args))
-    organism.metabolism = AnimalMetabolism(*args)
-
-    # Set up the organism's vision.
-    logger.debug("Initializing organism vision as %d." % \
-                 (organism.Vision))
-    organism.set_vision(organism.Vision)
+    logger.debug("Initializing organism vision as %d." % (vision))
+    for organism in organisms:
+      organism.metabolism = AnimalMetabolism(*args)
+      # Set up the organism's vision.
+      organism.set_vision(vision)
 
   def run(self, organism, iteration_time):
+    self.__update_animal(organism, iteration_time, 1)
+
+  """ If this handler isn't run every iteration, animals still only move once
+  when it does run, but their metabolisms catch up on every iteration that we
+  skipped. """
+  def run_batch(self, organisms, iteration_time, iterations=1):
+    for organism in organisms:
+      if not organism.is_alive():
+        # It got eaten earlier in this iteration.
+        continue
+
+      self.__update_animal(organism, iteration_time, iterations)
+
+  """ Moves an animal and updates its metabolism simulator.
+  organism: The animal to update.
+  iteration_time: Simulation time since we last updated it.
+  iterations: How many iterations that time is made up of. """
+  def __update_animal(self, organism, iteration_time, iterations):
     old_position = organism.get_position()
     logger.debug("Old position of %d: %s" % \
         (organism.get_index(), old_position))
@@ -169,13 +486,24 @@ class AnimalHandler(UpdateHandler):
         (organism.get_index(), new_position))
 
     # Update the metabolism simulator for this time step.
-    organism.metabolism.Update(iteration_time)
+    if iterations == 1:
+      organism.metabolism.Update(iteration_time)
+    else:
+      simulated = organism.metabolism.FastForward(iteration_time / iterations,
+                                                  iterations)
+      if simulated < iterations:
+        logger.info("Animal %d ran out of energy %d iterations ago." % \
+                    (organism.get_index(), iterations - simulated))
     logger.debug("Animal mass: %f, Animal energy: %f" % \
                 (organism.metabolism.mass(), organism.metabolism.energy()))
 
     # Figure out energy specifically expended for movement.
     move_distance = ((new_position[0] - old_position[0]) ** 2 + \
                      (new_position[1] - old_position[1]) ** 2) ** (0.5)
+    environment = organism.get_grid().environment
+    if move_distance and environment:
+      # Rough terrain takes more energy to cross.
+      move_distance *= environment.GetMovementCost(*new_position)
     organism.metabolism.Move(move_distance, iteration_time)
 
     # Organism should die if it runs out of energy.
@@ -185,6 +513,7 @@ class AnimalHandler(UpdateHandler):
 
 
 """ Handler for plants. """
+@register_handler
 class PlantHandler(UpdateHandler):
   def __init__(self):
     super().__init__()
@@ -192,54 +521,93 @@ class PlantHandler(UpdateHandler):
     self.filter_attribute("Taxonomy.Kingdom", "Plantae")
 
   def setup(self, organism):
+    self.setup_batch([organism])
+
+  """ The attributes are the same for every plant in the batch, so we only have
+  to read them once. """
+  def setup_batch(self, organisms):
     # Setup the metabolism simulation.
-    logger.debug("Initializing metabolism simulation for organism %d." %
-                  (organism.get_index()))
+    logger.debug("Initializing metabolism simulation for %d plants." %
+                  (len(organisms)))
 
+    first = organisms[0]
     # Figure out efficiency.
-    if organism.Metabolism.Photosynthesis.Pathway == "C3":
-      efficiency = organism.Metabolism.Photosynthesis.C3Efficiency
-    elif organism.Metabolism.Photosynthesis.Pathway == "C4":
-      efficiency = organism.Metabolism.Photosynthesis.C4Efficiency
+    if first.Metabolism.Photosynthesis.Pathway == "C3":
+      efficiency = first.Metabolism.Photosynthesis.C3Efficiency
+    elif first.Metabolism.Photosynthesis.Pathway == "C4":
+      efficiency = first.Metabolism.Photosynthesis.C4Efficiency
     else:
       raise ValueError("Invalid photosynthesis pathway: '%s'" % \
-                        (organism.Metabolism.Photosynthesis.Pathway))
+                        (first.Metabolism.Photosynthesis.Pathway))
 
-    mass = organism.Metabolism.Plant.SeedlingMass
+    mass = first.Metabolism.Plant.SeedlingMass
 
     # Figure out the amount of leaf area.
     try:
-      area_mean = organism.Metabolism.Plant.MeanLeafArea
+      area_mean = first.Metabolism.Plant.MeanLeafArea
     except AttributeError:
       logger.warning("Using default leaf area mean for plant '%d'." % \
-                      (organism.get_index()))
+                      (first.get_index()))
       # Calculate a plausible leaf area based on the scale.
-      area_mean = 0.5 * (organism.Scale ** 2)
+      area_mean = 0.5 * (first.Scale ** 2)
     try:
-      area_stddev = organism.Metabolism.Plant.LeafAreaStddev
+      area_stddev = first.Metabolism.Plant.LeafAreaStddev
     except AttributeError:
       logger.warning("Using default leaf area stddev for plant '%d'." % \
-                      (organism.get_index()))
+                      (first.get_index()))
       # Calculate a plausible leaf standard deviation based on the area.
       area_stddev = area_mean * 0.3
 
-    cellulose = organism.Metabolism.Plant.Cellulose
-    hemicellulose = organism.Metabolism.Plant.Hemicellulose
-    lignin = organism.Metabolism.Plant.Lignin
+    cellulose = first.Metabolism.Plant.Cellulose
+    hemicellulose = first.Metabolism.Plant.Hemicellulose
+    lignin = first.Metabolism.Plant.Lignin
 
     args = [mass, efficiency, area_mean, area_stddev, cellulose,
             hemicellulose, lignin]
     logger.debug("Constructing PlantMetabolism with args: %s" % (args))
-    organism.metabolism = PlantMetabolism(*args)
 
-  def run(self, organism, iteration_time):
-    # Request that the plant stays in the same place. (If we don't do this, it
-    # won't generate a conflict if something else tries to move here.)
-    logger.debug("Plant position: %s" % (str(organism.get_position())))
-    organism.set_position(organism.get_position())
+    environment = first.get_grid().environment
+    for organism in organisms:
+      organism.metabolism = PlantMetabolism(*args)
 
-    # Update the metabolism simulator for this time step.
-    organism.metabolism.Update(iteration_time)
+      if environment:
+        # Plants never move, so they always get their sunlight from the same
+        # place.
+        x, y = organism.get_position()
+        organism.metabolism.set_environment(environment, x, y)
+
+      # Plants never move, so the grid can keep them in place by itself. This
+      # also means that anything that tries to move onto a plant will generate
+      # a conflict.
+      organism.set_immobile(True)
+
+  def run(self, organism, iteration_time):
+    self.__update_metabolism(organism, iteration_time, 1)
+
+  """ A plant's metabolism doesn't depend on anything around it, so if this
+  handler isn't run every iteration, we can fast-forward through all the
+  iterations that we skipped at once. """
+  def run_batch(self, organisms, iteration_time, iterations=1):
+    for organism in organisms:
+      if not organism.is_alive():
+        # It got eaten earlier in this iteration.
+        continue
+
+      self.__update_metabolism(organism, iteration_time, iterations)
+
+  """ Updates the metabolism simulator for a plant.
+  organism: The plant to update.
+  iteration_time: Simulation time since we last updated it.
+  iterations: How many iterations that time is made up of. """
+  def __update_metabolism(self, organism, iteration_time, iterations):
+    if iterations == 1:
+      organism.metabolism.Update(iteration_time)
+    else:
+      simulated = organism.metabolism.FastForward(iteration_time / iterations,
+                                                  iterations)
+      if simulated < iterations:
+        logger.info("Plant %d ran out of energy %d iterations ago." % \
+                    (organism.get_index(), iterations - simulated))
     logger.debug("Plant mass: %f, energy: %f" % \
         (organism.metabolism.mass(), organism.metabolism.energy()))
 
@@ -249,11 +617,34 @@ class PlantHandler(UpdateHandler):
       organism.die()
 
 
-# Go and register all the update handlers.
-handlers = inspect.getmembers(sys.modules["user_handlers"],
-    inspect.isclass)
-handlers.extend(inspect.getmembers(sys.modules[__name__], inspect.isclass))
-for handler in handlers:
-  if (issubclass(handler[1], UpdateHandler) and handler[0] != "UpdateHandler"):
-    # We want to filter to only handlers.
-    handler[1]()
+""" Handler for reproduction. It applies to any species that has a Reproduction
+section. """
+@register_handler
+class ReproductionHandler(UpdateHandler):
+  """ Only organisms that can reproduce get this handler. """
+  def check_static_filters(self, organism):
+    if "Reproduction" not in organism.get_all_attributes():
+      return False
+    return super().check_static_filters(organism)
+
+  def setup(self, organism):
+    # How much longer the organism has to wait before it can reproduce. New
+    # organisms have to wait a full interval.
+    organism.reproduction_wait = getattr(organism.Reproduction, "Interval", 0)
+
+  def run(self, organism, iteration_time):
+    organism.reproduction_wait -= iteration_time
+    if organism.reproduction_wait > 0:
+      return
+
+    reproduction = organism.Reproduction
+    metabolism = getattr(organism, "metabolism", None)
+    if (metabolism and \
+        metabolism.energy() < getattr(reproduction, "EnergyThreshold", 0)):
+      # It isn't healthy enough.
+      return
+
+    organism.reproduce(getattr(reproduction, "LitterSize", 1),
+                       getattr(reproduction, "DispersalRadius", 1))
+    organism.reproduction_wait = getattr(reproduction, "Interval", 0)
+
@@ -0,0 +1,9 @@
+# Custom update handlers go in this module. It gets imported the first time a
+# simulation needs its handlers, and every handler class that is decorated with
+# update_handler.register_handler gets added then. For example:
+#
+# from update_handler import UpdateHandler, register_handler
+#
+# @register_handler
+# class MyHandler(UpdateHandler):
+#   ...
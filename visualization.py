@@ -2,8 +2,6 @@ from tkinter import *
 import logging
 import random
 
-from organism import Organism
-
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +20,9 @@ class GridVisualization:
     self.__canvas_objects = []
     # All the GridObjectVisualizations on this grid.
     self.__grid_objects = []
+    # Where in that list the visualization for each grid object is, keyed by
+    # the grid object.
+    self.__positions = {}
 
     self.__window = Tk()
 
@@ -161,17 +162,30 @@ class GridVisualization:
   """ Adds a new GridObjectVisualization.
   grid_object: The GridObjectVisualization instance to add. """
   def add_grid_object(self, grid_object):
+    self.__positions[grid_object.get_underlying_object()] = \
+        len(self.__grid_objects)
     self.__grid_objects.append(grid_object)
 
+  """ Removes the visualization for a grid object, generally because it died.
+  grid_object: The underlying grid object, not the visualization. """
+  def remove_grid_object(self, grid_object):
+    position = self.__positions.pop(grid_object, None)
+    if position is None:
+      # We don't have a visualization for it.
+      return
+    logger.debug("Removing visualization for object %d." % \
+        (grid_object.get_index()))
+
+    # Move the last visualization into the gap.
+    last = self.__grid_objects.pop()
+    if last.get_underlying_object() is not grid_object:
+      self.__grid_objects[position] = last
+      self.__positions[last.get_underlying_object()] = position
+
   """ Updates all the GridObjectVisualization's on this grid. """
   def update(self):
-    to_delete = []
     for grid_object in self.__grid_objects:
-      if not grid_object.update():
-        # Organism is dead. Get rid of the visualization.
-        to_delete.append(grid_object)
-    for organism in to_delete:
-      self.__grid_objects.remove(organism)
+      grid_object.update()
 
     self.__window.update()
 
@@ -237,17 +251,10 @@ class GridObjectVisualization:
       canvas.coords(self.__index, *coordinates)
 
   """ Checks if the object we are linked to has moved and update this object's
-  position accordingly.
-  Returns: True if it updates properly, False if object is now dead. """
+  position accordingly. """
   def update(self):
-    if isinstance(self.__object, Organism):
-      if not self.__object.is_alive():
-        logger.debug("Removing visualization because organism is dead.")
-        return False
-
     position = self.__object.get_position()
     self.__draw(position)
-    return True
 
   """ Moves the object visualization.
   x: How many pixels to move in the x directions.